@@ -0,0 +1,241 @@
+"""
+离线回放抓取基准：本地服务器回放爆サイ / NHK 页面，跑三个爬虫并统计
+页面/秒、请求延迟 p50/p99、峰值内存
+
+    cd spider_projects/demo
+    python -m benchmarks.bench_crawl                                # 全部目标
+    python -m benchmarks.bench_crawl crawl_current_month --forum-mode async --no-sleep
+    python -m benchmarks.bench_crawl --latency 0.05 --jitter 0.05 --error-rate 0.02
+    python -m benchmarks.bench_crawl --save baseline.json           # 记录基线
+    python -m benchmarks.bench_crawl --compare baseline.json        # 与基线对比
+
+每个目标在独立子进程里运行，峰值内存互不影响；回放服务器在父进程里
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import types
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from benchmarks import fixtures
+from benchmarks.replay_server import ReplayServer
+
+TARGETS = ["nhk_china_news", "bakusai_china_news", "crawl_current_month"]
+
+
+def percentile(values, q):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))]
+
+
+def build_routes(base_url, list_pages, per_page):
+    routes = {}
+    routes.update(fixtures.build_nhk_site(base_url))
+    routes.update(fixtures.build_bakusai_news_site())
+    routes.update(fixtures.build_forum_site(n_list_pages=list_pages, per_page=per_page))
+    return routes
+
+
+# ========== 子进程：Scrapy 爬虫 ==========
+def run_spider(name, base_url, settings_overrides):
+    os.environ.setdefault("SCRAPY_SETTINGS_MODULE", "demo.settings")
+    from scrapy import signals
+    from scrapy.crawler import CrawlerProcess
+    from scrapy.utils.project import get_project_settings
+
+    start_urls = {
+        "nhk_china_news": base_url + fixtures.NHK_LIST_PATH.format(""),
+        "bakusai_china_news": base_url + fixtures.AREAMAIN_PATH,
+    }
+
+    with tempfile.TemporaryDirectory() as tmp:
+        settings = get_project_settings()
+        settings.setdict({
+            "RESPONSE_CACHE_ENABLED": False,  # 测的是抓取，不是缓存命中
+            "SQLITE_DB_PATH": str(Path(tmp) / "items.sqlite3"),
+            "METRICS_PATH": str(Path(tmp) / "metrics.prom"),
+            "WATERMARK_PATH": str(Path(tmp) / "watermark.sqlite3"),  # 每次都是全新抓取
+            "LOG_LEVEL": "WARNING",
+            "TELNETCONSOLE_ENABLED": False,
+            **settings_overrides,
+        }, priority="cmdline")
+
+        process = CrawlerProcess(settings)
+        crawler = process.create_crawler(name)
+        latencies = []
+        items = []
+
+        def on_response(response, request, spider):
+            latency = request.meta.get("download_latency")
+            if latency is not None:
+                latencies.append(latency)
+
+        def on_item(item, response, spider):
+            items.append(1)
+
+        # 信号只保存弱引用，不能直接传 lambda（会被立即回收，统计不到条目）
+        crawler.signals.connect(on_response, signal=signals.response_received)
+        crawler.signals.connect(on_item, signal=signals.item_scraped)
+
+        start = time.perf_counter()
+        process.crawl(crawler, start_urls=[start_urls[name]], allowed_domains=["127.0.0.1"])
+        process.start()
+        elapsed = time.perf_counter() - start
+
+    return {"pages": len(latencies), "items": len(items), "seconds": elapsed, "latencies": latencies}
+
+
+# ========== 子进程：requests 论坛爬虫 ==========
+def run_forum(base_url, mode, no_sleep):
+    from demo.spiders.forum_crawl import bakusai_forum as forum
+    from demo.transport import connection_stats
+
+    forum.BASE_URL = base_url
+    forum.LIST_URL = base_url + fixtures.LIST_PATH
+    if no_sleep:
+        # 只去掉固定 sleep，令牌桶限速保持不变
+        # （其余函数照常使用，fetch 里的 perf_counter 计时不受影响）
+        no_sleep_time = {name: getattr(time, name) for name in dir(time) if not name.startswith("_")}
+        no_sleep_time["sleep"] = lambda seconds: None
+        forum.time = types.SimpleNamespace(**no_sleep_time)
+
+    latencies = []
+    fetch = forum.fetch
+
+    def timed_fetch(url):
+        t0 = time.perf_counter()
+        try:
+            return fetch(url)
+        finally:
+            latencies.append(time.perf_counter() - t0)
+
+    forum.fetch = timed_fetch
+
+    start = time.perf_counter()
+    if mode == "async":
+        results = forum.crawl_current_month_concurrent()
+    else:
+        with tempfile.TemporaryDirectory() as tmp:
+            results = forum.crawl_current_month(
+                all_pages=mode == "all-pages",
+                state_path=str(Path(tmp) / "state.sqlite3"),
+            )
+    elapsed = time.perf_counter() - start
+    pools = connection_stats(forum.session).values()
+    return {
+        "pages": len(latencies), "items": len(results), "seconds": elapsed, "latencies": latencies,
+        "new_connections": sum(st["new_connections"] for st in pools),
+    }
+
+
+def run_worker(target, base_url, args):
+    if target == "crawl_current_month":
+        report = run_forum(base_url, args.forum_mode, args.no_sleep)
+    else:
+        overrides = dict(kv.split("=", 1) for kv in args.setting)
+        report = run_spider(target, base_url, overrides)
+
+    latencies = report.pop("latencies")
+    report.update({
+        "target": target,
+        "pages_per_sec": report["pages"] / report["seconds"] if report["seconds"] else 0.0,
+        "p50_latency": percentile(latencies, 50),
+        "p99_latency": percentile(latencies, 99),
+        # Linux 上 ru_maxrss 单位是 KB
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    })
+    print(json.dumps(report))
+
+
+# ========== 父进程 ==========
+def worker_argv(target, base_url, args):
+    argv = [sys.executable, "-m", "benchmarks.bench_crawl", "_worker", target,
+            "--base-url", base_url, "--forum-mode", args.forum_mode]
+    if args.no_sleep:
+        argv.append("--no-sleep")
+    for kv in args.setting:
+        argv += ["--setting", kv]
+    return argv
+
+
+def run_all(args):
+    targets = args.targets or TARGETS
+    reports = {}
+    server = ReplayServer(latency=args.latency, jitter=args.jitter,
+                          error_rate=args.error_rate, seed=args.seed)
+    server.routes = build_routes(server.base_url, args.list_pages, args.per_page)
+
+    with server:
+        print(f"🛰️ 回放服务器 {server.base_url}（{len(server.routes)} 个页面，"
+              f"延迟 {args.latency}s + 0~{args.jitter}s，错误率 {args.error_rate:.0%}）")
+        for target in targets:
+            requests_before, errors_before = server.requests, server.errors
+            proc = subprocess.run(worker_argv(target, server.base_url, args),
+                                  cwd=PROJECT_ROOT, capture_output=True, text=True)
+            if proc.returncode != 0:
+                print(f"❌ {target} 运行失败：\n{proc.stderr[-2000:]}")
+                continue
+            report = json.loads(proc.stdout.strip().splitlines()[-1])
+            report["server_requests"] = server.requests - requests_before
+            report["injected_errors"] = server.errors - errors_before
+            reports[target] = report
+            if "new_connections" in report:
+                print(f"🔌 {target}: {report['server_requests']} 个请求共新建 {report['new_connections']} 个连接")
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    print(f"\n{'目标':<22}{'页面':>6}{'条目':>6}{'页/秒':>9}{'p50(ms)':>9}{'p99(ms)':>9}"
+          f"{'峰值RSS(MB)':>12}{'注入错误':>9}{'对比基线':>10}")
+    for target, r in reports.items():
+        delta = ""
+        base = baseline.get(target)
+        if base and base.get("pages_per_sec"):
+            delta = f"{r['pages_per_sec'] / base['pages_per_sec'] - 1:+.1%}"
+        print(f"{target:<22}{r['pages']:>6}{r['items']:>6}{r['pages_per_sec']:>9.2f}"
+              f"{r['p50_latency'] * 1000:>9.1f}{r['p99_latency'] * 1000:>9.1f}"
+              f"{r['peak_rss_mb']:>12.0f}{r['injected_errors']:>9}{delta:>10}")
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(reports, f, ensure_ascii=False, indent=2)
+        print(f"💾 结果已保存到 {args.save}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="离线回放抓取基准")
+    parser.add_argument("targets", nargs="*", help=f"要跑的目标，默认全部：{', '.join(TARGETS)}")
+    parser.add_argument("--latency", type=float, default=0.02, help="每个响应的固定延迟（秒）")
+    parser.add_argument("--jitter", type=float, default=0.01, help="额外的随机延迟上限（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回 503 的概率")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--list-pages", type=int, default=3, help="论坛本月列表页数")
+    parser.add_argument("--per-page", type=int, default=10, help="论坛每个列表页的帖子数")
+    parser.add_argument("--forum-mode", choices=["sync", "async", "all-pages"], default="sync")
+    parser.add_argument("--no-sleep", action="store_true", help="去掉论坛爬虫里的固定 sleep")
+    parser.add_argument("--setting", action="append", default=[], metavar="KEY=VALUE",
+                        help="覆盖 Scrapy 设置，可重复")
+    parser.add_argument("--save", help="把结果保存为基线 JSON")
+    parser.add_argument("--compare", help="与之前保存的基线 JSON 对比")
+    parser.add_argument("--base-url", help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.targets[:1] == ["_worker"]:
+        run_worker(args.targets[1], args.base_url, args)
+    else:
+        run_all(args)
@@ -0,0 +1,153 @@
+"""
+爆サイ页面解析微基准：旧的现写现用 XPath/正则/CSS 提取 vs demo/bakusai_parser 预编译版本
+
+    cd spider_projects/demo
+    python -m benchmarks.bench_parsers
+    python -m benchmarks.bench_parsers --fixtures saved_pages/   # 用保存下来的真实页面
+
+--fixtures 目录下按文件名前缀区分页面类型：list_*.html / thread_*.html / news_*.html
+"""
+import argparse
+import re
+import sys
+import time
+from pathlib import Path
+
+from lxml import etree
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from demo import bakusai_parser as bp
+from benchmarks import fixtures
+
+
+# ========== 旧实现（重构前 bakusai_forum.py / bakusai_china_news.py 的写法） ==========
+def legacy_list(html):
+    tree = etree.HTML(html)
+    items = []
+    for li in tree.xpath("//li[@data-tid]"):
+        title = "".join(li.xpath(".//a[contains(@class,'thr_status_icon')]//text()")).strip()
+        comment_count_text = li.xpath(".//span[contains(@class,'comment_count_area')]/span[last()]/text()")
+        try:
+            comment_count = int(comment_count_text[0].strip())
+        except (IndexError, ValueError):
+            comment_count = 0
+        last_reply_text = "".join(li.xpath(".//span[@class='thr-posted-ago']//text()")).strip()
+        items.append((li.get("data-tid"), title, comment_count, last_reply_text))
+    return items
+
+
+def legacy_thread(html):
+    tree = etree.HTML(html)
+    post_time = tree.xpath("//span[@class='posts' and @itemprop='datePublished']/text()")
+    body = "".join(tree.xpath("//div[@id='threadBody']//text()")).strip()
+    comments = []
+    for idx, res in enumerate(tree.xpath("//div[contains(@class,'resbody')]")):
+        content = "".join(res.xpath(".//text()")).strip()
+        m = re.match(r'#(\d+)', content)
+        text = re.sub(r'#\d+\s*[\d/:\s]*', '', content)
+        text = re.sub(r'>>\d+', '', text)
+        text = text.replace('\r', '').replace('\n', ' ')
+        text = re.sub(r'\s+', ' ', text).strip()
+        comments.append((int(m.group(1)) if m else idx + 1, text))
+    pages = 0
+    for href in tree.xpath("//a[contains(@href,'/tp=')]/@href"):
+        m = re.search(r'/tp=(\d+)/', href)
+        if m:
+            pages = max(pages, int(m.group(1)))
+    return post_time, body, comments, pages
+
+
+def legacy_news(html):
+    from parsel import Selector
+    from w3lib.html import remove_tags
+
+    sel = Selector(text=html.decode("utf-8"))
+    title = sel.css("strong[itemprop='headline']::text").get() or sel.css("h1::text").get()
+    article_html = sel.css("div#threadBody[itemprop='articlebody']").get()
+    article_text = ""
+    if article_html:
+        article_text = remove_tags(article_html)
+        article_text = re.sub(r"[\t\r\n]+", " ", article_text)
+        article_text = re.sub(r"\s{2,}", " ", article_text).strip()
+    comments = []
+    for c in sel.css("div.resbody[itemprop='commentText'] ::text").getall():
+        c = c.strip()
+        if not c or (c.startswith(">>") and c[2:].isdigit()) or len(c) < 3:
+            continue
+        comments.append(c)
+    return title, article_text, comments
+
+
+# ========== 新实现 ==========
+def shared_list(html):
+    return list(bp.parse_list_items(bp.to_tree(html)))
+
+
+def shared_thread(html):
+    tree = bp.to_tree(html)
+    post_time = bp.parse_post_time_text(tree)
+    body = bp.parse_thread_body(tree)
+    comments = [(res_no, bp.clean_comment(content)) for res_no, content in bp.iter_comments(tree)]
+    return post_time, body, comments, bp.max_pager_page(tree)
+
+
+def shared_news(html):
+    return bp.parse_news_detail(html)
+
+
+CASES = {
+    "list": (legacy_list, shared_list),
+    "thread": (legacy_thread, shared_thread),
+    "news": (legacy_news, shared_news),
+}
+
+
+def load_pages(fixtures_dir=None):
+    """返回 {页面类型: [bytes, ...]}"""
+    if fixtures_dir:
+        pages = {kind: [] for kind in CASES}
+        for path in sorted(Path(fixtures_dir).glob("*.html")):
+            kind = path.name.split("_", 1)[0]
+            if kind in pages:
+                pages[kind].append(path.read_bytes())
+        return pages
+
+    forum = fixtures.build_forum_site()
+    news = fixtures.build_bakusai_news_site()
+    return {
+        "list": [body for path, (_, body) in forum.items() if path.startswith("/thr_tl/")],
+        "thread": [body for path, (_, body) in forum.items() if path.startswith("/thr_res/")],
+        "news": [body for path, (_, body) in news.items() if path.startswith("/thr_res/")],
+    }
+
+
+def bench(fn, pages, rounds):
+    fn(pages[0])  # 预热
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for html in pages:
+            fn(html)
+    elapsed = time.perf_counter() - start
+    return rounds * len(pages) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="爆サイ页面解析基准")
+    parser.add_argument("--fixtures", default=None, help="保存的页面目录（list_/thread_/news_*.html）")
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    pages = load_pages(args.fixtures)
+    print(f"{'页面':<8}{'数量':>6}{'旧实现 页/秒':>16}{'新实现 页/秒':>16}{'加速':>8}")
+    for kind, (legacy, shared) in CASES.items():
+        if not pages.get(kind):
+            continue
+        old = bench(legacy, pages[kind], args.rounds)
+        new = bench(shared, pages[kind], args.rounds)
+        print(f"{kind:<8}{len(pages[kind]):>6}{old:>16.1f}{new:>16.1f}{new / old:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""
+离线测试用的页面夹具：用仓库里已有的抓取结果生成结构与线上一致的
+爆サイ列表页 / 帖子页 / 新闻页，以及 NHK 的列表 JSON 和正文页
+（选择器与 demo/bakusai_parser.py、nhk_china_news 爬虫保持一致）
+"""
+import json
+from datetime import datetime, timedelta
+from html import escape
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from demo.streaming import load_json_records
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+FORUM_FILE = PROJECT_ROOT / "demo/spiders/forum_crawl/bakusai_current_month.json"
+BAKUSAI_NEWS_FILE = PROJECT_ROOT / "data_analyze/bakusai_china_news.json"
+NHK_FILE = PROJECT_ROOT / "data_analyze/NHK_China_news.json"
+
+LIST_PATH = "/thr_tl/acode=13/ctrid=1/ctgid=150/bid=2396/p={}/"
+THREAD_PATH = "/thr_res/acode=13/ctrid=1/ctgid=150/bid=2396/tid={}/tp={}/"
+AREAMAIN_PATH = "/areamain/acode=13/ctrid=1/"
+NHK_LIST_PATH = "/newsweb/api/news-nwa-topic-nationwide-0001595{}.json"
+COMMENTS_PER_PAGE = 50
+
+
+def _page(body):
+    return f'<!DOCTYPE html><html><head><meta charset="utf-8"></head><body>{body}</body></html>'
+
+
+def format_posted_ago(last_reply, now):
+    """与列表页 thr-posted-ago 的三种写法一致"""
+    delta = now - last_reply
+    if delta < timedelta(hours=1):
+        return f"{max(1, int(delta.total_seconds() // 60))}分前"
+    if delta < timedelta(hours=24):
+        return f"{int(delta.total_seconds() // 3600)}時間前"
+    return last_reply.strftime("%m/%d %H:%M")
+
+
+# ========== 爆サイ论坛 ==========
+def render_list_page(threads, now):
+    items = []
+    for t in threads:
+        items.append(
+            f'<li data-tid="{t["tid"]}">'
+            f'<a class="thr_status_icon" href="{THREAD_PATH.format(t["tid"], 1)}">{escape(t["title"])}</a>'
+            f'<span class="comment_count_area"><span class="icon"></span><span>{t["comment_count"]}</span></span>'
+            f'<span class="thr-posted-ago">{format_posted_ago(t["last_reply"], now)}</span>'
+            f'</li>'
+        )
+    return _page(f'<ul class="thr_list">{"".join(items)}</ul>')
+
+
+def thread_comments(post, comment_count):
+    """按列表页评论数补齐评论（循环使用已有评论文本），带 #编号 和时间头"""
+    lines = [line for line in post.get("comments", "").split("\n") if line.strip()] or ["テスト"]
+    return [
+        (n, f"#{n} 2025/01/01 12:00\n{lines[(n - 1) % len(lines)]}")
+        for n in range(1, comment_count + 1)
+    ]
+
+
+def render_thread_page(post, tid, tp, comments, n_pages):
+    posted = post.get("post_time") or "2025-01-01 00:00:00"
+    posted = datetime.strptime(posted, "%Y-%m-%d %H:%M:%S").strftime("%Y/%m/%d %H:%M")
+    res = "".join(
+        f'<div class="resbody" itemprop="commentText">{escape(content)}</div>'
+        for _, content in comments
+    )
+    pager = "".join(f'<a href="{THREAD_PATH.format(tid, p)}">{p}</a>' for p in range(1, n_pages + 1))
+    return _page(
+        f'<span class="posts" itemprop="datePublished">{posted}</span>'
+        f'<div id="threadBody" itemprop="articlebody">{escape(post.get("body", ""))}</div>'
+        f'{res}<div class="paging">{pager}</div>'
+    )
+
+
+def build_forum_site(n_list_pages=5, per_page=10, max_comments=300, now=None):
+    """
+    返回 {路径: (content_type, bytes)}
+    前 n_list_pages 页的帖子最后回复时间均匀分布在本月内（按最后回复倒序），
+    第 n_list_pages+1 页全是上月的帖子，爬虫读到这一页就会停止翻页
+    """
+    now = now or datetime.now()
+    month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    posts = load_json_records(FORUM_FILE)
+    n_current = n_list_pages * per_page
+    step = (now - month_start) / (n_current + 1)
+
+    site = {}
+    threads = []
+    for k in range(n_current + per_page):
+        post = posts[k % len(posts)]
+        if k < n_current:
+            last_reply = now - step * (k + 1)
+        else:
+            last_reply = month_start - timedelta(hours=k - n_current + 1)
+        threads.append({
+            "tid": str(7000000 + k),
+            "title": post["title"],
+            "comment_count": min(post.get("comment_count", 1) or 1, max_comments),
+            "last_reply": last_reply,
+            "post": post,
+        })
+
+    for page in range(1, n_list_pages + 2):
+        chunk = threads[(page - 1) * per_page:page * per_page]
+        site[LIST_PATH.format(page)] = ("text/html; charset=utf-8", render_list_page(chunk, now).encode("utf-8"))
+
+    for t in threads:
+        comments = thread_comments(t["post"], t["comment_count"])
+        n_pages = max(1, -(-len(comments) // COMMENTS_PER_PAGE))
+        for tp in range(1, n_pages + 1):
+            page_comments = comments[(tp - 1) * COMMENTS_PER_PAGE:tp * COMMENTS_PER_PAGE]
+            html = render_thread_page(t["post"], t["tid"], tp, page_comments, n_pages)
+            site[THREAD_PATH.format(t["tid"], tp)] = ("text/html; charset=utf-8", html.encode("utf-8"))
+    return site
+
+
+# ========== 爆サイ新闻 ==========
+def render_news_detail(item):
+    comments = "".join(
+        f'<div class="resbody" itemprop="commentText">{escape(c)}<br>&gt;&gt;1</div>'
+        for c in item.get("comments", [])
+    )
+    return _page(
+        f'<h1><strong itemprop="headline">{escape(item["title"])}</strong></h1>'
+        f'<div id="threadBody" itemprop="articlebody">\n\t{escape(item.get("article_text", ""))}\n</div>'
+        f'{comments}'
+    )
+
+
+def build_bakusai_news_site():
+    items = load_json_records(BAKUSAI_NEWS_FILE)
+    site = {}
+    links = []
+    for item in items:
+        path = urlsplit(item["url"]).path
+        links.append(f'<a href="{path}">{escape(item["title"])}</a>')
+        site[path] = ("text/html; charset=utf-8", render_news_detail(item).encode("utf-8"))
+    site[AREAMAIN_PATH] = ("text/html; charset=utf-8", _page("".join(links)).encode("utf-8"))
+    return site
+
+
+# ========== NHK ==========
+def render_nhk_article(item):
+    paragraphs = item.get("content") or item["title"]
+    body = "".join(f'<p class="_1i1d7sh2">{escape(paragraphs)}</p>' for _ in range(5))
+    return _page(f'<div class="_1i1d7sh0">{body}</div>')
+
+
+def build_nhk_site(base_url, per_page=5):
+    """列表 JSON 中的 url / next 都指向 base_url，便于本地回放"""
+    items = load_json_records(NHK_FILE)
+    site = {}
+    pages = [items[i:i + per_page] for i in range(0, len(items), per_page)]
+    for n, page_items in enumerate(pages, 1):
+        suffix = "" if n == 1 else f"-{n}"
+        data = {"items": []}
+        for item in page_items:
+            path = urlsplit(item["url"]).path
+            data["items"].append({"url": base_url + path, "title": item["title"], "pubDate": item["date"]})
+            site[path] = ("text/html; charset=utf-8", render_nhk_article(item).encode("utf-8"))
+        if n < len(pages):
+            data["next"] = base_url + NHK_LIST_PATH.format(f"-{n + 1}")
+        site[NHK_LIST_PATH.format(suffix)] = (
+            "application/json", json.dumps(data, ensure_ascii=False).encode("utf-8")
+        )
+    return site
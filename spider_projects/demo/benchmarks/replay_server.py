@@ -0,0 +1,89 @@
+"""
+本地回放服务器：把录制 / 生成的页面挂在 127.0.0.1 上，可注入延迟和错误
+"""
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+
+class ReplayServer:
+    """
+    routes: {路径: (content_type, bytes)}，路径不含 query
+    latency: 每个响应固定等待的秒数；jitter: 额外的 0~jitter 秒随机等待
+    error_rate: 以该概率返回 503（不含响应体）
+    """
+
+    def __init__(self, routes=None, latency=0.0, jitter=0.0, error_rate=0.0, seed=0):
+        self.routes = dict(routes or {})
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.requests = 0
+        self.errors = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), self._make_handler())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _roll(self):
+        """返回 (本次等待秒数, 是否注入错误)"""
+        with self._lock:
+            self.requests += 1
+            delay = self.latency + self._random.uniform(0, self.jitter)
+            fail = self._random.random() < self.error_rate
+            if fail:
+                self.errors += 1
+        return delay, fail
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                delay, fail = server._roll()
+                if delay:
+                    time.sleep(delay)
+                route = server.routes.get(urlsplit(self.path).path)
+                if fail:
+                    self._send(503, "text/plain", b"")
+                elif route is None:
+                    self._send(404, "text/plain", b"not found")
+                else:
+                    self._send(200, *route)
+
+            def _send(self, status, content_type, body):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # 不打印每条访问日志
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
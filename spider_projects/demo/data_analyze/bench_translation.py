@@ -0,0 +1,120 @@
+"""
+翻译性能对比
+1. 逐条 translate_text vs 长度分桶的 translate_batch：
+   python bench_translation.py batch [-n 句子数] [--batch-size 16]
+2. fp32 / int8 / onnx 后端对比（延迟、吞吐、峰值内存、与 fp32 输出的一致性）：
+   python bench_translation.py backends [-n 句子数] [--backends fp32,int8,onnx]
+   每个后端在独立子进程里运行，峰值内存互不影响
+"""
+import argparse
+import difflib
+import json
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import transformer_based_sentimental as tbs
+
+DATA_FILE = Path(__file__).resolve().parent.parent / "demo/spiders/forum_crawl/bakusai_current_month.json"
+
+
+def load_sentences(n):
+    with open(DATA_FILE, "r", encoding="utf-8") as f:
+        posts = json.load(f)
+    sentences = []
+    for post in posts:
+        sentences.append(post.get("body", ""))
+        sentences.extend(tbs.split_comments(post.get("comments", [])))
+    return [s for s in sentences if s.strip()][:n]
+
+
+def bench(name, fn, sentences):
+    start = time.perf_counter()
+    fn(sentences)
+    elapsed = time.perf_counter() - start
+    print(f"{name:<24} {len(sentences)} 句  {elapsed:8.2f} s  {len(sentences) / elapsed:8.2f} 句/秒")
+    return elapsed
+
+
+def run_batch_vs_single(n, batch_size):
+    sentences = load_sentences(n)
+
+    # 预热一次，避免把首次分配内存的时间算进去
+    tbs.translate_batch(sentences[:2], use_cache=False)
+
+    single = bench("逐条 translate_text", lambda xs: [tbs.translate_text(x) for x in xs], sentences)
+    batched = bench(f"translate_batch(bs={batch_size})", lambda xs: tbs.translate_batch(xs, batch_size, use_cache=False), sentences)
+    print(f"🚀 加速比: {single / batched:.2f}x")
+
+
+def run_one_backend(name, n, batch_size):
+    """子进程入口：用指定后端翻译，结果以 JSON 打到 stdout 最后一行"""
+    tbs.set_backend(name)
+    sentences = load_sentences(n)
+    load_start = time.perf_counter()
+    tbs.get_translator()
+    load_seconds = time.perf_counter() - load_start
+    tbs.generate_batch(sentences[:2], batch_size)  # 预热
+
+    latencies, outputs = [], []
+    start = time.perf_counter()
+    for i in range(0, len(sentences), batch_size):
+        t0 = time.perf_counter()
+        outputs.extend(tbs.generate_batch(sentences[i:i + batch_size], batch_size)[0])
+        latencies.append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - start
+
+    print(json.dumps({
+        "backend": name,
+        "load_seconds": load_seconds,
+        "throughput": len(sentences) / elapsed,
+        "p50_batch_latency": statistics.median(latencies),
+        "max_batch_latency": max(latencies),
+        # Linux 上 ru_maxrss 单位是 KB
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "outputs": outputs,
+    }, ensure_ascii=False))
+
+
+def run_backends(names, n, batch_size):
+    reports = {}
+    for name in names:
+        proc = subprocess.run(
+            [sys.executable, __file__, "_worker", name, "-n", str(n), "--batch-size", str(batch_size)],
+            capture_output=True, text=True
+        )
+        if proc.returncode != 0:
+            print(f"❌ 后端 {name} 运行失败：\n{proc.stderr[-2000:]}")
+            continue
+        reports[name] = json.loads(proc.stdout.strip().splitlines()[-1])
+
+    reference = reports.get("fp32", {}).get("outputs")
+    print(f"\n{'后端':<6} {'加载(s)':>8} {'句/秒':>8} {'p50批延迟(s)':>13} {'峰值RSS(MB)':>12} {'完全一致':>8} {'字符相似度':>10}")
+    for name, r in reports.items():
+        exact = similarity = float("nan")
+        if reference:
+            pairs = list(zip(reference, r["outputs"]))
+            exact = sum(a == b for a, b in pairs) / len(pairs)
+            similarity = statistics.mean(difflib.SequenceMatcher(None, a, b).ratio() for a, b in pairs)
+        print(f"{name:<6} {r['load_seconds']:>8.1f} {r['throughput']:>8.2f} {r['p50_batch_latency']:>13.2f} "
+              f"{r['peak_rss_mb']:>12.0f} {exact:>8.1%} {similarity:>10.1%}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="翻译性能对比")
+    parser.add_argument("mode", choices=["batch", "backends", "_worker"])
+    parser.add_argument("backend", nargs="?", help=argparse.SUPPRESS)
+    parser.add_argument("-n", type=int, default=200, help="参与测试的句子数")
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--backends", default="fp32,int8,onnx", help="逗号分隔的后端列表")
+    args = parser.parse_args()
+
+    if args.mode == "batch":
+        run_batch_vs_single(args.n, args.batch_size)
+    elif args.mode == "backends":
+        run_backends(args.backends.split(","), args.n, args.batch_size)
+    else:
+        run_one_backend(args.backend, args.n, args.batch_size)
@@ -0,0 +1,124 @@
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("cl100k_base")
+except Exception:  # 没装 tiktoken 时退回估算
+    _encoding = None
+
+# 中日韩文字、假名、全角符号大致 1 字 1 token
+_CJK_RE = re.compile(r"[\u3000-\u30ff\u3400-\u9fff\uf900-\ufaff\uff00-\uffef]")
+
+SENTIMENTS = ("积极", "中性", "消极")
+
+
+def count_tokens(text):
+    """计算 token 数；有 tiktoken 时精确计算，否则按 CJK 1 字 1 token、其它 4 字符 1 token 估算"""
+    if not text:
+        return 0
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    cjk = len(_CJK_RE.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def _split_long(text, budget):
+    """
+    单条超出预算的评论硬切成不超过 budget 的若干段
+    有 tiktoken 时按 token 边界切（CJK 一个字常编码成 2~3 个 token，按字符数切会超预算），
+    切点退到能完整解码的位置，不把一个字切成两半；估算模式下 1 字符最多 1 token，按字符数切
+    """
+    if _encoding is None:
+        return [text[i:i + budget] for i in range(0, len(text), budget)]
+    tokens = _encoding.encode(text)
+    pieces, start = [], 0
+    while start < len(tokens):
+        end = min(start + budget, len(tokens))
+        while True:
+            try:
+                piece = _encoding.decode_bytes(tokens[start:end]).decode("utf-8")
+            except UnicodeDecodeError:
+                piece = None
+            # 子串重新编码后的 token 数可能和切片不同，超了就再往回退
+            if end == start + 1 or (piece is not None and count_tokens(piece) <= budget):
+                break
+            end -= 1
+        pieces.append(piece if piece is not None else _encoding.decode(tokens[start:end]))
+        start = end
+    return pieces
+
+
+def chunk_comments(comments, budget, separator="\n"):
+    """
+    把评论按顺序装进若干块，每块用 separator 拼接后 token 数不超过 budget
+    comments: 字符串列表；返回 [[评论, ...], ...]
+    """
+    sep_tokens = count_tokens(separator)
+    chunks, current, used = [], [], 0
+    for comment in comments:
+        n = count_tokens(comment)
+        if n > budget:
+            if current:
+                chunks.append(current)
+                current, used = [], 0
+            chunks.extend([piece] for piece in _split_long(comment, budget))
+            continue
+        cost = n + (sep_tokens if current else 0)
+        if current and used + cost > budget:
+            chunks.append(current)
+            current, used, cost = [], 0, n
+        current.append(comment)
+        used += cost
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def reduce_sentiments(chunk_results, weights):
+    """
+    按 token 数加权合并各块结果：
+    返回整体情感、各情感占比和每块的结果
+    """
+    totals = {s: 0 for s in SENTIMENTS}
+    for result, weight in zip(chunk_results, weights):
+        sentiment = result.get("sentiment")
+        if sentiment in totals:
+            totals[sentiment] += weight
+
+    counted = sum(totals.values())
+    if counted == 0:
+        overall = "未知"
+        distribution = {}
+    else:
+        overall = max(SENTIMENTS, key=lambda s: totals[s])
+        distribution = {s: round(totals[s] / counted, 4) for s in SENTIMENTS}
+
+    return {
+        "sentiment": overall,
+        "reason": f"评论区分 {len(chunk_results)} 块分析后按篇幅加权汇总，"
+                  + "，".join(f"{s} {distribution.get(s, 0):.0%}" for s in SENTIMENTS),
+        "distribution": distribution,
+        "chunks": [
+            {"sentiment": r.get("sentiment"), "tokens": w, "reason": r.get("reason", "")}
+            for r, w in zip(chunk_results, weights)
+        ],
+    }
+
+
+def analyze_chunked(comments, analyze_fn, budget, max_workers=1, separator="\n"):
+    """
+    map-reduce 分析超长评论区：
+    分块 -> 调用 analyze_fn(块文本) -> 加权汇总
+    max_workers > 1 时各块并发分析，总耗时取决于最大的一块；
+    调用方本身已在线程池里并发时保持 1（逐块顺序分析），在途请求数才不会超过外层的并发上限
+    """
+    chunks = chunk_comments(comments, budget, separator)
+    texts = [separator.join(chunk) for chunk in chunks]
+    weights = [count_tokens(t) for t in texts]
+    if max_workers <= 1:
+        results = [analyze_fn(t) for t in texts]
+    else:
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            results = list(pool.map(analyze_fn, texts))
+    return reduce_sentiments(results, weights)
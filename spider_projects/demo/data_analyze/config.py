@@ -1,7 +1,26 @@
 import os
+import sys
 import json
 import time
-from openai import OpenAI
+import random
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# 让脚本直接运行时也能导入 demo 包
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from demo.streaming import JsonlWriter, iter_jsonl
+from demo.ratelimit import TokenBucket
+from demo.metrics import METRICS, MetricsReporter, observe_llm_response
+from data_analyze.llm_cache import LLMCache
+from data_analyze.near_dup import NearDupIndex
+from data_analyze.chunking import count_tokens, analyze_chunked
+from data_analyze import registry
+from data_analyze.sentiment_backends import DeepSeekBackend, get_backend
+from data_analyze.sentiment_aggregates import AGGREGATES_PATH, open_aggregator, print_trend
 
 
 # ===============================
@@ -43,23 +62,96 @@ def init_client():
     if not api_key:
         raise ValueError("未提供API密钥")
 
+    from openai import OpenAI
+
     return OpenAI(
         api_key=api_key,
         base_url="https://api.deepseek.com"
     )
 
 
-client = init_client()
+def get_client():
+    """进程内只初始化一次客户端，且在第一次真正调用 API 时才初始化"""
+    return registry.get("deepseek_client", init_client)
+
+
+# ===============================
+# 调用限速与 429 退避
+# ===============================
+_rpm_bucket = None
+_tpm_bucket = None
+
+
+def configure_rate_limits(rpm=None, tpm=None):
+    """设置每分钟请求数 / token 数上限，None 表示不限制"""
+    global _rpm_bucket, _tpm_bucket
+    _rpm_bucket = TokenBucket(rpm / 60.0, capacity=max(1, rpm // 10)) if rpm else None
+    _tpm_bucket = TokenBucket(tpm / 60.0, capacity=max(1, tpm // 10)) if tpm else None
+
+
+def chat_completion(prompt, max_retries=5, **kwargs):
+    """带 RPM/TPM 限速、遇到 429 指数退避重试的 chat 调用"""
+    from openai import RateLimitError
+
+    if _rpm_bucket is not None:
+        _rpm_bucket.acquire()
+    if _tpm_bucket is not None:
+        _tpm_bucket.acquire(count_tokens(prompt))
+
+    for attempt in range(max_retries + 1):
+        start = time.perf_counter()
+        try:
+            response = get_client().chat.completions.create(
+                model=MODEL,
+                messages=[
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=TEMPERATURE,
+                **kwargs
+            )
+            observe_llm_response(MODEL, time.perf_counter() - start, response)
+            return response
+        except RateLimitError as e:
+            METRICS.inc("llm_rate_limited_total", model=MODEL)
+            if attempt == max_retries:
+                raise
+            retry_after = e.response.headers.get("retry-after") if e.response is not None else None
+            try:
+                wait = float(retry_after)
+            except (TypeError, ValueError):
+                wait = min(60, 2 ** attempt) + random.uniform(0, 1)
+            print(f"⏳ 触发限流(429)，{wait:.1f} 秒后重试")
+            time.sleep(wait)
 
 
 # ===============================
 # 2. 情感分析函数
 # ===============================
+MODEL = "deepseek-chat"
+TEMPERATURE = 0
+# 修改提示词模板时递增，旧缓存自动失效
+PROMPT_VERSION = 1
+LLM_CACHE_PATH = "llm_cache.sqlite3"
+METRICS_PATH = "metrics/deepseek_analysis.prom"
+NEAR_DUP_PATH = "near_dup.sqlite3"
+
+
+def get_llm_cache():
+    return registry.get("llm_cache", lambda: LLMCache(LLM_CACHE_PATH))
+
+
+def close_llm_cache():
+    """关闭 LLM 缓存，写回攒下的访问时间；本次没用到缓存时什么也不做"""
+    if registry.is_loaded("llm_cache"):
+        get_llm_cache().close()
+        registry.reset("llm_cache")
+
+
 def analyze_sentiment(text, target_name):
     """
     text: 待分析文本
     target_name: '新闻正文' 或 '新闻评论区'
-    返回：dict
+    返回：dict（相同文本命中本地缓存时不再调用 API）
     """
 
     if not text.strip():
@@ -85,20 +177,22 @@ def analyze_sentiment(text, target_name):
 {text}
 """
 
+    cache = get_llm_cache()
+    cache_key = LLMCache.make_key(MODEL, PROMPT_VERSION, TEMPERATURE, f"{target_name}\n{text}")
+    cached = cache.get(cache_key)
+    if cached is not None:
+        return cached
+
     try:
-        response = client.chat.completions.create(
-            model="deepseek-chat",
-            messages=[
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0
-        )
+        response = chat_completion(prompt)
 
         result_text = response.choices[0].message.content
 
         # 解析JSON
         try:
-            return json.loads(result_text)
+            result = json.loads(result_text)
+            cache.put(cache_key, result)
+            return result
         except json.JSONDecodeError:
             # 如果返回的不是JSON，尝试提取情感
             if "积极" in result_text:
@@ -108,10 +202,12 @@ def analyze_sentiment(text, target_name):
             else:
                 sentiment = "中性"
 
-            return {
+            result = {
                 "sentiment": sentiment,
                 "reason": result_text[:200] + "..." if len(result_text) > 200 else result_text
             }
+            cache.put(cache_key, result)
+            return result
 
     except Exception as e:
         print(f"⚠️  情感分析失败: {e}")
@@ -124,23 +220,47 @@ def analyze_sentiment(text, target_name):
 # ===============================
 # 3. 分析单条新闻
 # ===============================
-def analyze_single_news(news_item):
+# 评论区超过这个 token 数就分块并发分析再汇总
+COMMENT_TOKEN_BUDGET = 4000
+
+
+def build_comment_lines(comments):
+    return [f"[评论{i + 1}] {comment}" for i, comment in enumerate(comments)]
+
+
+def analyze_single_news(news_item, backend=None):
+    """backend 为 sentiment_backends 中的后端，默认直接调用 DeepSeek"""
+    analyze = backend.analyze if backend is not None else analyze_sentiment
     article_text = news_item.get("article_text", "")
     comments = news_item.get("comments", [])
 
     # 将评论合并为一段文本
-    comment_text = "\n".join([f"[评论{i + 1}] {comment}" for i, comment in enumerate(comments)])
+    comment_lines = build_comment_lines(comments)
+    comment_text = "\n".join(comment_lines)
 
     print(f"🔍 分析新闻: {news_item.get('title', '无标题')[:50]}...")
+    start = time.perf_counter()
 
-    article_sentiment = analyze_sentiment(article_text, "新闻正文")
-    comment_sentiment = analyze_sentiment(comment_text, "新闻评论区") if comment_text else {
-        "sentiment": "无评论",
-        "reason": "该新闻暂无用户评论"
-    }
+    article_sentiment = analyze(article_text, "新闻正文")
+    if not comment_text:
+        comment_sentiment = {
+            "sentiment": "无评论",
+            "reason": "该新闻暂无用户评论"
+        }
+    elif count_tokens(comment_text) > COMMENT_TOKEN_BUDGET:
+        # 逐块顺序分析：新闻本身已按 --concurrency 并发，块再并发会让在途请求数成倍超出上限
+        comment_sentiment = analyze_chunked(
+            comment_lines,
+            lambda chunk: analyze(chunk, "新闻评论区"),
+            budget=COMMENT_TOKEN_BUDGET
+        )
+    else:
+        comment_sentiment = analyze(comment_text, "新闻评论区")
 
     # 计算一致性
     alignment = "一致" if article_sentiment["sentiment"] == comment_sentiment["sentiment"] else "不一致"
+    METRICS.observe("analysis_item_seconds", time.perf_counter() - start)
+    METRICS.inc("analysis_items_total")
 
     return {
         "url": news_item.get("url", ""),
@@ -153,10 +273,59 @@ def analyze_single_news(news_item):
 
 
 # ===============================
-# 4. 批量分析 JSON 文件
+# 4. 近似重复复用
+# ===============================
+def get_near_dup_index(threshold, backend_name="deepseek"):
+    """同一模型 / 提示词版本 / 后端的结果才能互相复用"""
+    namespace = f"news:{MODEL}:{PROMPT_VERSION}:{backend_name}"
+    return registry.get(
+        f"near_dup:{namespace}",
+        lambda: NearDupIndex(NEAR_DUP_PATH, namespace=namespace, threshold=threshold)
+    )
+
+
+def news_dedup_text(news_item):
+    return "\n".join([news_item.get("title", ""), news_item.get("article_text", ""),
+                      *news_item.get("comments", [])])
+
+
+def reusable(result):
+    """分析失败或判为"未知"的结果不进近似重复索引，也不给近似重复的新闻复用"""
+    return "error" not in result and all(
+        result[key]["sentiment"] != "未知" for key in ("article_sentiment", "comment_sentiment")
+    )
+
+
+def reuse_result(news_item, match):
+    """把近似重复新闻的分析结果套到当前新闻上"""
+    doc_id, score, payload = match
+    result = dict(payload)
+    result.update({
+        "url": news_item.get("url", ""),
+        "title": news_item.get("title", ""),
+        "total_comments": len(news_item.get("comments", [])),
+        "near_duplicate_of": doc_id,
+        "near_duplicate_similarity": round(score, 3),
+    })
+    return result
+
+
+# ===============================
+# 5. 批量分析 JSON 文件
 # ===============================
-def analyze_news_file(input_path, output_path, sleep_time=1, max_items=None):
-    """批量分析新闻"""
+def analyze_news_file(input_path, output_path, sleep_time=1, max_items=None, resume=False,
+                      concurrency=1, rpm=None, tpm=None, backend=None, dedup_threshold=None,
+                      aggregates_path=None):
+    """
+    批量分析新闻
+    output_path 以 .jsonl 结尾时逐条流式写出（定期 fsync），
+    resume=True 时跳过输出中已有的 url，从中断处继续
+    concurrency > 1 时用线程池并发分析，速率由 rpm / tpm 限制（不再固定 sleep），
+    输出顺序和摘要与顺序执行一致
+    backend 为本地 / 级联后端时，先对需要分析的正文和评论做一次批量本地推理
+    dedup_threshold 不为空时，与已分析新闻的相似度（MinHash 估算的 Jaccard）不低于该值的直接复用结果
+    aggregates_path 不为空时，每条结果同时累加进跨运行的情感聚合库，结束时打印最近的趋势
+    """
 
     # 检查输入文件
     if not os.path.exists(input_path):
@@ -171,44 +340,179 @@ def analyze_news_file(input_path, output_path, sleep_time=1, max_items=None):
         news_list = news_list[:max_items]
         print(f"📊 将分析前 {max_items} 条新闻（共 {len(news_list)} 条）")
 
+    streaming = output_path.endswith(".jsonl")
+    writer = JsonlWriter(output_path, key="url", resume=resume) if streaming else None
     results = []
+    total = len(news_list)
 
-    print(f"🚀 开始分析 {len(news_list)} 条新闻...")
+    pending = []
+    for idx, news in enumerate(news_list, 1):
+        if writer is not None and writer.seen(news.get("url", "")):
+            print(f"[{idx}/{total}] ⏭️ 已分析，跳过: {news.get('title', '无标题')[:50]}")
+            continue
+        pending.append((idx, news))
+
+    print(f"🚀 开始分析 {len(pending)} 条新闻...")
     print("=" * 60)
 
-    for idx, news in enumerate(news_list, 1):
-        print(f"[{idx}/{len(news_list)}] ", end="")
+    # 本地模型不需要等待 API 限速
+    if backend is not None and backend.name == "local":
+        sleep_time = 0
+
+    near_dup = None
+    if dedup_threshold:
+        near_dup = get_near_dup_index(dedup_threshold, backend.name if backend is not None else "deepseek")
+
+    # 分发前按输入顺序确定每条新闻的处理方式，结果与完成顺序无关：
+    # ("reuse", 匹配) 复用已分析新闻的结果；("leader", doc_id) 需要分析；
+    # ("follow", (匹配, 签名)) 与本次更早的一条待分析新闻近似重复，等它的结果
+    # 本次的 leader 只记在内存索引里，持久化索引只收录分析成功的结果
+    plans = {}
+    leaders = []
+    if near_dup is not None:
+        run_index = NearDupIndex(":memory:", namespace=near_dup.namespace, threshold=near_dup.threshold)
+        for idx, news in pending:
+            text = news_dedup_text(news)
+            signature = near_dup.signature(text)
+            match = near_dup.find(text, signature)
+            if match is not None and match[2] is not None:
+                plans[idx] = ("reuse", match)
+                continue
+            match = run_index.find(text, signature)
+            if match is not None:
+                plans[idx] = ("follow", (match, signature))
+            else:
+                doc_id = news.get("url") or news.get("title", "")
+                plans[idx] = ("leader", doc_id)
+                run_index.add(doc_id, None, signature=signature)
+                leaders.append((idx, news, signature))
+        run_index.close()
+    else:
+        leaders = [(idx, news, None) for idx, news in pending]
+
+    # 本地 / 级联后端：只对真正要分析的新闻做一次批量本地推理（近似重复的直接复用，不用算）；
+    # 级联后端交给 LLM 的部分留到 run_one 里，在线程池中按 --concurrency 并发
+    if backend is not None and backend.batched:
+        backend.prefetch(
+            [("新闻正文", news.get("article_text", "")) for _, news, _ in leaders]
+            + [("新闻评论区", "\n".join(build_comment_lines(news.get("comments", [])))) for _, news, _ in leaders]
+        )
+
+    def reuse(idx, news, match):
+        METRICS.inc("near_dup_reused_total")
+        METRICS.inc("near_dup_tokens_avoided_total", count_tokens(news_dedup_text(news)))
+        print(f"[{idx}/{total}] ♻️ 与已分析新闻近似重复（相似度 {match[1]:.0%}），复用结果: "
+              f"{news.get('title', '无标题')[:50]}")
+        return reuse_result(news, match)
+
+    def run_one(item):
+        idx, news, signature = item
         try:
-            result = analyze_single_news(news)
-            results.append(result)
+            result = analyze_single_news(news, backend)
+            if near_dup is not None and reusable(result):
+                near_dup.add(news.get("url") or news.get("title", ""), None, result, signature)
 
             # 显示简要结果
-            print(f"✅ 新闻: {result['article_sentiment']['sentiment']} | "
+            print(f"[{idx}/{total}] ✅ 新闻: {result['article_sentiment']['sentiment']} | "
                   f"评论: {result['comment_sentiment']['sentiment']} | "
                   f"一致性: {result['sentiment_alignment']}")
 
-            time.sleep(sleep_time)  # 防止请求过快
+            if concurrency <= 1:
+                time.sleep(sleep_time)  # 防止请求过快
         except Exception as e:
-            print(f"❌ 分析失败: {news.get('title', '无标题')} - {e}")
-            results.append({
+            print(f"[{idx}/{total}] ❌ 分析失败: {news.get('title', '无标题')} - {e}")
+            result = {
                 "error": str(e),
                 "url": news.get("url", ""),
                 "title": news.get("title", "")
-            })
+            }
+        return result
+
+    if concurrency > 1:
+        configure_rate_limits(rpm, tpm)
+        pool = ThreadPoolExecutor(max_workers=concurrency)
+        # map 按提交顺序返回结果，保证输出顺序与顺序执行相同
+        analyzed = pool.map(run_one, leaders)
+    else:
+        pool = None
+        analyzed = map(run_one, leaders)
+
+    def ordered_outcomes():
+        """
+        按输入顺序产出结果；跟随者排在它的 leader 之后，取结果时 leader 一定已经完成
+        leader 失败或结果为"未知"时，跟随者自己分析（仍在线程池里执行，受并发上限约束）
+        """
+        leader_results = {}
+        for idx, news in pending:
+            kind, value = plans.get(idx, ("leader", None))
+            if kind == "reuse":
+                yield reuse(idx, news, value)
+            elif kind == "leader":
+                result = next(analyzed)
+                leader_results[value] = result
+                yield result
+            else:
+                (doc_id, score, _), signature = value
+                leader = leader_results[doc_id]
+                if reusable(leader):
+                    yield reuse(idx, news, (doc_id, score, leader))
+                elif pool is not None:
+                    yield pool.submit(run_one, (idx, news, signature)).result()
+                else:
+                    yield run_one((idx, news, signature))
+
+    outcomes = ordered_outcomes()
+
+    aggregator = open_aggregator(aggregates_path)
+    try:
+        for result in outcomes:
+            if writer is not None:
+                writer.write(result)
+            else:
+                results.append(result)
+            if aggregator is not None:
+                aggregator.add(result)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+        if aggregator is not None:
+            aggregator.flush()
 
     # 保存结果
-    with open(output_path, "w", encoding="utf-8") as f:
-        json.dump(results, f, ensure_ascii=False, indent=2)
+    if writer is not None:
+        writer.close()
+        results = iter_jsonl(output_path)
+    else:
+        with open(output_path, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+    print_summary(results, total)
+    if aggregator is not None:
+        print_trend(aggregator)
+        aggregator.close()
 
-    # 生成摘要
+    if backend is not None and backend.name == "cascade":
+        print(f"\n🔀 级联后端：{backend.escalated} 段低置信度文本交给了 LLM")
+
+    cache_stats = get_llm_cache().stats()
+    print(f"\n🗃️ LLM 缓存: 命中 {cache_stats['hits']} 次 | 未命中 {cache_stats['misses']} 次 | "
+          f"命中率 {cache_stats['hit_rate']:.1%}")
+
+    if near_dup is not None:
+        print(f"♻️ 近似重复: 复用 {METRICS.counter_value('near_dup_reused_total')} 条结果，"
+              f"少分析约 {METRICS.counter_value('near_dup_tokens_avoided_total')} tokens")
+
+    print(f"\n💾 分析完成，结果已保存至：{output_path}")
+
+
+def print_summary(results, total):
+    """生成摘要，results 可以是列表或逐条读取的迭代器"""
     print("\n" + "=" * 60)
     print("📊 分析摘要")
     print("=" * 60)
 
-    successful = sum(1 for r in results if "error" not in r)
-    print(f"✅ 成功分析: {successful}/{len(news_list)} 条新闻")
-
     # 统计情感分布
+    successful = 0
     article_sentiments = {"积极": 0, "中性": 0, "消极": 0, "无评论": 0, "未知": 0}
     comment_sentiments = {"积极": 0, "中性": 0, "消极": 0, "无评论": 0, "未知": 0}
     alignments = {"一致": 0, "不一致": 0}
@@ -216,6 +520,7 @@ def analyze_news_file(input_path, output_path, sleep_time=1, max_items=None):
     for result in results:
         if "error" in result:
             continue
+        successful += 1
 
         article_sent = result["article_sentiment"]["sentiment"]
         comment_sent = result["comment_sentiment"]["sentiment"]
@@ -230,6 +535,8 @@ def analyze_news_file(input_path, output_path, sleep_time=1, max_items=None):
         if alignment in alignments:
             alignments[alignment] += 1
 
+    print(f"✅ 成功分析: {successful}/{total} 条新闻")
+
     print("\n📰 新闻情感分布:")
     for sent, count in article_sentiments.items():
         if count > 0:
@@ -242,33 +549,72 @@ def analyze_news_file(input_path, output_path, sleep_time=1, max_items=None):
 
     print(f"\n🔄 情感一致性: 一致 {alignments['一致']} 条 | 不一致 {alignments['不一致']} 条")
 
-    print(f"\n💾 分析完成，结果已保存至：{output_path}")
-
 
 # ===============================
-# 5. 主程序入口
+# 6. 主程序入口
 # ===============================
-if __name__ == "__main__":
-    import sys
-
-    # 简单命令行参数
-    max_items = None
-    if len(sys.argv) > 1:
-        try:
-            max_items = int(sys.argv[1])
-            print(f"🔧 限制分析数量: {max_items} 条")
-        except ValueError:
-            pass
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="DeepSeek 新闻 / 评论情感分析")
+    parser.add_argument("max_items", nargs="?", type=int, default=None, help="只分析前 N 条（兼容旧用法）")
+    parser.add_argument("-i", "--input", default="bakusai_china_news.json", help="输入 JSON 文件")
+    parser.add_argument("-o", "--output", default=None,
+                        help="输出文件，.jsonl 结尾时流式写出（默认随 --resume 选择 .json / .jsonl）")
+    parser.add_argument("-n", "--max-items", dest="limit", type=int, default=None, help="只分析前 N 条")
+    parser.add_argument("--resume", action="store_true", help="跳过输出中已有的结果，从中断处继续")
+    parser.add_argument("--concurrency", type=int, default=1, help="并发请求数，>1 时启用并发模式")
+    parser.add_argument("--concurrent", action="store_true", help="等价于 --concurrency 8")
+    parser.add_argument("--rpm", type=int, default=60, help="并发模式下每分钟请求上限")
+    parser.add_argument("--tpm", type=int, default=100000, help="并发模式下每分钟 token 上限")
+    parser.add_argument("--sleep", type=float, default=1, help="顺序模式下每条之间的间隔秒数")
+    parser.add_argument("--backend", choices=["deepseek", "local", "cascade"], default="deepseek",
+                        help="情感后端：deepseek / 本地 transformers 模型 / 本地初筛 + 低置信度交给 DeepSeek")
+    parser.add_argument("--threshold", type=float, default=0.7, help="级联后端交给 LLM 的置信度阈值")
+    parser.add_argument("--dedup-threshold", type=float, default=None,
+                        help="与已分析新闻的相似度不低于该值时直接复用结果（例如 0.9），默认关闭")
+    parser.add_argument("--aggregates", default=AGGREGATES_PATH,
+                        help="跨运行情感聚合库（按日 / 来源 / 板块累计），空字符串关闭")
+    parser.add_argument("--metrics", default=METRICS_PATH,
+                        help="运行指标输出文件（.prom 为 Prometheus textfile，否则 JSON），空字符串关闭")
+    parser.add_argument("--metrics-interval", type=float, default=30, help="运行中写出指标的间隔秒数")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    max_items = args.limit or args.max_items
+    if max_items:
+        print(f"🔧 限制分析数量: {max_items} 条")
+    concurrency = 8 if args.concurrent and args.concurrency <= 1 else args.concurrency
+    output = args.output or (
+        "deepseek_news_sentiment_result.jsonl" if args.resume else "deepseek_news_sentiment_result.json"
+    )
 
     # 检查配置文件是否存在，给用户提示
-    if not os.path.exists("config_secret.py"):
+    if not os.getenv("DEEPSEEK_API_KEY") and not os.path.exists("config_secret.py"):
         print("💡 提示：可以创建 config_secret.py 文件保存API密钥")
         print("     内容：DEEPSEEK_API_KEY = 'your_key_here'")
         print("     将此文件添加到 .gitignore 中避免上传\n")
 
-    analyze_news_file(
-        input_path="bakusai_china_news.json",
-        output_path="deepseek_news_sentiment_result.json",
-        sleep_time=1,
-        max_items=max_items
-    )
\ No newline at end of file
+    try:
+        with MetricsReporter(args.metrics, args.metrics_interval, job="deepseek_analysis", backend=args.backend):
+            analyze_news_file(
+                input_path=args.input,
+                output_path=output,
+                sleep_time=args.sleep,
+                max_items=max_items,
+                resume=args.resume,
+                concurrency=concurrency,
+                rpm=args.rpm,
+                tpm=args.tpm,
+                backend=None if args.backend == "deepseek" else get_backend(
+                    args.backend, llm=DeepSeekBackend(analyze_sentiment), threshold=args.threshold
+                ),
+                dedup_threshold=args.dedup_threshold,
+                aggregates_path=args.aggregates
+            )
+    finally:
+        close_llm_cache()
+
+
+if __name__ == "__main__":
+    main()
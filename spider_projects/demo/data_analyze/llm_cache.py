@@ -0,0 +1,120 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+from demo.metrics import METRICS
+
+
+class LLMCache:
+    """
+    LLM 响应的本地持久缓存（SQLite）
+    - key = hash(模型, 提示词模板版本, temperature, 文本)
+    - 总大小超过 max_bytes 时按最近访问时间淘汰（LRU）
+    - 命中时的访问时间先记在内存里，攒够 access_batch 条（或写入 / 淘汰 / 关闭时）一次性写回
+    - 记录命中 / 未命中次数
+    """
+
+    EVICT_BATCH = 256
+
+    def __init__(self, path="llm_cache.sqlite3", max_bytes=200 * 1024 * 1024, access_batch=100):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.access_batch = access_batch
+        self.hits = 0
+        self.misses = 0
+        self._accessed = {}  # key -> 最近访问时间，尚未写回
+        self._lock = threading.Lock()
+        # 并发分析时多个线程共用一个连接，由 _lock 串行化
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_access ON llm_cache (last_access)")
+        self.conn.commit()
+        self._total_bytes = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+
+    @staticmethod
+    def make_key(model, prompt_version, temperature, text):
+        raw = json.dumps([model, prompt_version, temperature, text], ensure_ascii=False)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            row = self.conn.execute("SELECT value FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                METRICS.inc("llm_cache_requests_total", result="miss")
+                return None
+            self.hits += 1
+            METRICS.inc("llm_cache_requests_total", result="hit")
+            self._accessed[key] = time.time()
+            if len(self._accessed) >= self.access_batch:
+                self._flush_accessed()
+                self.conn.commit()
+            return json.loads(row[0])
+
+    def _flush_accessed(self):
+        """把攒下的访问时间写回（调用方负责 commit）"""
+        if self._accessed:
+            self.conn.executemany(
+                "UPDATE llm_cache SET last_access = MAX(last_access, ?) WHERE key = ?",
+                [(ts, key) for key, ts in self._accessed.items()]
+            )
+            self._accessed = {}
+
+    def put(self, key, value):
+        data = json.dumps(value, ensure_ascii=False)
+        size = len(data.encode("utf-8"))
+        with self._lock:
+            old = self.conn.execute("SELECT size FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            self.conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, size, last_access) VALUES (?, ?, ?, ?)",
+                (key, data, size, time.time())
+            )
+            self._total_bytes += size - (old[0] if old else 0)
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+            self.conn.commit()
+
+    def _evict(self):
+        """按 last_access 索引分批删除最久未访问的条目，直到降到上限的 90%（不把整张表读进内存）"""
+        self._flush_accessed()  # 先写回访问时间，淘汰顺序才准确
+        target = self.max_bytes * 0.9
+        while self._total_bytes > target:
+            count = self.conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+            if not count:
+                break
+            # 按平均条目大小估算这一批要删几条，避免一次删掉远超需要的条目
+            avg_size = max(self._total_bytes / count, 1)
+            limit = min(max(int((self._total_bytes - target) / avg_size) + 1, 1), self.EVICT_BATCH)
+            freed = self.conn.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM "
+                "(SELECT size FROM llm_cache ORDER BY last_access LIMIT ?)", (limit,)
+            ).fetchone()[0]
+            self.conn.execute(
+                "DELETE FROM llm_cache WHERE key IN "
+                "(SELECT key FROM llm_cache ORDER BY last_access LIMIT ?)", (limit,)
+            )
+            self._total_bytes -= freed
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "bytes": self._total_bytes,
+        }
+
+    def close(self):
+        with self._lock:
+            self._flush_accessed()
+            self.conn.commit()
+            self.conn.close()
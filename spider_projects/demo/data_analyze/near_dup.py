@@ -0,0 +1,165 @@
+import hashlib
+import json
+import random
+import sqlite3
+import struct
+import threading
+
+from data_analyze.translation_cache import normalize_text
+
+try:
+    import numpy as np
+except ImportError:  # 没装 numpy 时逐个哈希计算，结果完全相同
+    np = None
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+
+def shingles(text, k=5):
+    """归一化后的字符 k-gram 集合（日文 / 中文没有空格分词，按字符切）"""
+    text = normalize_text(text)
+    if len(text) <= k:
+        return {text} if text else set()
+    return {text[i:i + k] for i in range(len(text) - k + 1)}
+
+
+def _hash32(shingle):
+    return int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=4).digest(), "little")
+
+
+class NearDupIndex:
+    """
+    MinHash + LSH 近似重复索引（SQLite 持久化，可逐条增量添加）
+    - 每篇文本算 num_perm 个 MinHash 值，按 bands 段分桶；任意一段完全相同即为候选
+    - 候选再用签名估算 Jaccard 相似度，不低于 threshold 的视为近似重复
+    - payload 保存该文本的分析结果，近似重复的文本可以直接复用
+    namespace 区分不同用途（例如不同模型 / 提示词版本的分析结果），互不命中
+    """
+
+    def __init__(self, path="near_dup.sqlite3", namespace="default", threshold=0.9,
+                 num_perm=64, bands=16, shingle_size=5):
+        if num_perm % bands:
+            raise ValueError("num_perm 必须能被 bands 整除")
+        self.path = path
+        self.namespace = namespace
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+
+        # 固定种子，签名在不同进程之间可比较
+        rng = random.Random(1)
+        self._a = [rng.randint(1, _MAX_HASH) for _ in range(num_perm)]
+        self._b = [rng.randint(0, _MAX_HASH) for _ in range(num_perm)]
+
+        self.lookups = 0
+        self.duplicates = 0
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS near_dup_docs (
+                namespace TEXT NOT NULL,
+                doc_id TEXT NOT NULL,
+                signature BLOB NOT NULL,
+                payload TEXT,
+                PRIMARY KEY (namespace, doc_id)
+            )
+        """)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS near_dup_bands (
+                namespace TEXT NOT NULL,
+                band INTEGER NOT NULL,
+                bucket TEXT NOT NULL,
+                doc_id TEXT NOT NULL
+            )
+        """)
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_near_dup_bands ON near_dup_bands (namespace, band, bucket)"
+        )
+        self.conn.commit()
+
+    # ========== 签名 ==========
+    def signature(self, text):
+        hashes = [_hash32(s) for s in shingles(text, self.shingle_size)]
+        if not hashes:
+            return (_MAX_HASH,) * self.num_perm
+        if np is not None:
+            x = np.array(hashes, dtype=np.uint64)
+            a = np.array(self._a, dtype=np.uint64)[:, None]
+            b = np.array(self._b, dtype=np.uint64)[:, None]
+            # a、x 都小于 2^32，a*x+b 不会超出 uint64
+            values = ((a * x + b) % np.uint64(_MERSENNE_PRIME)) & np.uint64(_MAX_HASH)
+            return tuple(int(v) for v in values.min(axis=1))
+        return tuple(
+            min(((a * x + b) % _MERSENNE_PRIME) & _MAX_HASH for x in hashes)
+            for a, b in zip(self._a, self._b)
+        )
+
+    def _buckets(self, signature):
+        for band in range(self.bands):
+            part = signature[band * self.rows:(band + 1) * self.rows]
+            yield band, hashlib.md5(struct.pack(f"<{self.rows}I", *part)).hexdigest()
+
+    @staticmethod
+    def similarity(sig1, sig2):
+        """两个签名估算的 Jaccard 相似度"""
+        return sum(x == y for x, y in zip(sig1, sig2)) / len(sig1)
+
+    # ========== 查询 / 添加 ==========
+    def find(self, text, signature=None):
+        """
+        返回最相似且不低于 threshold 的已收录文本 (doc_id, 相似度, payload)，没有返回 None
+        """
+        signature = signature or self.signature(text)
+        best = None
+        with self._lock:
+            self.lookups += 1
+            candidates = set()
+            for band, bucket in self._buckets(signature):
+                candidates.update(row[0] for row in self.conn.execute(
+                    "SELECT doc_id FROM near_dup_bands WHERE namespace = ? AND band = ? AND bucket = ?",
+                    (self.namespace, band, bucket)
+                ))
+            for doc_id in candidates:
+                row = self.conn.execute(
+                    "SELECT signature, payload FROM near_dup_docs WHERE namespace = ? AND doc_id = ?",
+                    (self.namespace, doc_id)
+                ).fetchone()
+                if row is None:
+                    continue
+                score = self.similarity(signature, struct.unpack(f"<{self.num_perm}I", row[0]))
+                if score >= self.threshold and (best is None or score > best[1]):
+                    best = (doc_id, score, json.loads(row[1]) if row[1] else None)
+            if best is not None:
+                self.duplicates += 1
+        return best
+
+    def add(self, doc_id, text, payload=None, signature=None):
+        """收录一篇文本（同一 doc_id 重复添加时覆盖）"""
+        signature = signature or self.signature(text)
+        data = json.dumps(payload, ensure_ascii=False) if payload is not None else None
+        with self._lock:
+            self.conn.execute(
+                "DELETE FROM near_dup_bands WHERE namespace = ? AND doc_id = ?", (self.namespace, doc_id)
+            )
+            self.conn.execute(
+                "INSERT OR REPLACE INTO near_dup_docs (namespace, doc_id, signature, payload) VALUES (?, ?, ?, ?)",
+                (self.namespace, doc_id, struct.pack(f"<{self.num_perm}I", *signature), data)
+            )
+            self.conn.executemany(
+                "INSERT INTO near_dup_bands (namespace, band, bucket, doc_id) VALUES (?, ?, ?, ?)",
+                [(self.namespace, band, bucket, doc_id) for band, bucket in self._buckets(signature)]
+            )
+            self.conn.commit()
+
+    def stats(self):
+        return {
+            "lookups": self.lookups,
+            "duplicates": self.duplicates,
+            "duplicate_rate": self.duplicates / self.lookups if self.lookups else 0.0,
+        }
+
+    def close(self):
+        self.conn.close()
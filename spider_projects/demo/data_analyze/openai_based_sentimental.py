@@ -1,31 +1,152 @@
+import argparse
 import json
-import openai
 import time
+import sys
+from pathlib import Path
+
+# 让脚本直接运行时也能导入 demo 包
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from demo.streaming import JsonlWriter, export_json, iter_jsonl
+from demo.metrics import METRICS, MetricsReporter, observe_llm_response
+from data_analyze.llm_cache import LLMCache
+from data_analyze.near_dup import NearDupIndex
+from data_analyze.chunking import count_tokens, analyze_chunked
+from data_analyze import registry
+from data_analyze.sentiment_aggregates import AGGREGATES_PATH, open_aggregator, print_trend
 
 # ========== 配置 ==========
 import os
-openai.api_key = os.getenv("OPENAI_API_KEY")
- # 替换成你的 OpenAI API Key
 INPUT_FILE = "forum_crawl/bakusai_current_month.json"
 OUTPUT_FILE = "forum_crawl/bakusai_sentiment.json"
 MODEL = "gpt-5-mini"  # 使用 GPT-5-mini 模型
 SLEEP_TIME = 1  # 每次请求间隔，避免频率过高
+PROMPT_VERSION = 1  # 修改提示词时递增，旧缓存自动失效
+BATCH_PROMPT_VERSION = "batch-1"
+BATCH_TOKEN_BUDGET = 3000  # 批量模式下每个请求里帖子文本的 token 上限
+POST_TOKEN_BUDGET = 4000  # 单帖超过这个 token 数时评论分块分析再汇总
+CHUNK_WORKERS = 4  # 超长帖子分块后同时在途的请求数
+LLM_CACHE_PATH = "llm_cache.sqlite3"
+METRICS_PATH = "metrics/openai_analysis.prom"
+NEAR_DUP_PATH = "near_dup.sqlite3"
 
-client = openai.api_key
+def init_client():
+    import openai
 
-# ========== 读取帖子 ==========
-with open(INPUT_FILE, "r", encoding="utf-8") as f:
-    posts = json.load(f)
+    return openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
-print(f"总帖子数: {len(posts)}")
 
-# ========== 分析情感 ==========
-results = []
-for idx, post in enumerate(posts, 1):
+def get_client():
+    """第一次请求时才创建客户端，进程内复用"""
+    return registry.get("openai_client", init_client)
+
+
+def get_cache():
+    return registry.get("llm_cache", lambda: LLMCache(LLM_CACHE_PATH))
+
+
+def close_cache():
+    """关闭 LLM 缓存，写回攒下的访问时间；本次没用到缓存时什么也不做"""
+    if registry.is_loaded("llm_cache"):
+        get_cache().close()
+        registry.reset("llm_cache")
+
+
+def create_completion(prompt):
+    """发一次 chat 请求，记录延迟和 token 用量"""
+    start = time.perf_counter()
+    resp = get_client().chat.completions.create(
+        model=MODEL,
+        messages=[{"role": "user", "content": prompt}]
+    )
+    observe_llm_response(MODEL, time.perf_counter() - start, resp)
+    return resp
+
+
+def get_near_dup_index(threshold):
+    namespace = f"posts:{MODEL}:{PROMPT_VERSION}"
+    return registry.get(
+        f"near_dup:{namespace}",
+        lambda: NearDupIndex(NEAR_DUP_PATH, namespace=namespace, threshold=threshold)
+    )
+
+
+def post_text(post):
     text = post["body"]
     if post["comments"]:
         text += "\n" + post["comments"]
+    return text
+
+
+def build_result(post, analysis_json):
+    return {
+        "title": post["title"],
+        "url": post["url"],
+        "comment_count": post["comment_count"],
+        "post_time": post.get("post_time", ""),
+        "sentiment": analysis_json.get("sentiment", "未知"),
+        "reason": analysis_json.get("reason", "")
+    }
+
+
+def find_near_duplicate(near_dup, post):
+    """
+    在近似重复索引里找已分析过的相似帖子
+    返回 (匹配, 签名)，匹配为 (doc_id, 相似度, 分析结果) 或 None；near_dup 为空时返回 (None, None)
+    """
+    if near_dup is None:
+        return None, None
+    text = post_text(post)
+    signature = near_dup.signature(text)
+    return near_dup.find(text, signature), signature
+
+
+def reuse_result(post, match):
+    doc_id, score, analysis_json = match
+    METRICS.inc("near_dup_reused_total")
+    METRICS.inc("near_dup_tokens_avoided_total", count_tokens(post_text(post)))
+    result = build_result(post, analysis_json)
+    result["near_duplicate_of"] = doc_id
+    result["near_duplicate_similarity"] = round(score, 3)
+    return result
+
+
+def reusable(result):
+    """分析失败时给出的"未知"结果不进近似重复索引，也不给近似重复的帖子复用"""
+    return result.get("sentiment", "未知") != "未知"
+
+
+def remember(near_dup, post, result, signature):
+    if near_dup is not None and reusable(result):
+        near_dup.add(post["url"], None, {"sentiment": result["sentiment"], "reason": result["reason"]}, signature)
+
+
+# ========== 分析单条帖子 ==========
+def analyze_post(post):
+    text = post_text(post)
+    if count_tokens(text) > POST_TOKEN_BUDGET and post["comments"]:
+        return build_result(post, analyze_long_post(post))
+    return build_result(post, analyze_text(text))
+
+
+def analyze_long_post(post):
+    """
+    超长帖子：评论按 token 预算分块，每块连同正文一起并发分析，再加权汇总
+    （帖子是逐条分析的，外层没有线程池，这里并发分块不会叠加出更多在途请求）
+    """
+    body_tokens = count_tokens(post["body"] + "\n")
+    budget = max(POST_TOKEN_BUDGET - body_tokens, POST_TOKEN_BUDGET // 4)
+    return analyze_chunked(
+        post["comments"].split("\n"),
+        lambda chunk: analyze_text(post["body"] + "\n" + chunk),
+        budget=budget,
+        max_workers=CHUNK_WORKERS
+    )
+
 
+def analyze_text(text):
     prompt = (
         "你是中文情感分析专家。"
         "请分析下面这段文字的情感倾向（积极、消极、中性），"
@@ -33,37 +154,249 @@ for idx, post in enumerate(posts, 1):
         '{"sentiment": "...", "reason": "..."}\n\n文字:\n' + text
     )
 
-    try:
-        resp = client.chat.completions.create(
-            model=MODEL,
-            messages=[{"role": "user", "content": prompt}]
-        )
+    cache = get_cache()
+    cache_key = LLMCache.make_key(MODEL, PROMPT_VERSION, None, text)
+    analysis_json = cache.get(cache_key)
+    if analysis_json is None:
+        resp = create_completion(prompt)
         analysis_text = resp.choices[0].message.content.strip()
 
-        # 尝试解析 JSON，如果模型返回的是 JSON 字符串
+        # 尝试解析 JSON，如果模型返回的是 JSON 字符串；解析失败的结果不写缓存，下次重新请求
         try:
             analysis_json = json.loads(analysis_text)
-        except:
-            analysis_json = {"sentiment": "未知", "reason": analysis_text}
+        except ValueError:
+            return {"sentiment": "未知", "reason": analysis_text}
+        cache.put(cache_key, analysis_json)
+
+    return analysis_json
+
+
+# ========== 多帖合并请求 ==========
+def pack_batches(posts, budget=BATCH_TOKEN_BUDGET):
+    """按 token 预算把帖子贪心装箱，单条超预算的帖子单独成批"""
+    batches, current, used = [], [], 0
+    for post in posts:
+        n = count_tokens(post_text(post))
+        if current and used + n > budget:
+            batches.append(current)
+            current, used = [], 0
+        current.append(post)
+        used += n
+    if current:
+        batches.append(current)
+    return batches
+
+
+def parse_batch_response(text, n):
+    """解析按 index 返回的 JSON 数组，只保留合法的条目"""
+    text = text.strip()
+    if text.startswith("```"):
+        text = text.strip("`")
+        text = text[text.find("["):]
+    items = json.loads(text)
+    if not isinstance(items, list):
+        raise ValueError("返回的不是 JSON 数组")
+
+    results = {}
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        idx = item.get("index")
+        if isinstance(idx, int) and 0 <= idx < n and item.get("sentiment"):
+            results[idx] = {"sentiment": item["sentiment"], "reason": item.get("reason", "")}
+    return results
+
+
+def analyze_batch(batch):
+    """
+    一个请求分析多条帖子，返回 {批内序号: 分析结果}
+    缺失或解析失败的序号不在结果里，由调用方单独重跑
+    """
+    docs = "\n\n".join(f"[{i}]\n{post_text(post)}" for i, post in enumerate(batch))
+    prompt = (
+        "你是中文情感分析专家。"
+        f"下面有 {len(batch)} 段文字，每段以 [序号] 开头。"
+        "请分别分析每段文字的情感倾向（积极、消极、中性），并给出简短理由。"
+        "只返回一个 JSON 数组，每段对应一个元素，不要遗漏："
+        '[{"index": 序号, "sentiment": "...", "reason": "..."}]\n\n' + docs
+    )
+    resp = create_completion(prompt)
+    return parse_batch_response(resp.choices[0].message.content, len(batch))
+
+
+def analyze_posts_batched(posts, output_file, resume=False, budget=BATCH_TOKEN_BUDGET, near_dup=None):
+    """
+    批量模式：多条帖子装进一个请求，请求数成倍减少
+    批次失败或返回不全时，缺失的帖子逐条重跑
+    near_dup 不为空时，与已分析帖子近似重复的直接复用结果；
+    本次待分析帖子之间的近似重复只分析第一条，其余跟随它的结果
+    """
+    requests_sent = 0
+    cache = get_cache()
+    signatures = {}
+    followers = {}  # 本次待分析帖子的 url -> 与它近似重复、等它出结果的帖子
+    # 本次待分析的帖子只记在内存索引里，持久化索引只收录分析成功的结果
+    run_index = None
+    if near_dup is not None:
+        run_index = NearDupIndex(":memory:", namespace=near_dup.namespace, threshold=near_dup.threshold)
+    with JsonlWriter(output_file, key="url", resume=resume) as writer:
+        pending = []
+        for post in posts:
+            if writer.seen(post["url"]):
+                continue
+            cached = cache.get(LLMCache.make_key(MODEL, BATCH_PROMPT_VERSION, None, post_text(post)))
+            if cached is not None:
+                writer.write(build_result(post, cached))
+                continue
+            match, signatures[post["url"]] = find_near_duplicate(near_dup, post)
+            if match is not None and match[2] is not None:
+                writer.write(reuse_result(post, match))
+                continue
+            if run_index is not None:
+                match = run_index.find(None, signatures[post["url"]])
+                if match is not None:
+                    followers[match[0]].append((post, match))
+                    continue
+                followers[post["url"]] = []
+                run_index.add(post["url"], None, signature=signatures[post["url"]])
+            pending.append(post)
+
+        def analyze_one(post):
+            """逐条分析一条帖子并写出，失败返回 None"""
+            nonlocal requests_sent
+            try:
+                result = analyze_post(post)
+                requests_sent += 1
+            except Exception as e:
+                print(f"⚠️ 分析失败：帖子 '{post['title']}'，原因：{e}")
+                return None
+            writer.write(result)
+            print(f"已分析帖子 '{post['title']}' 情感: {result['sentiment']}")
+            remember(near_dup, post, result, signatures.get(post["url"]))
+            return result
+
+        for batch in pack_batches(pending, budget):
+            analyses = {}
+            if len(batch) > 1:
+                requests_sent += 1
+                try:
+                    analyses = analyze_batch(batch)
+                except Exception as e:
+                    print(f"⚠️ 批量请求失败（{len(batch)} 条），改为逐条分析：{e}")
+
+            for i, post in enumerate(batch):
+                if i in analyses:
+                    cache.put(LLMCache.make_key(MODEL, BATCH_PROMPT_VERSION, None, post_text(post)), analyses[i])
+                    result = build_result(post, analyses[i])
+                    writer.write(result)
+                    print(f"已分析帖子 '{post['title']}' 情感: {result['sentiment']}")
+                    remember(near_dup, post, result, signatures.get(post["url"]))
+                else:
+                    result = analyze_one(post)
+                for follower, (_, score, _) in followers.get(post["url"], []):
+                    if result is not None and reusable(result):
+                        analysis = {"sentiment": result["sentiment"], "reason": result["reason"]}
+                        writer.write(reuse_result(follower, (post["url"], score, analysis)))
+                    else:
+                        # 第一条失败或结果为"未知"，近似重复的帖子各自分析
+                        analyze_one(follower)
+
+            time.sleep(SLEEP_TIME)  # 控制请求频率
+
+    if run_index is not None:
+        run_index.close()
+    print(f"📦 批量模式：{len(pending)} 条帖子共发送 {requests_sent} 个请求")
+    return writer
+
+
+# ========== 分析情感 ==========
+def analyze_posts(posts, output_file, resume=False, near_dup=None):
+    """
+    逐条分析并流式写入 JSONL，resume=True 时跳过输出中已有的帖子
+    near_dup 不为空时，与已分析帖子近似重复的直接复用结果
+    """
+    cache = get_cache()
+    with JsonlWriter(output_file, key="url", resume=resume) as writer:
+        for idx, post in enumerate(posts, 1):
+            if writer.seen(post["url"]):
+                continue
+            match, signature = find_near_duplicate(near_dup, post)
+            if match is not None and match[2] is not None:
+                writer.write(reuse_result(post, match))
+                print(f"[{idx}/{len(posts)}] ♻️ 与已分析帖子近似重复（相似度 {match[1]:.0%}），复用结果: '{post['title']}'")
+                continue
+            misses = cache.misses
+            try:
+                result = analyze_post(post)
+                writer.write(result)
+                remember(near_dup, post, result, signature)
+                print(f"[{idx}/{len(posts)}] 已分析帖子 '{post['title']}' 情感: {result['sentiment']}")
+
+            except Exception as e:
+                print(f"⚠️ 分析失败：帖子 '{post['title']}'，原因：{e}")
+
+            if cache.misses != misses:
+                time.sleep(SLEEP_TIME)  # 控制请求频率（命中缓存时不需要）
+
+    return writer
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="OpenAI 论坛帖子情感分析")
+    parser.add_argument("-i", "--input", default=INPUT_FILE, help="爬虫输出的 JSON 文件")
+    parser.add_argument("-o", "--output", default=OUTPUT_FILE,
+                        help="结果文件：.json 为 JSON 数组（默认，边分析边写同名 .jsonl 检查点，结束时导出），"
+                             ".jsonl 时直接流式写出")
+    parser.add_argument("-n", "--limit", type=int, default=None, help="只分析前 N 个帖子")
+    parser.add_argument("--batch", action="store_true", help="多帖合并为一个请求")
+    parser.add_argument("--resume", action="store_true", help="跳过输出中已有的帖子")
+    parser.add_argument("--dedup-threshold", type=float, default=None,
+                        help="与已分析帖子的相似度不低于该值时直接复用结果（例如 0.9），默认关闭")
+    parser.add_argument("--aggregates", default=AGGREGATES_PATH,
+                        help="跨运行情感聚合库（按日 / 来源 / 板块累计），空字符串关闭")
+    parser.add_argument("--metrics", default=METRICS_PATH,
+                        help="运行指标输出文件（.prom 为 Prometheus textfile，否则 JSON），空字符串关闭")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    try:
+        # ========== 读取帖子 ==========
+        with open(args.input, "r", encoding="utf-8") as f:
+            posts = json.load(f)
+        if args.limit:
+            posts = posts[:args.limit]
 
-        results.append({
-            "title": post["title"],
-            "url": post["url"],
-            "comment_count": post["comment_count"],
-            "post_time": post.get("post_time", ""),
-            "sentiment": analysis_json.get("sentiment", "未知"),
-            "reason": analysis_json.get("reason", "")
-        })
+        print(f"总帖子数: {len(posts)}")
 
-        print(f"[{idx}/{len(posts)}] 已分析帖子 '{post['title']}' 情感: {analysis_json.get('sentiment', '未知')}")
+        # 分析过程总是流式写 JSONL 检查点（--resume 从这里继续），输出为 .json 时结束后导出 JSON 数组
+        checkpoint = args.output if args.output.endswith(".jsonl") else str(Path(args.output).with_suffix(".jsonl"))
+        near_dup = get_near_dup_index(args.dedup_threshold) if args.dedup_threshold else None
+        with MetricsReporter(args.metrics, interval=30, job="openai_analysis"):
+            if args.batch:
+                writer = analyze_posts_batched(posts, checkpoint, resume=args.resume, near_dup=near_dup)
+            else:
+                writer = analyze_posts(posts, checkpoint, resume=args.resume, near_dup=near_dup)
+        if checkpoint != args.output:
+            export_json(checkpoint, args.output)
 
-    except Exception as e:
-        print(f"⚠️ 分析失败：帖子 '{post['title']}'，原因：{e}")
+        stats = get_cache().stats()
+        print(f"🗃️ LLM 缓存: 命中 {stats['hits']} 次 | 未命中 {stats['misses']} 次 | 命中率 {stats['hit_rate']:.1%}")
+        if near_dup is not None:
+            print(f"♻️ 近似重复: 复用 {METRICS.counter_value('near_dup_reused_total')} 条结果，"
+                  f"少分析约 {METRICS.counter_value('near_dup_tokens_avoided_total')} tokens")
 
-    time.sleep(SLEEP_TIME)  # 控制请求频率
+        # 输出里已计入聚合库的帖子会被跳过，只累加新结果
+        aggregator = open_aggregator(args.aggregates)
+        if aggregator is not None:
+            with aggregator:
+                aggregator.add_many(iter_jsonl(checkpoint), source="bakusai_forum")
+                print_trend(aggregator, source="bakusai_forum")
+        print(f"\n🎉 完成：本次分析 {writer.written} 条帖子，共 {len(writer.done)} 条，结果已保存到 {args.output}")
+    finally:
+        close_cache()
 
-# ========== 保存结果 ==========
-with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
-    json.dump(results, f, ensure_ascii=False, indent=2)
 
-print(f"\n🎉 完成：共分析 {len(results)} 条帖子情感，结果已保存到 {OUTPUT_FILE}")
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+import threading
+
+# 进程级的懒加载注册表：LLM 客户端、翻译模型等重资源第一次用到时才创建，之后复用同一个实例
+_instances = {}
+_lock = threading.Lock()
+
+
+def get(name, factory):
+    """取名为 name 的实例，不存在时调用 factory() 创建（线程安全，只创建一次）"""
+    instance = _instances.get(name)
+    if instance is not None:
+        return instance
+    with _lock:
+        if name not in _instances:
+            _instances[name] = factory()
+        return _instances[name]
+
+
+def is_loaded(name):
+    return name in _instances
+
+
+def reset(name=None):
+    """丢弃已创建的实例（name 为空时全部丢弃），下次 get 时重新创建"""
+    with _lock:
+        if name is None:
+            _instances.clear()
+        else:
+            _instances.pop(name, None)
@@ -0,0 +1,381 @@
+"""
+跨多次运行的情感聚合（SQLite 持久化，按 日 / 来源 / 板块 累计）
+
+- sentiment_counts: (day, source, board, target, sentiment) -> 条数
+  target: article 新闻正文 / comments 新闻评论区 / post 论坛帖子 / comment 单条评论
+- alignment_counts: (day, source, board) -> 一致条数 / 总条数
+- aggregate_seen: 已计入的 (url, target) 及计入时的 日 / 来源 / 板块 / 情感 / 一致性，
+  同一结果重复送入（--resume、重跑）不会重复计数；结果变了（重新分析）时从旧的桶里减掉、加到新的桶里
+  "未知"（解析失败等）不计数也不记为已计入，下次分析成功时照常计入
+
+新结果先进缓冲区，flush 时用 pandas 分组汇总后一次性累加进表里；
+报表直接在汇总表上做 pivot / resample，一年的数据也只有几千行，秒内出结果
+
+    python data_analyze/sentiment_aggregates.py ingest deepseek_news_sentiment_result.json forum_crawl/bakusai_sentiment.json
+    python data_analyze/sentiment_aggregates.py report --freq W --days 365 --format csv
+"""
+import argparse
+import re
+import sqlite3
+import sys
+import threading
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+# 让脚本直接运行时也能导入 demo 包
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from demo.corpus_store import parse_date, source_of
+from demo.streaming import load_json_records
+from data_analyze.sentiment_backends import SENTIMENT_LABELS
+
+AGGREGATES_PATH = "sentiment_aggregates.sqlite3"
+SENTIMENTS = ("积极", "中性", "消极", "无评论", "未知")
+_BOARD_RE = re.compile(r"bid=(\d+)")
+_SEEN_CHUNK = 500
+
+
+def board_of(url):
+    """爆サイ的板块 id（bid=...），其它来源为空字符串"""
+    match = _BOARD_RE.search(url or "")
+    return match.group(1) if match else ""
+
+
+def normalize_sentiment(label):
+    label = (label or "").strip()
+    return SENTIMENT_LABELS.get(label.lower(), label) or "未知"
+
+
+def result_rows(result, source=None, analyzed_at=None):
+    """
+    一条分析结果 -> 情感行列表 [{url, day, source, board, target, sentiment, alignment}]
+    新闻结果没有发布日期时按分析日期计
+    """
+    if not isinstance(result, dict) or "error" in result:
+        return []
+    url = result.get("url", "")
+    published = parse_date(result.get("post_time") or result.get("date") or result.get("post_date"))
+    day = (published or analyzed_at or datetime.now()).strftime("%Y-%m-%d")
+    base = {
+        "url": url, "day": day, "source": source or source_of(url), "board": board_of(url),
+    }
+
+    if "article_sentiment" in result:
+        alignment = result.get("sentiment_alignment")
+        return [
+            {**base, "target": "article", "sentiment": normalize_sentiment(result["article_sentiment"].get("sentiment")),
+             "alignment": alignment},
+            # alignment 只在 article 行上记一次
+            {**base, "target": "comments", "sentiment": normalize_sentiment(result["comment_sentiment"].get("sentiment")),
+             "alignment": None},
+        ]
+    if "sentiment" in result:
+        return [{**base, "target": "post", "sentiment": normalize_sentiment(result["sentiment"]), "alignment": None}]
+    # 本地模型逐条打分的帖子：comments 为 [{"text", "sentiment", "score"}]
+    return [
+        {**base, "url": f"{url}#{no}", "target": "comment", "sentiment": normalize_sentiment(c.get("sentiment")),
+         "alignment": None}
+        for no, c in enumerate(result.get("comments") or [], 1)
+        if isinstance(c, dict) and c.get("sentiment")
+    ]
+
+
+class SentimentAggregator:
+    """
+    增量情感聚合
+    add() 只把结果放进缓冲区，攒够 batch_size 条或调用 flush() / close() 时写入
+    report() 返回按 freq（D / W / M ...）重采样的时间序列 DataFrame
+    """
+
+    def __init__(self, path=AGGREGATES_PATH, batch_size=500):
+        self.path = path
+        self.batch_size = batch_size
+        self.buffer = []
+        self.added = 0
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS sentiment_counts (
+                day TEXT NOT NULL,
+                source TEXT NOT NULL,
+                board TEXT NOT NULL,
+                target TEXT NOT NULL,
+                sentiment TEXT NOT NULL,
+                count INTEGER NOT NULL,
+                PRIMARY KEY (day, source, board, target, sentiment)
+            )
+        """)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS alignment_counts (
+                day TEXT NOT NULL,
+                source TEXT NOT NULL,
+                board TEXT NOT NULL,
+                aligned INTEGER NOT NULL,
+                total INTEGER NOT NULL,
+                PRIMARY KEY (day, source, board)
+            )
+        """)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS aggregate_seen (
+                url TEXT NOT NULL,
+                target TEXT NOT NULL,
+                day TEXT NOT NULL,
+                source TEXT NOT NULL,
+                board TEXT NOT NULL,
+                sentiment TEXT NOT NULL,
+                alignment TEXT,
+                PRIMARY KEY (url, target)
+            )
+        """)
+        self.conn.commit()
+
+    # ========== 写入 ==========
+    def add(self, result, source=None, analyzed_at=None):
+        rows = result_rows(result, source, analyzed_at)
+        with self._lock:
+            self.buffer.extend(rows)
+            full = len(self.buffer) >= self.batch_size
+        if full:
+            self.flush()
+
+    def add_many(self, results, source=None, analyzed_at=None):
+        for result in results:
+            self.add(result, source, analyzed_at)
+        self.flush()
+
+    def _known(self, keys):
+        """已计入的行 {(url, target): (day, source, board, sentiment, alignment)}，分块查询"""
+        known = {}
+        urls = sorted({url for url, _ in keys})
+        for i in range(0, len(urls), _SEEN_CHUNK):
+            chunk = urls[i:i + _SEEN_CHUNK]
+            for url, target, *counted in self.conn.execute(
+                "SELECT url, target, day, source, board, sentiment, alignment FROM aggregate_seen "
+                f"WHERE url IN ({','.join('?' * len(chunk))})", chunk
+            ):
+                known[(url, target)] = tuple(counted)
+        return known
+
+    def flush(self):
+        import pandas as pd
+
+        with self._lock:
+            rows, self.buffer = self.buffer, []
+            if not rows:
+                return 0
+            df = pd.DataFrame(rows).drop_duplicates(["url", "target"], keep="last")
+            df = df[df["sentiment"] != "未知"]
+            if df.empty:
+                return 0
+
+            # 和已计入的行比较：没变的跳过，变了的先减掉旧的
+            known = self._known(zip(df["url"], df["target"]))
+            columns = ["day", "source", "board", "sentiment", "alignment"]
+            new_values = df[columns].astype(object).where(df[columns].notna(), None)
+            changed = [
+                known.get((url, target)) != tuple(values)
+                for url, target, values in zip(df["url"], df["target"], new_values.itertuples(index=False))
+            ]
+            df = df[changed]
+            if df.empty:
+                return 0
+            old = pd.DataFrame(
+                [(url, target, *known[(url, target)]) for url, target in zip(df["url"], df["target"])
+                 if (url, target) in known],
+                columns=["url", "target", *columns],
+            )
+            delta = pd.concat([df.assign(weight=1), old.assign(weight=-1)], ignore_index=True)
+
+            counts = delta.groupby(["day", "source", "board", "target", "sentiment"])["weight"].sum()
+            counts = counts[counts != 0]
+            aligned = delta[delta["alignment"].notna()]
+            alignment = aligned.assign(
+                aligned=(aligned["alignment"] == "一致").astype(int) * aligned["weight"]
+            ).groupby(["day", "source", "board"])[["aligned", "weight"]].sum()
+
+            with self.conn:
+                self.conn.executemany("""
+                    INSERT INTO sentiment_counts (day, source, board, target, sentiment, count)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(day, source, board, target, sentiment) DO UPDATE SET
+                        count = count + excluded.count
+                """, [(*key, int(n)) for key, n in counts.items()])
+                self.conn.executemany("""
+                    INSERT INTO alignment_counts (day, source, board, aligned, total)
+                    VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT(day, source, board) DO UPDATE SET
+                        aligned = aligned + excluded.aligned,
+                        total = total + excluded.total
+                """, [(*key, int(a), int(n)) for key, (a, n) in alignment.iterrows()])
+                # 减到 0 的桶删掉，报表里不留空行
+                self.conn.execute("DELETE FROM sentiment_counts WHERE count <= 0")
+                self.conn.execute("DELETE FROM alignment_counts WHERE total <= 0")
+                self.conn.executemany("""
+                    INSERT OR REPLACE INTO aggregate_seen (url, target, day, source, board, sentiment, alignment)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                """, [(url, target, *values) for url, target, values in zip(
+                    df["url"], df["target"], new_values[changed].itertuples(index=False))])
+            self.added += len(df)
+            return len(df)
+
+    # ========== 报表 ==========
+    def _frame(self, table, since=None, until=None, source=None, board=None, target=None):
+        import pandas as pd
+
+        sql = f"SELECT * FROM {table} WHERE 1=1"
+        params = []
+        for column, op, value in (("day", ">=", since), ("day", "<", until), ("source", "=", source),
+                                  ("board", "=", board), ("target", "=", target)):
+            if value is not None and (column != "target" or table == "sentiment_counts"):
+                sql += f" AND {column} {op} ?"
+                params.append(str(value))
+        with self._lock:
+            df = pd.read_sql_query(sql, self.conn, params=params)
+        df["day"] = pd.to_datetime(df["day"])
+        return df
+
+    def report(self, freq="D", since=None, until=None, source=None, board=None, target=None, by=None):
+        """
+        时间序列报表：每个周期一行，各情感条数、占比、一致率
+        by 可以是 "source" / "board"，结果多一层分组（列为 MultiIndex 前的分组键）
+        """
+        import pandas as pd
+
+        counts = self._frame("sentiment_counts", since, until, source, board, target)
+        alignment = self._frame("alignment_counts", since, until, source, board)
+        if target not in (None, "article"):
+            # 一致率只记在 article 行上，按其它 target 筛选时不带一致率
+            alignment = alignment.iloc[0:0]
+        if counts.empty:
+            return pd.DataFrame(columns=["total", "aligned", "aligned_total", "alignment_rate"])
+        keys = [by] if by else []
+
+        table = counts.pivot_table(
+            index=["day", *keys], columns="sentiment", values="count", aggfunc="sum", fill_value=0
+        )
+        table = table.reindex(columns=[s for s in SENTIMENTS if s in table.columns]
+                              + [c for c in table.columns if c not in SENTIMENTS], fill_value=0)
+        table.columns = list(table.columns)
+        aligned = alignment.groupby(["day", *keys])[["aligned", "total"]].sum()
+        # outer join 后缺失值变成 NaN，补 0 后转回整数
+        frame = table.join(aligned.rename(columns={"total": "aligned_total"}), how="outer").fillna(0).astype(int)
+
+        # 按周期重采样（分组键保留在索引里）
+        if keys:
+            frame = frame.groupby([pd.Grouper(level="day", freq=freq), *keys]).sum()
+        else:
+            frame = frame.resample(freq).sum()
+
+        sentiment_cols = [c for c in frame.columns if c not in ("aligned", "aligned_total")]
+        total = frame[sentiment_cols].sum(axis=1)
+        frame["total"] = total
+        for s in ("积极", "中性", "消极"):
+            if s in frame.columns:
+                frame[f"{s}_ratio"] = (frame[s] / total.where(total > 0)).round(4)
+        frame["alignment_rate"] = (frame["aligned"] / frame["aligned_total"].where(frame["aligned_total"] > 0)).round(4)
+        return frame
+
+    def totals(self, since=None, until=None, source=None):
+        """区间内各 target 的情感分布 {target: {sentiment: count}}"""
+        counts = self._frame("sentiment_counts", since, until, source)
+        grouped = counts.groupby(["target", "sentiment"])["count"].sum()
+        result = {}
+        for (target, sentiment), n in grouped.items():
+            result.setdefault(target, {})[sentiment] = int(n)
+        return result
+
+    def close(self):
+        self.flush()
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_aggregator(path=AGGREGATES_PATH):
+    """path 为空或没装 pandas 时返回 None（不做跨运行聚合）"""
+    if not path:
+        return None
+    try:
+        import pandas  # noqa: F401
+    except ImportError:
+        print("⚠️ 未安装 pandas，跳过跨运行情感聚合")
+        return None
+    return SentimentAggregator(path)
+
+
+def print_trend(aggregator, days=30, source=None):
+    """打印最近 days 天（按天）的累计趋势，供分析脚本结束时调用"""
+    since = (date.today() - timedelta(days=days - 1)).isoformat()
+    frame = aggregator.report("D", since=since, source=source)
+    frame = frame[frame["total"] > 0]
+    print("\n" + "=" * 60)
+    print(f"📈 最近 {days} 天情感趋势（跨运行累计）")
+    print("=" * 60)
+    if frame.empty:
+        print("  暂无数据")
+        return
+    for day, row in frame.iterrows():
+        parts = [f"{s} {int(row[s])}" for s in ("积极", "中性", "消极") if s in row and row[s]]
+        line = f"  {day:%Y-%m-%d} | 共 {int(row['total'])} 条 | " + " / ".join(parts)
+        if row["aligned_total"]:
+            line += f" | 一致率 {row['alignment_rate']:.0%}"
+        print(line)
+
+
+# ========== 命令行 ==========
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="情感聚合：导入历史结果 / 输出时间序列报表")
+    parser.add_argument("--db", default=AGGREGATES_PATH, help="聚合数据库")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("ingest", help="导入分析结果文件（JSON / JSONL）")
+    p.add_argument("inputs", nargs="+")
+    p.add_argument("--source", default=None, help="指定来源（默认按 url 判断）")
+
+    r = sub.add_parser("report", help="输出时间序列报表")
+    r.add_argument("--freq", default="D", help="D 按天 / W 按周 / MS 按月")
+    r.add_argument("--days", type=int, default=365, help="统计最近 N 天")
+    r.add_argument("--source", default=None)
+    r.add_argument("--board", default=None)
+    r.add_argument("--target", default=None, choices=["article", "comments", "post", "comment"])
+    r.add_argument("--by", default=None, choices=["source", "board"])
+    r.add_argument("--format", default="table", choices=["table", "csv", "json"])
+    r.add_argument("-o", "--output", default=None, help="写到文件（默认打印）")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    with SentimentAggregator(args.db) as aggregator:
+        if args.command == "ingest":
+            for path in args.inputs:
+                before = aggregator.added
+                aggregator.add_many(load_json_records(path), source=args.source)
+                print(f"📥 {path}: 新计入 {aggregator.added - before} 条")
+            return
+
+        since = (date.today() - timedelta(days=args.days - 1)).isoformat()
+        frame = aggregator.report(args.freq, since=since, source=args.source, board=args.board,
+                                  target=args.target, by=args.by)
+        if args.format == "csv":
+            text = frame.to_csv()
+        elif args.format == "json":
+            text = frame.reset_index().to_json(orient="records", date_format="iso", force_ascii=False)
+        else:
+            text = frame.to_string()
+        if args.output:
+            Path(args.output).write_text(text, encoding="utf-8")
+            print(f"💾 报表已保存至：{args.output}")
+        else:
+            print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+import threading
+
+from data_analyze import registry
+
+SENTIMENT_LABELS = {
+    # 三分类模型
+    "positive": "积极", "neutral": "中性", "negative": "消极",
+    "pos": "积极", "neu": "中性", "neg": "消极",
+    # 1~5 星评分模型
+    "1 star": "消极", "2 stars": "消极", "3 stars": "中性", "4 stars": "积极", "5 stars": "积极",
+}
+
+
+class SentimentBackend:
+    """
+    情感分析后端的统一接口，返回 {"sentiment": 积极/中性/消极/未知, "reason": ...}
+    batched=True 的后端可以先用 prefetch 一次性批量算好，之后 analyze 直接取结果
+    """
+
+    name = "base"
+    batched = False
+
+    def __init__(self):
+        self._memo = {}
+
+    def analyze(self, text, target_name="文本"):
+        memo = self._memo.get((target_name, text))
+        if memo is not None:
+            return memo
+        return self._analyze(text, target_name)
+
+    def _analyze(self, text, target_name):
+        raise NotImplementedError
+
+    def analyze_batch(self, texts, target_name="文本"):
+        return [self.analyze(t, target_name) for t in texts]
+
+    def prefetch(self, items):
+        """items: [(target_name, text), ...]；非批量后端什么也不做"""
+        if not self.batched:
+            return
+        by_target = {}
+        for target_name, text in items:
+            if text and (target_name, text) not in self._memo:
+                by_target.setdefault(target_name, []).append(text)
+        for target_name, texts in by_target.items():
+            texts = list(dict.fromkeys(texts))
+            for text, result in zip(texts, self.analyze_batch(texts, target_name)):
+                self._memo[(target_name, text)] = result
+
+
+class DeepSeekBackend(SentimentBackend):
+    """config.py 里的 DeepSeek 接口"""
+
+    name = "deepseek"
+
+    def __init__(self, analyze_fn=None):
+        super().__init__()
+        if analyze_fn is None:
+            from data_analyze.config import analyze_sentiment as analyze_fn
+        self.analyze_fn = analyze_fn
+
+    def _analyze(self, text, target_name):
+        return self.analyze_fn(text, target_name)
+
+
+class OpenAIBackend(SentimentBackend):
+    """openai_based_sentimental.py 里的 OpenAI 接口（提示词不区分文本类型）"""
+
+    name = "openai"
+
+    def __init__(self):
+        super().__init__()
+        from data_analyze.openai_based_sentimental import analyze_text
+        self.analyze_fn = analyze_text
+
+    def _analyze(self, text, target_name):
+        return self.analyze_fn(text)
+
+
+class LocalTransformersBackend(SentimentBackend):
+    """
+    本地 transformers 文本分类模型，CPU 上批量推理
+    默认模型支持日文 / 中文，输出 positive / neutral / negative
+    """
+
+    name = "local"
+    batched = True
+    DEFAULT_MODEL = "lxyuan/distilbert-base-multilingual-cased-sentiments-student"
+
+    def __init__(self, model_name=DEFAULT_MODEL, batch_size=32):
+        super().__init__()
+        self.model_name = model_name
+        self.batch_size = batch_size
+
+    def _pipeline(self):
+        def load():
+            from transformers import pipeline
+            print(f"⏳ 加载本地情感模型 {self.model_name} ...")
+            return pipeline("text-classification", model=self.model_name, device=-1)
+        return registry.get(f"sentiment:{self.model_name}", load)
+
+    def _to_result(self, output):
+        label = output["label"].lower()
+        score = float(output["score"])
+        return {
+            "sentiment": SENTIMENT_LABELS.get(label, "未知"),
+            "reason": f"本地模型 {self.model_name} 判定为 {output['label']}（置信度 {score:.2f}）",
+            "confidence": score,
+        }
+
+    def _analyze(self, text, target_name):
+        return self.analyze_batch([text], target_name)[0]
+
+    def analyze_batch(self, texts, target_name="文本"):
+        results = [None] * len(texts)
+        todo = []
+        for i, text in enumerate(texts):
+            if not text.strip():
+                results[i] = {"sentiment": "中性", "reason": "文本内容为空或信息量不足，无法体现明显情感倾向。", "confidence": 1.0}
+            else:
+                todo.append(i)
+        if todo:
+            # 按长度排序再分批，减少 padding
+            todo.sort(key=lambda i: len(texts[i]))
+            outputs = self._pipeline()(
+                [texts[i] for i in todo], batch_size=self.batch_size, truncation=True
+            )
+            for i, output in zip(todo, outputs):
+                results[i] = self._to_result(output)
+        return results
+
+
+class CascadeBackend(SentimentBackend):
+    """
+    先用本地模型批量初筛，置信度低于 threshold 的再交给 LLM
+    prefetch 只批量跑本地模型；交给 LLM 的那部分在 analyze 里逐条发生，
+    由调用方的线程池并发执行，受它的并发上限约束
+    """
+
+    name = "cascade"
+    batched = True
+
+    def __init__(self, local, llm, threshold=0.7):
+        super().__init__()
+        self.local = local
+        self.llm = llm
+        self.threshold = threshold
+        self.escalated = 0
+        self._lock = threading.Lock()
+
+    def prefetch(self, items):
+        self.local.prefetch(items)
+
+    def _escalate(self, text, target_name, result):
+        if result.get("confidence", 0.0) >= self.threshold:
+            return result
+        with self._lock:
+            self.escalated += 1
+        return self.llm.analyze(text, target_name)
+
+    def _analyze(self, text, target_name):
+        return self._escalate(text, target_name, self.local.analyze(text, target_name))
+
+    def analyze_batch(self, texts, target_name="文本"):
+        results = self.local.analyze_batch(texts, target_name)
+        return [self._escalate(t, target_name, r) for t, r in zip(texts, results)]
+
+
+def get_backend(name, llm=None, threshold=0.7):
+    """按名字创建后端：deepseek / openai / local / cascade（cascade 默认用 deepseek 兜底）"""
+    if name == "deepseek":
+        return llm or DeepSeekBackend()
+    if name == "openai":
+        return OpenAIBackend()
+    if name == "local":
+        return LocalTransformersBackend()
+    if name == "cascade":
+        return CascadeBackend(LocalTransformersBackend(), llm or DeepSeekBackend(), threshold)
+    raise ValueError(f"未知情感后端: {name}")
@@ -1,23 +1,82 @@
+import argparse
 import json
-from tqdm import tqdm
-from transformers import M2M100ForConditionalGeneration, M2M100Tokenizer
+import sys
+import time
+from pathlib import Path
 import os
 
+# 让脚本直接运行时也能导入 data_analyze 包
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from demo.metrics import METRICS, MetricsReporter
+from data_analyze.translation_cache import TranslationCache, normalize_text
+from data_analyze import registry
+
 os.environ["HF_HUB_DISABLE_SYMLINKS_WARNING"] = "1"
 
 # 文件路径
 INPUT_FILE = "forum_crawl/bakusai_current_month.json"
 OUTPUT_FILE = "bakusai_current_month_translated.json"
+TRANSLATION_CACHE_PATH = "translation_cache.sqlite3"
+METRICS_PATH = "metrics/translation.prom"
 
-# 加载 M2M100 模型
+# M2M100 模型（第一次翻译时才加载，进程内只加载一次）
 model_name = "facebook/m2m100_418M"
-tokenizer = M2M100Tokenizer.from_pretrained(model_name)
-model = M2M100ForConditionalGeneration.from_pretrained(model_name)
+
+# 推理后端：fp32 原始模型 / int8 动态量化 / onnx（ONNX Runtime，编码器和解码器会话缓存到磁盘）
+BACKENDS = ("fp32", "int8", "onnx")
+backend = "fp32"
+ONNX_CACHE_DIR = Path(__file__).resolve().parent / "onnx_cache" / model_name.replace("/", "__")
+
+
+def set_backend(name):
+    global backend
+    if name not in BACKENDS:
+        raise ValueError(f"未知后端: {name}，可选 {BACKENDS}")
+    backend = name
+
+
+def load_translator(name="fp32"):
+    from transformers import M2M100ForConditionalGeneration, M2M100Tokenizer
+
+    print(f"⏳ 加载翻译模型 {model_name}（{name}）...")
+    tokenizer = M2M100Tokenizer.from_pretrained(model_name)
+
+    if name == "onnx":
+        from optimum.onnxruntime import ORTModelForSeq2SeqLM
+
+        # 第一次导出 ONNX 并保存，之后直接加载导出好的会话
+        if (ONNX_CACHE_DIR / "config.json").exists():
+            model = ORTModelForSeq2SeqLM.from_pretrained(ONNX_CACHE_DIR, use_cache=True)
+        else:
+            model = ORTModelForSeq2SeqLM.from_pretrained(model_name, export=True, use_cache=True)
+            model.save_pretrained(ONNX_CACHE_DIR)
+            tokenizer.save_pretrained(ONNX_CACHE_DIR)
+        return tokenizer, model
+
+    model = M2M100ForConditionalGeneration.from_pretrained(model_name)
+    model.eval()
+    if name == "int8":
+        import torch
+
+        # 线性层权重量化为 int8，激活在运行时动态量化
+        model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    return tokenizer, model
+
+
+def get_translator():
+    """返回当前后端的 (tokenizer, model)"""
+    name = backend
+    return registry.get(f"translator:{model_name}:{name}", lambda: load_translator(name))
+
 
 def translate_text(text: str) -> str:
     """单条文本翻译 日文->中文"""
     if not text.strip():
         return ""
+    tokenizer, model = get_translator()
     tokenizer.src_lang = "ja"
     encoded = tokenizer(text, return_tensors="pt", truncation=True)
     generated_tokens = model.generate(
@@ -28,39 +87,175 @@ def translate_text(text: str) -> str:
     zh_text = tokenizer.batch_decode(generated_tokens, skip_special_tokens=True)[0]
     return zh_text
 
+def generate_batch(texts, batch_size=16, max_new_tokens=512):
+    """
+    批量翻译 日文->中文（不走缓存）
+    - 按长度排序后切成批次（长度相近的放一起，padding 最少）
+    - 整批在 inference_mode 下 generate
+    - 结果按原始位置返回，空字符串直接返回 ""
+    返回 (译文列表, 每条分摊的模型秒数列表)
+    """
+    results = [""] * len(texts)
+    seconds = [0.0] * len(texts)
+    order = sorted((i for i, t in enumerate(texts) if t.strip()), key=lambda i: len(texts[i]))
+    if not order:
+        return results, seconds
+
+    import torch
+
+    tokenizer, model = get_translator()
+    tokenizer.src_lang = "ja"
+    forced_bos = tokenizer.get_lang_id("zh")
+    for start in range(0, len(order), batch_size):
+        bucket = order[start:start + batch_size]
+        t0 = time.perf_counter()
+        encoded = tokenizer([texts[i] for i in bucket], return_tensors="pt",
+                            padding=True, truncation=True)
+        with torch.inference_mode():
+            generated_tokens = model.generate(
+                **encoded,
+                forced_bos_token_id=forced_bos,
+                max_new_tokens=max_new_tokens
+            )
+        decoded = tokenizer.batch_decode(generated_tokens, skip_special_tokens=True)
+        batch_seconds = time.perf_counter() - t0
+        METRICS.observe("translation_batch_seconds", batch_seconds, backend=backend)
+        METRICS.inc("translation_sentences_total", len(bucket), backend=backend)
+        per_item = batch_seconds / len(bucket)
+        for i, zh in zip(bucket, decoded):
+            results[i] = zh
+            seconds[i] = per_item
+    return results, seconds
+
+
+def get_translation_cache():
+    return registry.get("translation_cache", lambda: TranslationCache(TRANSLATION_CACHE_PATH))
+
+
+def translate_batch(texts, batch_size=16, max_new_tokens=512, use_cache=True):
+    """
+    批量翻译 日文->中文，结果按原始位置返回
+    use_cache=True 时先按归一化原文去重并查翻译记忆，只有没见过的文本才送进模型
+    """
+    if not use_cache:
+        return generate_batch(texts, batch_size, max_new_tokens)[0]
+
+    cache = get_translation_cache()
+    keys = [
+        TranslationCache.make_key(normalize_text(t), "ja", "zh", f"{model_name}:{backend}") if t.strip() else None
+        for t in texts
+    ]
+    unique = {}
+    for t, key in zip(texts, keys):
+        if key is not None and key not in unique:
+            unique[key] = t
+
+    known = cache.get_many(unique)
+    todo = [k for k in unique if k not in known]
+    translated, seconds = generate_batch([unique[k] for k in todo], batch_size, max_new_tokens)
+    fresh = {k: (zh, sec) for k, zh, sec in zip(todo, translated, seconds)}
+    cache.put_many([(k, normalize_text(unique[k]), zh, sec) for k, (zh, sec) in fresh.items()])
+
+    # 统计：第一次出现且需要模型翻译的算未命中，其余（缓存命中或本批重复）都算命中
+    results = []
+    charged = set()
+    for key in keys:
+        if key is None:
+            results.append("")
+            continue
+        zh, sec = known.get(key) or fresh[key]
+        if key in fresh and key not in charged:
+            charged.add(key)
+            cache.misses += 1
+            METRICS.inc("translation_cache_requests_total", result="miss")
+        else:
+            cache.hits += 1
+            cache.seconds_saved += sec
+            METRICS.inc("translation_cache_requests_total", result="hit")
+            METRICS.inc("translation_cache_seconds_saved_total", sec)
+        results.append(zh)
+    return results
+
+
+def split_comments(comments_list):
+    """评论可能是字符串（爬虫输出按行拼接）、字符串列表或 {"content": ...} 列表"""
+    if isinstance(comments_list, str):
+        return [line for line in comments_list.split("\n") if line.strip()]
+    return [c.get("content", "") if isinstance(c, dict) else str(c) for c in comments_list]
+
+
 def translate_comments(comments_list):
-    """翻译评论列表，每条评论单独处理"""
+    """翻译评论列表（整批翻译）"""
+    contents = split_comments(comments_list)
+    return [
+        {"content": content, "content_zh": zh}
+        for content, zh in zip(contents, translate_batch(contents))
+    ]
+
+
+def translate_posts(data, batch_size=16):
+    """把所有帖子的正文和评论摊平成一个列表整体批量翻译，再写回各帖子"""
+    from tqdm import tqdm
+
+    texts, slots = [], []
+    for post in data:
+        texts.append(post.get("body", ""))
+        slots.append((post, None))
+        for content in split_comments(post.get("comments", [])):
+            texts.append(content)
+            slots.append((post, content))
+
     translated = []
-    for c in comments_list:
-        if isinstance(c, dict):
-            content = c.get("content", "")
-            zh = translate_text(content)
-            translated.append({
-                "content": content,
-                "content_zh": zh
-            })
+    for start in tqdm(range(0, len(texts), batch_size * 8), desc="Translating"):
+        translated.extend(translate_batch(texts[start:start + batch_size * 8], batch_size))
+
+    for post in data:
+        post["comments"] = []
+    for (post, content), zh in zip(slots, translated):
+        if content is None:
+            post["body_zh"] = zh
         else:
-            zh = translate_text(str(c))
-            translated.append({
-                "content": str(c),
-                "content_zh": zh
-            })
-    return translated
-
-# 读取 JSON
-with open(INPUT_FILE, "r", encoding="utf-8") as f:
-    data = json.load(f)
-
-# 遍历每个帖子，翻译正文和评论
-for post in tqdm(data, desc="Translating posts"):
-    # 翻译正文
-    body = post.get("body", "")
-    post["body_zh"] = translate_text(body)
-    # 翻译评论
-    post["comments"] = translate_comments(post.get("comments", []))
-
-# 写入新文件
-with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
-    json.dump(data, f, ensure_ascii=False, indent=2)
-
-print(f"🎉 翻译完成，结果已保存到 {OUTPUT_FILE}")
+            post["comments"].append({"content": content, "content_zh": zh})
+    return data
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="M2M100 日文->中文 帖子翻译")
+    parser.add_argument("-i", "--input", default=INPUT_FILE, help="爬虫输出的 JSON 文件")
+    parser.add_argument("-o", "--output", default=OUTPUT_FILE, help="翻译结果 JSON 文件")
+    parser.add_argument("-n", "--limit", type=int, default=None, help="只翻译前 N 个帖子")
+    parser.add_argument("--batch-size", type=int, default=16, help="每批送进模型的句子数")
+    parser.add_argument("--backend", choices=BACKENDS, default="fp32",
+                        help="推理后端：fp32 / int8 动态量化 / onnx（需要 optimum[onnxruntime]）")
+    parser.add_argument("--metrics", default=METRICS_PATH,
+                        help="运行指标输出文件（.prom 为 Prometheus textfile，否则 JSON），空字符串关闭")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    set_backend(args.backend)
+
+    # 读取 JSON
+    with open(args.input, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if args.limit:
+        data = data[:args.limit]
+
+    start = time.perf_counter()
+    with MetricsReporter(args.metrics, interval=30, job="translation", backend=args.backend):
+        translate_posts(data, batch_size=args.batch_size)
+    print(f"⏱️ 翻译耗时 {time.perf_counter() - start:.1f} 秒")
+    stats = get_translation_cache().stats()
+    print(f"🗃️ 翻译缓存: 命中率 {stats['hit_rate']:.1%}（命中 {stats['hits']} / 未命中 {stats['misses']}），"
+          f"节省模型时间约 {stats['seconds_saved']} 秒")
+
+    # 写入新文件
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+
+    print(f"🎉 翻译完成，结果已保存到 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
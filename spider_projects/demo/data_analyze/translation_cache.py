@@ -0,0 +1,77 @@
+import hashlib
+import re
+import sqlite3
+import threading
+import unicodedata
+
+_SPACE_RE = re.compile(r"\s+")
+
+
+def normalize_text(text):
+    """NFKC 归一化并压缩空白，全角/半角、换行差异不影响命中"""
+    return _SPACE_RE.sub(" ", unicodedata.normalize("NFKC", text)).strip()
+
+
+class TranslationCache:
+    """
+    翻译记忆缓存（SQLite）
+    key = hash(归一化原文, 源语言, 目标语言, 模型)，同时记录当初翻译花费的模型时间，
+    用于统计命中节省的秒数
+    """
+
+    def __init__(self, path="translation_cache.sqlite3"):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self.seconds_saved = 0.0
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS translations (
+                key TEXT PRIMARY KEY,
+                source TEXT NOT NULL,
+                translation TEXT NOT NULL,
+                model_seconds REAL NOT NULL
+            )
+        """)
+        self.conn.commit()
+
+    @staticmethod
+    def make_key(normalized, src_lang, tgt_lang, model):
+        raw = "\x00".join([model, src_lang, tgt_lang, normalized])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get_many(self, keys):
+        """批量查询，返回 {key: (译文, 模型秒数)}"""
+        found = {}
+        keys = list(keys)
+        with self._lock:
+            for start in range(0, len(keys), 500):
+                part = keys[start:start + 500]
+                placeholders = ",".join("?" * len(part))
+                for key, translation, seconds in self.conn.execute(
+                    f"SELECT key, translation, model_seconds FROM translations WHERE key IN ({placeholders})", part
+                ):
+                    found[key] = (translation, seconds)
+        return found
+
+    def put_many(self, rows):
+        """rows: [(key, 归一化原文, 译文, 模型秒数), ...]"""
+        with self._lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO translations (key, source, translation, model_seconds) VALUES (?, ?, ?, ?)",
+                rows
+            )
+            self.conn.commit()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "seconds_saved": round(self.seconds_saved, 2),
+        }
+
+    def close(self):
+        self.conn.close()
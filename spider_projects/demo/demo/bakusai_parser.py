@@ -0,0 +1,135 @@
+"""
+爆サイ页面解析（Scrapy 爬虫和 requests 论坛爬虫共用）
+XPath 和正则都在导入时预编译，空白归一化一次完成
+"""
+import re
+
+from lxml import etree
+
+# ========== 列表页 ==========
+THREAD_ITEMS = etree.XPath("//li[@data-tid]")
+ITEM_TITLE = etree.XPath(".//a[contains(@class,'thr_status_icon')]//text()")
+ITEM_COMMENT_COUNT = etree.XPath(".//span[contains(@class,'comment_count_area')]/span[last()]/text()")
+ITEM_POSTED_AGO = etree.XPath(".//span[@class='thr-posted-ago']//text()")
+
+# ========== 帖子页 ==========
+POST_TIME = etree.XPath("//span[@class='posts' and @itemprop='datePublished']/text()")
+THREAD_BODY = etree.XPath("//div[@id='threadBody']//text()")
+RESBODIES = etree.XPath("//div[contains(@class,'resbody')]")
+ALL_TEXT = etree.XPath(".//text()")
+PAGER_HREFS = etree.XPath("//a[contains(@href,'/tp=')]/@href")
+
+# ========== 新闻详情页（Scrapy 爬虫） ==========
+HEADLINE = etree.XPath("//strong[@itemprop='headline']/text()")
+H1 = etree.XPath("//h1/text()")
+ARTICLE_BODY = etree.XPath("//div[@id='threadBody' and @itemprop='articlebody']//text()")
+COMMENT_TEXTS = etree.XPath(
+    "//div[contains(concat(' ', normalize-space(@class), ' '), ' resbody ')"
+    " and @itemprop='commentText']//text()"
+)
+
+# ========== 正则 ==========
+WS_RE = re.compile(r"\s{2,}|[\t\r\n]")   # 换行/制表符和连续空白一次替换成单个空格
+SPACES_RE = re.compile(r"\s+")
+RES_NO_RE = re.compile(r"#(\d+)")
+RES_HEADER_RE = re.compile(r"#\d+\s*[\d/:\s]*")   # #数字 + 日期
+QUOTE_RE = re.compile(r">>\d+")
+TP_RE = re.compile(r"/tp=(\d+)/")
+HOURS_AGO_RE = re.compile(r"(\d+)時間前")
+MINUTES_AGO_RE = re.compile(r"(\d+)分前")
+
+
+def to_tree(html):
+    """bytes / str -> lxml 树；bytes 交给 lxml 按页面声明的编码解析"""
+    return etree.HTML(html)
+
+
+def normalize_ws(text):
+    return WS_RE.sub(" ", text).strip()
+
+
+# ========== 列表页 ==========
+def parse_list_items(tree):
+    """产出列表页每个帖子的原始字段：tid、标题、评论数、最后回复时间文本"""
+    for li in THREAD_ITEMS(tree):
+        count_text = ITEM_COMMENT_COUNT(li)
+        try:
+            comment_count = int(count_text[0].strip())
+        except (IndexError, ValueError):
+            comment_count = 0
+        yield {
+            "tid": li.get("data-tid"),
+            "title": "".join(ITEM_TITLE(li)).strip(),
+            "comment_count": comment_count,
+            "last_reply_text": "".join(ITEM_POSTED_AGO(li)).strip(),
+        }
+
+
+# ========== 帖子页 ==========
+def parse_post_time_text(tree):
+    texts = POST_TIME(tree)
+    return texts[0].strip() if texts else ""
+
+
+def parse_thread_body(tree):
+    return "".join(THREAD_BODY(tree)).strip()
+
+
+def extract_res_no(content, default):
+    """从评论文本开头的 #数字 取评论编号，取不到时用位置序号"""
+    m = RES_NO_RE.match(content)
+    return int(m.group(1)) if m else default
+
+
+def iter_comments(tree, offset=0):
+    """逐条产出 (评论编号, 评论原文)，offset 为本页之前的评论数"""
+    for idx, res in enumerate(RESBODIES(tree)):
+        content = "".join(ALL_TEXT(res)).strip()
+        yield extract_res_no(content, offset + idx + 1), content
+
+
+def max_pager_page(tree):
+    """分页栏里出现的最大页码，没有分页栏返回 0"""
+    pages = [int(m.group(1)) for m in map(TP_RE.search, PAGER_HREFS(tree)) if m]
+    return max(pages, default=0)
+
+
+def clean_comment(text):
+    """去掉评论头部的 #编号/日期、>>引用，空白归一化"""
+    text = RES_HEADER_RE.sub("", text)
+    text = QUOTE_RE.sub("", text)
+    return SPACES_RE.sub(" ", text.replace("\r", "")).strip()
+
+
+# ========== 新闻详情页 ==========
+def parse_news_detail(html):
+    """
+    新闻详情页 -> {"title", "article_text", "comments"}，没有标题返回 None
+    """
+    tree = to_tree(html)
+    if tree is None:
+        return None
+
+    titles = HEADLINE(tree) or H1(tree)
+    title = titles[0].strip() if titles else ""
+    if not title:
+        return None
+
+    article_text = normalize_ws("".join(ARTICLE_BODY(tree)))
+
+    comments = []
+    for c in COMMENT_TEXTS(tree):
+        c = c.strip()
+        if not c:
+            continue
+        if c.startswith(">>") and c[2:].isdigit():
+            continue
+        if len(c) < 3:
+            continue
+        comments.append(c)
+
+    return {
+        "title": title,
+        "article_text": article_text,
+        "comments": comments,
+    }
@@ -0,0 +1,334 @@
+"""
+列式语料库（Parquet，按 source / month 分区，zstd 压缩）
+
+    corpus/
+      posts/source=bakusai_forum/month=2025-12/part-....parquet
+      comments/...
+      sentiment/...
+
+- posts: 帖子 / 新闻正文，一条一行
+- comments: 评论，一条一行（带所属帖子的 url 和日期，可按日期过滤）
+- sentiment: 情感分析结果（帖子 / 正文 / 评论区 / 单条评论）
+读取时内存映射文件，source / 日期 / 情感条件下推到分区裁剪和行组统计，不需要把整个语料读进内存
+
+    python -m demo.corpus_store convert demo/spiders/forum_crawl/bakusai_current_month.json ...
+    python -m demo.corpus_store query comments --source bakusai_forum --from 2025-12-01 --sentiment 消极
+"""
+import argparse
+import json
+import sys
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from demo.streaming import load_json_records
+
+TABLES = ("posts", "comments", "sentiment")
+PARTITION_COLS = ["source", "month"]
+JST = timezone(timedelta(hours=9))
+
+
+def _schemas():
+    import pyarrow as pa
+
+    common = [("source", pa.string()), ("month", pa.string())]
+    return {
+        "posts": pa.schema([
+            ("url", pa.string()),
+            ("title", pa.string()),
+            ("date", pa.timestamp("s")),
+            ("body", pa.string()),
+            ("comment_count", pa.int32()),
+            *common,
+        ]),
+        "comments": pa.schema([
+            ("url", pa.string()),
+            ("comment_no", pa.int32()),
+            ("date", pa.timestamp("s")),
+            ("text", pa.string()),
+            ("sentiment", pa.string()),
+            ("score", pa.float32()),
+            *common,
+        ]),
+        "sentiment": pa.schema([
+            ("url", pa.string()),
+            ("title", pa.string()),
+            ("date", pa.timestamp("s")),
+            ("target", pa.string()),  # post / article / comments / comment
+            ("sentiment", pa.string()),
+            ("reason", pa.string()),
+            ("alignment", pa.string()),
+            *common,
+        ]),
+    }
+
+
+# ========== 记录归一化 ==========
+def source_of(url):
+    """按 url 判断来源，名字与爬虫名一致"""
+    parts = urlsplit(url or "")
+    if "nhk" in parts.netloc:
+        return "nhk_china_news"
+    if "ctgid=137" in parts.path:
+        return "bakusai_china_news"
+    return "bakusai_forum"
+
+
+def parse_date(text):
+    """爆サイ的 \"YYYY-MM-DD HH:MM:SS\" 和 NHK 的 ISO 8601（转成日本时间）都统一成不带时区的日本时间"""
+    if not text:
+        return None
+    try:
+        dt = datetime.fromisoformat(str(text))
+    except ValueError:
+        return None
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(JST).replace(tzinfo=None)
+    return dt
+
+
+def _month(dt):
+    return dt.strftime("%Y-%m") if dt else "unknown"
+
+
+def _int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _comment_rows(url, date, comments, source):
+    """评论可能是换行拼接的字符串、字符串列表，或带情感的 {"text"/"content", "sentiment", "score"} 列表"""
+    if isinstance(comments, str):
+        comments = [line for line in comments.split("\n") if line.strip()]
+    for no, c in enumerate(comments or [], 1):
+        if isinstance(c, dict):
+            text = c.get("text") or c.get("content") or ""
+            sentiment, score = c.get("sentiment"), c.get("score")
+        else:
+            text, sentiment, score = str(c), None, None
+        yield {
+            "url": url, "comment_no": no, "date": date, "text": text,
+            "sentiment": sentiment, "score": score,
+            "source": source, "month": _month(date),
+        }
+
+
+def normalize_record(record, source=None):
+    """
+    一条爬虫输出或分析结果 -> {表名: [行, ...]}
+    支持：论坛帖子、爆サイ新闻、NHK 新闻、新闻情感结果（正文 + 评论区）、帖子情感结果
+    """
+    url = record.get("url", "")
+    source = source or source_of(url)
+    date = parse_date(record.get("post_time") or record.get("date") or record.get("post_date"))
+    month = _month(date)
+    rows = {name: [] for name in TABLES}
+
+    def sentiment_row(target, result, alignment=None):
+        rows["sentiment"].append({
+            "url": url, "title": record.get("title"), "date": date, "target": target,
+            "sentiment": result.get("sentiment"), "reason": result.get("reason"),
+            "alignment": alignment, "source": source, "month": month,
+        })
+
+    if "article_sentiment" in record:  # config.py 的新闻情感结果
+        sentiment_row("article", record["article_sentiment"], record.get("sentiment_alignment"))
+        sentiment_row("comments", record["comment_sentiment"], record.get("sentiment_alignment"))
+        return rows
+
+    if "sentiment" in record and "body" not in record:  # openai_based_sentimental.py 的帖子情感结果
+        sentiment_row("post", record)
+        return rows
+
+    body = record.get("body") or record.get("article_text") or record.get("content") or ""
+    comments = record.get("comments") or []
+    rows["posts"].append({
+        "url": url, "title": record.get("title"), "date": date, "body": body,
+        "comment_count": _int(record.get("comment_count")) or (len(comments) if isinstance(comments, list) else None),
+        "source": source, "month": month,
+    })
+    rows["comments"].extend(_comment_rows(url, date, comments, source))
+    # 带单条评论情感的帖子（本地模型逐条打分的输出），也写一份到 sentiment 表
+    for row in rows["comments"]:
+        if row["sentiment"] is not None:
+            rows["sentiment"].append({
+                "url": url, "title": record.get("title"), "date": date, "target": "comment",
+                "sentiment": row["sentiment"], "reason": None, "alignment": None,
+                "source": source, "month": month,
+            })
+    return rows
+
+
+# ========== 写入 ==========
+class CorpusWriter:
+    """
+    缓冲归一化后的行，攒够 batch_size 行时按表写出一批 Parquet 文件（追加，不改已有文件）
+    replace=True 时写入会先删除本次涉及的 source/month 分区（重新转换同一批数据时用）；
+    每个分区只在本次第一次写入时删除，之后的批次追加，不会删掉本次前面写的批次
+    """
+
+    def __init__(self, root="corpus", batch_size=50000, replace=False, compression_level=3):
+        self.root = Path(root)
+        self.batch_size = batch_size
+        self.replace = replace
+        self.compression_level = compression_level
+        self.buffers = {name: [] for name in TABLES}
+        self.written = {name: 0 for name in TABLES}
+        self.replaced = {name: set() for name in TABLES}  # 本次已经删除并重写过的 (source, month)
+
+    def add(self, record, source=None):
+        for name, rows in normalize_record(record, source).items():
+            self.buffers[name].extend(rows)
+            if len(self.buffers[name]) >= self.batch_size:
+                self.flush(name)
+
+    def flush(self, name=None):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        schemas = _schemas()
+        for table_name in [name] if name else TABLES:
+            rows = self.buffers[table_name]
+            if not rows:
+                continue
+            # 本次第一次写到的分区先删除旧数据，已经写过的分区追加
+            fresh, seen = [], []
+            for row in rows:
+                key = (row["source"], row["month"])
+                (seen if not self.replace or key in self.replaced[table_name] else fresh).append(row)
+            for part, behavior in ((fresh, "delete_matching"), (seen, "overwrite_or_ignore")):
+                if not part:
+                    continue
+                pq.write_to_dataset(
+                    pa.Table.from_pylist(part, schema=schemas[table_name]),
+                    root_path=str(self.root / table_name),
+                    partition_cols=PARTITION_COLS,
+                    compression="zstd",
+                    compression_level=self.compression_level,
+                    basename_template=f"part-{uuid.uuid4().hex}-{{i}}.parquet",
+                    existing_data_behavior=behavior,
+                )
+            if self.replace:
+                self.replaced[table_name].update((row["source"], row["month"]) for row in fresh)
+            self.written[table_name] += len(rows)
+            self.buffers[table_name] = []
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def convert(paths, root="corpus", source=None, replace=False):
+    """把 JSON / JSONL 文件转换进语料库，返回各表写入的行数"""
+    with CorpusWriter(root, replace=replace) as writer:
+        for path in paths:
+            for record in load_json_records(path):
+                writer.add(record, source)
+    return writer.written
+
+
+# ========== 读取 ==========
+def open_dataset(root, table):
+    """以内存映射方式打开某张表（hive 分区：source=.../month=...）"""
+    import pyarrow.dataset as ds
+    from pyarrow import fs
+
+    return ds.dataset(
+        str(Path(root) / table),
+        format="parquet",
+        partitioning="hive",
+        filesystem=fs.LocalFileSystem(use_mmap=True),
+    )
+
+
+def build_filter(source=None, date_from=None, date_to=None, sentiment=None):
+    """
+    source 可以是字符串或列表；date_from / date_to 为 datetime 或 \"YYYY-MM-DD\"，区间左闭右开
+    日期条件同时换算成 month 条件，先裁掉无关分区，再用行组统计过滤
+    """
+    import pyarrow.dataset as ds
+
+    conditions = []
+    if source:
+        sources = [source] if isinstance(source, str) else list(source)
+        conditions.append(ds.field("source").isin(sources))
+    if date_from:
+        date_from = date_from if isinstance(date_from, datetime) else datetime.fromisoformat(date_from)
+        conditions.append(ds.field("month") >= _month(date_from))
+        conditions.append(ds.field("date") >= date_from)
+    if date_to:
+        date_to = date_to if isinstance(date_to, datetime) else datetime.fromisoformat(date_to)
+        conditions.append(ds.field("month") <= _month(date_to))
+        conditions.append(ds.field("date") < date_to)
+    if sentiment:
+        sentiments = [sentiment] if isinstance(sentiment, str) else list(sentiment)
+        conditions.append(ds.field("sentiment").isin(sentiments))
+
+    expr = None
+    for condition in conditions:
+        expr = condition if expr is None else expr & condition
+    return expr
+
+
+def read_table(root, table, columns=None, **filters):
+    """读出满足条件的行（pyarrow.Table），只读取 columns 指定的列"""
+    return open_dataset(root, table).to_table(columns=columns, filter=build_filter(**filters))
+
+
+def iter_batches(root, table, columns=None, batch_size=65536, **filters):
+    """逐批读取（RecordBatch），内存占用与语料总量无关"""
+    yield from open_dataset(root, table).to_batches(
+        columns=columns, filter=build_filter(**filters), batch_size=batch_size
+    )
+
+
+# ========== 命令行 ==========
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Parquet 语料库：转换 / 查询")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("convert", help="把 JSON / JSONL 输出转换进语料库")
+    p.add_argument("inputs", nargs="+")
+    p.add_argument("--root", default="corpus")
+    p.add_argument("--source", default=None, help="指定来源（默认按 url 判断）")
+    p.add_argument("--replace", action="store_true", help="覆盖本次涉及的 source/month 分区")
+
+    q = sub.add_parser("query", help="按条件查询并打印前几行")
+    q.add_argument("table", choices=TABLES)
+    q.add_argument("--root", default="corpus")
+    q.add_argument("--source", action="append", default=None)
+    q.add_argument("--from", dest="date_from", default=None, help="起始日期 YYYY-MM-DD（含）")
+    q.add_argument("--to", dest="date_to", default=None, help="结束日期 YYYY-MM-DD（不含）")
+    q.add_argument("--sentiment", action="append", default=None)
+    q.add_argument("--columns", default=None, help="逗号分隔的列名")
+    q.add_argument("--limit", type=int, default=10)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.command == "convert":
+        written = convert(args.inputs, args.root, args.source, args.replace)
+        print("📦 已写入 " + "，".join(f"{name} {n} 行" for name, n in written.items()) + f" -> {args.root}")
+        return
+
+    table = read_table(
+        args.root, args.table,
+        columns=args.columns.split(",") if args.columns else None,
+        source=args.source, date_from=args.date_from, date_to=args.date_to, sentiment=args.sentiment,
+    )
+    print(f"🔎 命中 {table.num_rows} 行")
+    for row in table.slice(0, args.limit).to_pylist():
+        print(json.dumps(row, ensure_ascii=False, default=str)[:300])
+
+
+if __name__ == "__main__":
+    sys.exit(main())
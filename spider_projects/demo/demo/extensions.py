@@ -0,0 +1,84 @@
+# Scrapy 扩展
+#
+# See documentation in:
+# https://docs.scrapy.org/en/latest/topics/extensions.html
+
+from urllib.parse import urlsplit
+
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from twisted.internet import task
+
+from demo.metrics import METRICS, SIZE_BUCKETS
+
+
+class MetricsExtension:
+    """
+    把抓取过程写进 demo.metrics：
+    - 每个响应的下载延迟（按域名）、响应字节数、状态码
+    - 产出 / 丢弃的 item 数、回调异常数
+    - 解析耗时由 ParseTimingMiddleware 记录
+    每 METRICS_INTERVAL 秒和爬虫关闭时写出到 METRICS_PATH，并带上 Scrapy 自己的 stats
+    """
+
+    def __init__(self, crawler, path, interval):
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.path_template = path
+        self.path = None
+        self.interval = interval
+        self.task = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool("METRICS_ENABLED") or not settings.get("METRICS_PATH"):
+            raise NotConfigured
+        ext = cls(crawler, settings.get("METRICS_PATH"), settings.getfloat("METRICS_INTERVAL", 30))
+        crawler.signals.connect(ext.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(ext.spider_closed, signal=signals.spider_closed)
+        crawler.signals.connect(ext.response_received, signal=signals.response_received)
+        crawler.signals.connect(ext.item_scraped, signal=signals.item_scraped)
+        crawler.signals.connect(ext.item_dropped, signal=signals.item_dropped)
+        crawler.signals.connect(ext.spider_error, signal=signals.spider_error)
+        return ext
+
+    def spider_opened(self, spider):
+        METRICS.labels["spider"] = spider.name
+        self.path = self.path_template.format(spider=spider.name)
+        if self.interval:
+            self.task = task.LoopingCall(self.write)
+            self.task.start(self.interval, now=False)
+
+    def response_received(self, response, request, spider):
+        host = urlsplit(response.url).netloc
+        latency = request.meta.get("download_latency")
+        if latency is not None and "cached" not in response.flags:
+            METRICS.observe("crawl_fetch_seconds", latency, host=host)
+        METRICS.inc("crawl_responses_total", host=host, status=response.status)
+        METRICS.inc("crawl_fetch_bytes_total", len(response.body), host=host)
+        METRICS.observe("crawl_response_bytes", len(response.body), buckets=SIZE_BUCKETS, host=host)
+
+    def item_scraped(self, item, response, spider):
+        METRICS.inc("crawl_items_total")
+
+    def item_dropped(self, item, response, exception, spider):
+        METRICS.inc("crawl_items_dropped_total")
+
+    def spider_error(self, failure, response, spider):
+        METRICS.inc("crawl_errors_total", kind=failure.type.__name__)
+
+    def write(self):
+        # Scrapy 自己的 stats（含 response_cache/*、adaptive_rate/*）作为 gauge 一并写出
+        for key, value in self.stats.get_stats().items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                METRICS.set_gauge("scrapy_stat", value, key=key)
+        try:
+            METRICS.write(self.path)
+        except OSError as e:
+            self.crawler.spider.logger.warning(f"指标写出失败：{e}")
+
+    def spider_closed(self, spider, reason):
+        if self.task is not None and self.task.running:
+            self.task.stop()
+        self.write()
@@ -0,0 +1,256 @@
+"""
+进程内的计数器 / 直方图，定期和结束时写出到文件
+- 路径以 .prom 结尾时写 Prometheus textfile 格式（node_exporter textfile collector 可直接采集）
+- 其它后缀写 JSON
+爬虫（Scrapy 扩展、bakusai_forum.py）和 data_analyze 脚本共用同一个 METRICS 实例
+"""
+import bisect
+import json
+import os
+import resource
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+# 直方图默认分桶
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+SIZE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+TOKEN_BUCKETS = (16, 64, 256, 1024, 2048, 4096, 8192, 16384, 32768)
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # 最后一格是 +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def quantile(self, q):
+        """按分桶估算分位数（取所在桶的上界，落在 +Inf 桶时取最大值）"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(self.buckets, self.counts):
+            seen += n
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "min": self.min,
+            "max": self.max,
+            "p50": self.quantile(0.5),
+            "p99": self.quantile(0.99),
+            "buckets": dict(zip([*map(str, self.buckets), "+Inf"], self.counts)),
+        }
+
+
+def _series_key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+class Metrics:
+    """
+    counter: 只增不减（请求数、字节数、token 数、缓存命中）
+    gauge: 当前值（Scrapy stats 快照、进程内存）
+    histogram: 分布（抓取延迟、解析耗时、LLM 延迟、翻译批耗时）
+    同名指标可以带不同标签，例如 crawl_fetch_seconds{host="bakusai.com"}
+    """
+
+    def __init__(self, **labels):
+        self.labels = dict(labels)  # 所有指标共有的标签，例如 job="bakusai_forum"
+        self.started = time.time()
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name, value=1, **labels):
+        key = _series_key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set_gauge(self, name, value, **labels):
+        with self._lock:
+            self._gauges[_series_key(name, labels)] = value
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS, **labels):
+        key = _series_key(name, labels)
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = Histogram(buckets)
+            hist.observe(value)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """with METRICS.timer("parse_seconds", page="list"): ..."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def counter_value(self, name, **labels):
+        return self._counters.get(_series_key(name, labels), 0)
+
+    def _process_gauges(self):
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        return {
+            # Linux 上 ru_maxrss 单位是 KB
+            ("process_peak_rss_bytes", ()): usage.ru_maxrss * 1024,
+            ("process_cpu_seconds", ()): usage.ru_utime + usage.ru_stime,
+            ("run_elapsed_seconds", ()): time.time() - self.started,
+        }
+
+    def _snapshot(self):
+        with self._lock:
+            counters = dict(self._counters)
+            gauges = {**self._gauges, **self._process_gauges()}
+            histograms = {key: hist.to_dict() for key, hist in self._histograms.items()}
+        return counters, gauges, histograms
+
+    def to_dict(self):
+        counters, gauges, histograms = self._snapshot()
+
+        def flat(series):
+            return {name + _format_labels(labels): value for (name, labels), value in series.items()}
+
+        return {
+            "labels": self.labels,
+            "written_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "counters": flat(counters),
+            "gauges": flat(gauges),
+            "histograms": flat(histograms),
+        }
+
+    def to_prometheus(self):
+        counters, gauges, histograms = self._snapshot()
+        lines = []
+        typed = set()
+
+        def merged(labels):
+            # 公共标签与指标自身的同名标签只保留一个（以指标自身的为准）
+            return tuple(sorted({**self.labels, **dict(labels)}.items()))
+
+        def header(name, kind):
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), value in sorted(counters.items()):
+            header(name, "counter")
+            lines.append(f"{name}{_format_labels(merged(labels))} {value}")
+        for (name, labels), value in sorted(gauges.items()):
+            header(name, "gauge")
+            lines.append(f"{name}{_format_labels(merged(labels))} {value}")
+        for (name, labels), hist in sorted(histograms.items()):
+            header(name, "histogram")
+            series = merged(labels)
+            cumulative = 0
+            for bound, n in hist["buckets"].items():
+                cumulative += n
+                lines.append(f"{name}_bucket{_format_labels(series + (('le', bound),))} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(series)} {hist['sum']}")
+            lines.append(f"{name}_count{_format_labels(series)} {hist['count']}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        """原子写出（先写临时文件再替换），采集方不会读到半个文件"""
+        path = Path(path)
+        if path.parent != Path("."):
+            path.parent.mkdir(parents=True, exist_ok=True)
+        if path.suffix == ".prom":
+            text = self.to_prometheus()
+        else:
+            text = json.dumps(self.to_dict(), ensure_ascii=False, indent=2)
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp, path)
+
+
+# 进程内共用的实例
+METRICS = Metrics()
+
+
+class MetricsReporter:
+    """
+    后台线程每 interval 秒把 metrics 写到 path，stop() / 退出 with 时再写最后一次
+    path 为空时什么也不做（用于关闭指标输出）
+    """
+
+    def __init__(self, path, interval=30, metrics=METRICS, **labels):
+        self.path = path
+        self.interval = interval
+        self.metrics = metrics
+        self.metrics.labels.update(labels)
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self.path and self.interval:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.write()
+
+    def write(self):
+        if not self.path:
+            return
+        try:
+            self.metrics.write(self.path)
+        except OSError as e:
+            print(f"⚠️ 指标写出失败：{e}")
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.write()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def observe_llm_response(model, seconds, response, metrics=METRICS):
+    """记录一次 chat.completions 调用的延迟和 token 用量"""
+    metrics.observe("llm_request_seconds", seconds, model=model)
+    metrics.inc("llm_requests_total", model=model)
+    usage = getattr(response, "usage", None)
+    if usage is not None:
+        prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+        completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+        metrics.inc("llm_prompt_tokens_total", prompt_tokens, model=model)
+        metrics.inc("llm_completion_tokens_total", completion_tokens, model=model)
+        metrics.observe("llm_request_tokens", prompt_tokens + completion_tokens, buckets=TOKEN_BUCKETS, model=model)
@@ -3,7 +3,20 @@
 # See documentation in:
 # https://docs.scrapy.org/en/latest/topics/spider-middleware.html
 
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import time
+import zlib
+
 from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from scrapy.http import Headers
+from scrapy.responsetypes import responsetypes
+
+from demo.metrics import METRICS
 
 # useful for handling different item types with a single interface
 from itemadapter import ItemAdapter
@@ -53,48 +66,324 @@ class DemoSpiderMiddleware:
         spider.logger.info("Spider opened: %s" % spider.name)
 
 
-class DemoDownloaderMiddleware:
-    # Not all methods need to be defined. If a method is not defined,
-    # scrapy acts as if the downloader middleware does not modify the
-    # passed objects.
+class ParseTimingMiddleware:
+    """
+    记录回调的解析耗时（按爬虫和回调名），只统计回调自身迭代产出结果的时间
+    放在最靠近爬虫的位置，不把其它 spider middleware 的处理时间算进去
+    """
+
+    @staticmethod
+    def _observe(response, spider, seconds):
+        callback = getattr(response.request, "callback", None) if response.request is not None else None
+        name = getattr(callback, "__name__", "parse")
+        METRICS.observe("crawl_parse_seconds", seconds, spider=spider.name, callback=name)
+
+    def process_spider_output(self, response, result, spider):
+        elapsed = 0.0
+        iterator = iter(result)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                break
+            finally:
+                elapsed += time.perf_counter() - start
+            yield item
+        self._observe(response, spider, elapsed)
+
+    async def process_spider_output_async(self, response, result, spider):
+        elapsed = 0.0
+        iterator = result.__aiter__()
+        while True:
+            start = time.perf_counter()
+            try:
+                item = await iterator.__anext__()
+            except StopAsyncIteration:
+                break
+            finally:
+                elapsed += time.perf_counter() - start
+            yield item
+        self._observe(response, spider, elapsed)
+
+
+class ConditionalCacheMiddleware:
+    """
+    带条件请求的响应缓存：
+    - 响应体按内容哈希 zlib 压缩存盘（相同内容只存一份），索引放在 SQLite
+    - 按 URL 正则配置 TTL：未过期直接返回缓存；过期则带 If-None-Match /
+      If-Modified-Since 重新请求，服务器返回 304 时用缓存内容
+    """
+
+    def __init__(self, cache_dir, ttl_rules, default_ttl, stats=None):
+        self.store = ResponseCacheStore(cache_dir)
+        self.ttl_rules = [(re.compile(pattern), ttl) for pattern, ttl in ttl_rules]
+        self.default_ttl = default_ttl
+        self.stats = stats
 
     @classmethod
     def from_crawler(cls, crawler):
-        # This method is used by Scrapy to create your spiders.
-        s = cls()
-        crawler.signals.connect(s.spider_opened, signal=signals.spider_opened)
+        settings = crawler.settings
+        if not settings.getbool("RESPONSE_CACHE_ENABLED"):
+            raise NotConfigured
+        s = cls(
+            cache_dir=settings.get("RESPONSE_CACHE_DIR", ".response_cache"),
+            ttl_rules=settings.getlist("RESPONSE_CACHE_TTL_RULES"),
+            default_ttl=settings.getint("RESPONSE_CACHE_DEFAULT_TTL", 3600),
+            stats=crawler.stats,
+        )
+        crawler.signals.connect(s.spider_closed, signal=signals.spider_closed)
         return s
 
+    def ttl_for(self, url):
+        for pattern, ttl in self.ttl_rules:
+            if pattern.search(url):
+                return ttl
+        return self.default_ttl
+
+    def _inc(self, key, count=1):
+        if self.stats is not None:
+            self.stats.inc_value(f"response_cache/{key}", count)
+
     def process_request(self, request, spider):
-        # Called for each request that goes through the downloader
-        # middleware.
-
-        # Must either:
-        # - return None: continue processing this request
-        # - or return a Response object
-        # - or return a Request object
-        # - or raise IgnoreRequest: process_exception() methods of
-        #   installed downloader middleware will be called
+        if request.method != "GET" or request.meta.get("dont_cache"):
+            return None
+        entry = self.store.get(request.url)
+        if entry is None:
+            self._inc("miss")
+            return None
+
+        if time.time() - entry["stored_at"] < self.ttl_for(request.url):
+            self._inc("hit")
+            self._inc("bytes_saved", entry["size"])
+            return self.store.build_response(request, entry, flags=["cached"])
+
+        # 过期：发条件请求，让服务器决定是否需要重新下载
+        if entry["etag"]:
+            request.headers.setdefault("If-None-Match", entry["etag"])
+        if entry["last_modified"]:
+            request.headers.setdefault("If-Modified-Since", entry["last_modified"])
+        self._inc("stale")
         return None
 
     def process_response(self, request, response, spider):
-        # Called with the response returned from the downloader.
+        if "cached" in response.flags or request.method != "GET" or request.meta.get("dont_cache"):
+            return response
+
+        if response.status == 304:
+            entry = self.store.get(request.url)
+            if entry is not None:
+                self.store.touch(request.url)
+                self._inc("revalidated")
+                self._inc("bytes_saved", entry["size"])
+                return self.store.build_response(request, entry, flags=["cached", "revalidated"])
+            return response
 
-        # Must either;
-        # - return a Response object
-        # - return a Request object
-        # - or raise IgnoreRequest
+        if response.status == 200:
+            self.store.put(request.url, response)
+            self._inc("stored")
+        return response
+
+    def spider_closed(self, spider):
+        self.store.close()
+
+
+class ResponseCacheStore:
+    """内容寻址的响应缓存：blobs/<哈希前两位>/<哈希>.z + index.sqlite3"""
+
+    # 解压后再存，这些头不能跟着缓存回放
+    SKIP_HEADERS = {b"content-encoding", b"content-length", b"transfer-encoding"}
+
+    def __init__(self, cache_dir):
+        self.blob_dir = os.path.join(cache_dir, "blobs")
+        os.makedirs(self.blob_dir, exist_ok=True)
+        self.conn = sqlite3.connect(os.path.join(cache_dir, "index.sqlite3"))
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                url_hash TEXT PRIMARY KEY,
+                url TEXT NOT NULL,
+                status INTEGER NOT NULL,
+                headers TEXT NOT NULL,
+                body_hash TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                stored_at REAL NOT NULL
+            )
+        """)
+        self.conn.commit()
+
+    @staticmethod
+    def _url_hash(url):
+        return hashlib.sha1(url.encode("utf-8")).hexdigest()
+
+    def _blob_path(self, body_hash):
+        return os.path.join(self.blob_dir, body_hash[:2], body_hash + ".z")
+
+    def get(self, url):
+        row = self.conn.execute(
+            "SELECT * FROM responses WHERE url_hash = ?", (self._url_hash(url),)
+        ).fetchone()
+        if row is None or not os.path.exists(self._blob_path(row["body_hash"])):
+            return None
+        return dict(row)
+
+    def put(self, url, response):
+        body = response.body
+        body_hash = hashlib.sha256(body).hexdigest()
+        path = self._blob_path(body_hash)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = path + ".tmp"
+            with open(tmp, "wb") as f:
+                f.write(zlib.compress(body, 6))
+            os.replace(tmp, path)
+
+        headers = {
+            k.decode("latin1"): [v.decode("latin1") for v in vs]
+            for k, vs in response.headers.items()
+            if k.lower() not in self.SKIP_HEADERS
+        }
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        self.conn.execute("""
+            INSERT OR REPLACE INTO responses
+            (url_hash, url, status, headers, body_hash, size, etag, last_modified, stored_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (
+            self._url_hash(url), url, response.status, json.dumps(headers), body_hash, len(body),
+            etag.decode("latin1") if etag else None,
+            last_modified.decode("latin1") if last_modified else None,
+            time.time(),
+        ))
+        self.conn.commit()
+
+    def touch(self, url):
+        self.conn.execute(
+            "UPDATE responses SET stored_at = ? WHERE url_hash = ?", (time.time(), self._url_hash(url))
+        )
+        self.conn.commit()
+
+    def build_response(self, request, entry, flags):
+        with open(self._blob_path(entry["body_hash"]), "rb") as f:
+            body = zlib.decompress(f.read())
+        headers = Headers(json.loads(entry["headers"]))
+        respcls = responsetypes.from_args(headers=headers, url=entry["url"], body=body)
+        return respcls(url=entry["url"], status=entry["status"], headers=headers,
+                       body=body, flags=flags, request=request)
+
+    def close(self):
+        self.conn.close()
+
+
+class AdaptiveRateMiddleware:
+    """
+    按域名自适应调整下载速率（AIMD）：
+    - 延迟和错误率正常时，每 ADAPTIVE_RATE_WINDOW 个成功响应并发 +1、下载间隔缩短
+    - 遇到 429/5xx、超时或延迟明显高于基线时，并发减半、间隔加倍（遵守 Retry-After）
+    直接修改 downloader 的 slot.concurrency / slot.delay，并把当前值写进 stats
+    """
+
+    BACKOFF_STATUSES = {429, 500, 502, 503, 504}
+
+    def __init__(self, crawler):
+        settings = crawler.settings
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.start_delay = settings.getfloat("DOWNLOAD_DELAY", 1.0)
+        self.min_delay = settings.getfloat("ADAPTIVE_RATE_MIN_DELAY", 0.1)
+        self.max_delay = settings.getfloat("ADAPTIVE_RATE_MAX_DELAY", 30.0)
+        self.min_concurrency = 1
+        self.max_concurrency = settings.getint("ADAPTIVE_RATE_MAX_CONCURRENCY", 8)
+        self.latency_factor = settings.getfloat("ADAPTIVE_RATE_LATENCY_FACTOR", 2.0)
+        self.window = settings.getint("ADAPTIVE_RATE_WINDOW", 10)
+        self.domains = {}
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool("ADAPTIVE_RATE_ENABLED"):
+            raise NotConfigured
+        return cls(crawler)
+
+    def _state(self, key):
+        if key not in self.domains:
+            self.domains[key] = {
+                "concurrency": self.min_concurrency,
+                "delay": self.start_delay,
+                "latency": None,    # 延迟的指数移动平均
+                "baseline": None,   # 观察到的最低平均延迟
+                "successes": 0,
+            }
+        return self.domains[key]
+
+    def process_response(self, request, response, spider):
+        if "cached" in response.flags:
+            return response
+        key = request.meta.get("download_slot")
+        if key is None:
+            return response
+        state = self._state(key)
+
+        if response.status in self.BACKOFF_STATUSES:
+            retry_after = response.headers.get("Retry-After")
+            try:
+                retry_after = float(retry_after) if retry_after else 0.0
+            except ValueError:
+                retry_after = 0.0
+            self._backoff(state, retry_after)
+        else:
+            latency = request.meta.get("download_latency")
+            if latency is not None:
+                state["latency"] = latency if state["latency"] is None else 0.8 * state["latency"] + 0.2 * latency
+                if state["baseline"] is None or state["latency"] < state["baseline"]:
+                    state["baseline"] = state["latency"]
+
+            if state["latency"] and state["latency"] > state["baseline"] * self.latency_factor:
+                # 服务器变慢：减一个并发并放慢，同时慢慢抬高基线，避免一直卡在低谷
+                state["concurrency"] = max(self.min_concurrency, state["concurrency"] - 1)
+                state["delay"] = min(self.max_delay, state["delay"] * 1.5)
+                state["baseline"] *= 1.1
+                state["successes"] = 0
+            else:
+                state["successes"] += 1
+                if state["successes"] >= self.window:
+                    state["concurrency"] = min(self.max_concurrency, state["concurrency"] + 1)
+                    state["delay"] = max(self.min_delay, state["delay"] * 0.8)
+                    state["successes"] = 0
+
+        self._apply(key, state, spider)
         return response
 
     def process_exception(self, request, exception, spider):
-        # Called when a download handler or a process_request()
-        # (from other downloader middleware) raises an exception.
+        key = request.meta.get("download_slot")
+        if key is not None:
+            state = self._state(key)
+            self._backoff(state)
+            self._apply(key, state, spider)
+        return None
 
-        # Must either:
-        # - return None: continue processing this exception
-        # - return a Response object: stops process_exception() chain
-        # - return a Request object: stops process_exception() chain
-        pass
+    def _backoff(self, state, retry_after=0.0):
+        state["concurrency"] = max(self.min_concurrency, state["concurrency"] // 2)
+        state["delay"] = min(self.max_delay, max(state["delay"] * 2, self.start_delay, retry_after))
+        state["successes"] = 0
 
-    def spider_opened(self, spider):
-        spider.logger.info("Spider opened: %s" % spider.name)
+    def _apply(self, key, state, spider):
+        slot = self.crawler.engine.downloader.slots.get(key)
+        if slot is not None:
+            if slot.concurrency != state["concurrency"] or slot.delay != state["delay"]:
+                spider.logger.debug(
+                    f"自适应限速 {key}: 并发 {slot.concurrency}→{state['concurrency']}，"
+                    f"间隔 {slot.delay:.2f}s→{state['delay']:.2f}s"
+                )
+            slot.concurrency = state["concurrency"]
+            slot.delay = state["delay"]
+
+        # 估算当前选择的速率（请求/秒）
+        per_request = max(state["delay"], state["latency"] or 0.0, 1e-3)
+        rate = state["concurrency"] / per_request
+        self.stats.set_value(f"adaptive_rate/{key}/concurrency", state["concurrency"])
+        self.stats.set_value(f"adaptive_rate/{key}/delay", round(state["delay"], 3))
+        self.stats.set_value(f"adaptive_rate/{key}/rate", round(rate, 3))
+        if state["latency"] is not None:
+            self.stats.set_value(f"adaptive_rate/{key}/latency", round(state["latency"], 3))
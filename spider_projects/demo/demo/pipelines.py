@@ -3,11 +3,177 @@
 # Don't forget to add your pipeline to the ITEM_PIPELINES setting
 # See: https://docs.scrapy.org/en/latest/topics/item-pipeline.html
 
+import json
+import sqlite3
+import time
+from datetime import datetime
 
 # useful for handling different item types with a single interface
 from itemadapter import ItemAdapter
 
 
-class DemoPipeline:
+class SQLiteStoragePipeline:
+    """
+    批量写入本地 SQLite：
+    - item 先放进缓冲区，攒够 SQLITE_BATCH_SIZE 条或距上次写入超过
+      SQLITE_FLUSH_INTERVAL 秒时，在一个事务里批量 upsert（以 url 去重）
+    - 另有定时器每 SQLITE_FLUSH_INTERVAL 秒检查一次，长时间没有新 item 时缓冲也会写入
+    - close_spider 时把剩余的缓冲写完
+    - 建了 date / source 索引，下游可以直接按日期或 url 查询
+    """
+
+    def __init__(self, db_path, batch_size=100, flush_interval=5.0):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.buffer = []
+        self.conn = None
+        self._last_flush = time.monotonic()
+        self._timer = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        return cls(
+            db_path=settings.get("SQLITE_DB_PATH", "news_items.sqlite3"),
+            batch_size=settings.getint("SQLITE_BATCH_SIZE", 100),
+            flush_interval=settings.getfloat("SQLITE_FLUSH_INTERVAL", 5.0),
+        )
+
+    def open_spider(self, spider):
+        self.conn = sqlite3.connect(self.db_path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS items (
+                url TEXT PRIMARY KEY,
+                source TEXT NOT NULL,
+                title TEXT,
+                date TEXT,
+                content TEXT,
+                comments TEXT,
+                crawled_at TEXT NOT NULL
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_items_date ON items (date)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_items_source ON items (source, date)")
+        self.conn.commit()
+
+        if self.flush_interval > 0:
+            from twisted.internet import task
+
+            self._timer = task.LoopingCall(self._flush_if_due, spider)
+            self._timer.start(self.flush_interval, now=False)
+
+    def _flush_if_due(self, spider):
+        if self.buffer and time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush(spider)
+
+    def process_item(self, item, spider):
+        adapter = ItemAdapter(item)
+        # nhk 用 date/content，bakusai 用 article_text/comments，统一成一张表
+        self.buffer.append((
+            adapter.get("url"),
+            spider.name,
+            adapter.get("title"),
+            adapter.get("date") or adapter.get("post_date"),
+            adapter.get("content") or adapter.get("article_text") or "",
+            json.dumps(adapter.get("comments") or [], ensure_ascii=False),
+            datetime.now().isoformat(timespec="seconds"),
+        ))
+
+        if len(self.buffer) >= self.batch_size or time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush(spider)
+        return item
+
+    def flush(self, spider=None):
+        self._last_flush = time.monotonic()
+        if not self.buffer:
+            return
+        with self.conn:
+            self.conn.executemany("""
+                INSERT INTO items (url, source, title, date, content, comments, crawled_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(url) DO UPDATE SET
+                    source = excluded.source,
+                    title = excluded.title,
+                    date = COALESCE(excluded.date, items.date),
+                    content = excluded.content,
+                    comments = excluded.comments,
+                    crawled_at = excluded.crawled_at
+            """, self.buffer)
+        if spider is not None:
+            spider.logger.debug(f"SQLite 批量写入 {len(self.buffer)} 条")
+        self.buffer = []
+
+    def close_spider(self, spider):
+        if self._timer is not None and self._timer.running:
+            self._timer.stop()
+        self.flush(spider)
+        self.conn.close()
+
+
+def query_items(db_path, source=None, date_from=None, date_to=None, url=None):
+    """按来源 / 日期区间 / url 查询已入库的数据，date 按 ISO 字符串比较"""
+    sql = "SELECT url, source, title, date, content, comments FROM items WHERE 1=1"
+    params = []
+    if source:
+        sql += " AND source = ?"
+        params.append(source)
+    if date_from:
+        sql += " AND date >= ?"
+        params.append(date_from)
+    if date_to:
+        sql += " AND date < ?"
+        params.append(date_to)
+    if url:
+        sql += " AND url = ?"
+        params.append(url)
+    sql += " ORDER BY date"
+
+    conn = sqlite3.connect(db_path)
+    try:
+        for row in conn.execute(sql, params):
+            yield {
+                "url": row[0],
+                "source": row[1],
+                "title": row[2],
+                "date": row[3],
+                "content": row[4],
+                "comments": json.loads(row[5]),
+            }
+    finally:
+        conn.close()
+
+
+class ParquetCorpusPipeline:
+    """
+    爬取结果同时写进 Parquet 语料库（demo/corpus_store.py，按 source/month 分区）
+    CORPUS_ROOT 为空时不启用；来源取爬虫名，攒够 CORPUS_BATCH_SIZE 条写出一批文件
+    """
+
+    def __init__(self, root, batch_size=5000):
+        self.root = root
+        self.batch_size = batch_size
+        self.writer = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        from scrapy.exceptions import NotConfigured
+
+        settings = crawler.settings
+        if not settings.get("CORPUS_ROOT"):
+            raise NotConfigured("CORPUS_ROOT 未设置")
+        return cls(settings.get("CORPUS_ROOT"), settings.getint("CORPUS_BATCH_SIZE", 5000))
+
+    def open_spider(self, spider):
+        from demo.corpus_store import CorpusWriter
+
+        self.writer = CorpusWriter(self.root, batch_size=self.batch_size)
+
     def process_item(self, item, spider):
+        self.writer.add(ItemAdapter(item).asdict(), source=spider.name)
         return item
+
+    def close_spider(self, spider):
+        self.writer.close()
+        spider.logger.info(f"Parquet 语料库写入：{self.writer.written}")
@@ -22,10 +22,19 @@ ADDONS = {}
 ROBOTSTXT_OBEY = False
 
 # Concurrency and throttling settings
+# 以下两项只是起始值，运行时由 AdaptiveRateMiddleware 按域名动态调整
 #CONCURRENT_REQUESTS = 16
 CONCURRENT_REQUESTS_PER_DOMAIN = 1
 DOWNLOAD_DELAY = 1
 
+# 自适应限速：延迟/错误率健康时加并发，429/5xx 或延迟上升时退避
+ADAPTIVE_RATE_ENABLED = True
+ADAPTIVE_RATE_MAX_CONCURRENCY = 8
+ADAPTIVE_RATE_MIN_DELAY = 0.1
+ADAPTIVE_RATE_MAX_DELAY = 30.0
+ADAPTIVE_RATE_LATENCY_FACTOR = 2.0
+ADAPTIVE_RATE_WINDOW = 10
+
 # Disable cookies (enabled by default)
 #COOKIES_ENABLED = False
 
@@ -40,27 +49,59 @@ DOWNLOAD_DELAY = 1
 
 # Enable or disable spider middlewares
 # See https://docs.scrapy.org/en/latest/topics/spider-middleware.html
-#SPIDER_MIDDLEWARES = {
-#    "demo.middlewares.DemoSpiderMiddleware": 543,
-#}
+SPIDER_MIDDLEWARES = {
+    # 数字最大，最靠近爬虫，只统计回调本身的解析耗时
+    "demo.middlewares.ParseTimingMiddleware": 950,
+}
 
 # Enable or disable downloader middlewares
 # See https://docs.scrapy.org/en/latest/topics/downloader-middleware.html
-#DOWNLOADER_MIDDLEWARES = {
-#    "demo.middlewares.DemoDownloaderMiddleware": 543,
-#}
+DOWNLOADER_MIDDLEWARES = {
+    # 在 HttpCompressionMiddleware(590) 之后处理响应，缓存的是解压后的内容
+    "demo.middlewares.ConditionalCacheMiddleware": 580,
+    "demo.middlewares.AdaptiveRateMiddleware": 585,
+}
+
+# 响应缓存 + 条件请求（按 URL 正则设置 TTL，单位秒）
+RESPONSE_CACHE_ENABLED = True
+RESPONSE_CACHE_DIR = ".response_cache"
+RESPONSE_CACHE_DEFAULT_TTL = 3600
+RESPONSE_CACHE_TTL_RULES = [
+    # 列表页 / 新闻列表 JSON 变化快
+    (r"/thr_tl/|/areamain/|news-nwa-topic", 600),
+    # 帖子页、新闻正文基本不变
+    (r"/thr_res/|/newsweb/na/", 7 * 24 * 3600),
+]
 
 # Enable or disable extensions
 # See https://docs.scrapy.org/en/latest/topics/extensions.html
-#EXTENSIONS = {
-#    "scrapy.extensions.telnet.TelnetConsole": None,
-#}
+EXTENSIONS = {
+    "demo.extensions.MetricsExtension": 500,
+}
+
+# 抓取指标（延迟 / 字节 / 解析耗时 / Scrapy stats），.prom 结尾写 Prometheus textfile，否则写 JSON
+METRICS_ENABLED = True
+METRICS_PATH = "metrics/{spider}.prom"
+METRICS_INTERVAL = 30
 
 # Configure item pipelines
 # See https://docs.scrapy.org/en/latest/topics/item-pipeline.html
-#ITEM_PIPELINES = {
-#    "demo.pipelines.DemoPipeline": 300,
-#}
+ITEM_PIPELINES = {
+    "demo.pipelines.SQLiteStoragePipeline": 300,
+    "demo.pipelines.ParquetCorpusPipeline": 310,
+}
+
+# SQLite 批量入库（以 url upsert）
+SQLITE_DB_PATH = "news_items.sqlite3"
+SQLITE_BATCH_SIZE = 100
+SQLITE_FLUSH_INTERVAL = 5.0
+
+# Parquet 语料库（按 source/month 分区，zstd 压缩）；为空时不写，例如 -s CORPUS_ROOT=corpus
+CORPUS_ROOT = ""
+CORPUS_BATCH_SIZE = 5000
+
+# 增量抓取水位线（NHK 爬虫：已抓过的 URL 和最新 pubDate）
+WATERMARK_PATH = "crawl_watermark.sqlite3"
 
 # Enable and configure the AutoThrottle extension (disabled by default)
 # See https://docs.scrapy.org/en/latest/topics/autothrottle.html
@@ -94,7 +135,6 @@ USER_AGENT = (
 
 ROBOTSTXT_OBEY = False
 COOKIES_ENABLED = True
-DOWNLOAD_DELAY = 1
 
 DEFAULT_REQUEST_HEADERS = {
     "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8",
@@ -1,9 +1,23 @@
-import requests
 import time
 import json
+import asyncio
+import argparse
+import sys
 from datetime import datetime, timedelta
-from lxml import etree
-import re
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+# 让脚本直接运行时也能导入 demo 包
+PROJECT_ROOT = Path(__file__).resolve().parents[3]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from demo.ratelimit import HostRateLimiter
+from demo.thread_state import ThreadStateStore, content_hash
+from demo.streaming import JsonlWriter
+from demo import bakusai_parser as bp
+from demo.metrics import METRICS, SIZE_BUCKETS, MetricsReporter
+from demo.transport import build_session, record_connection_stats
 
 BASE_URL = "https://bakusai.com"
 LIST_URL = "https://bakusai.com/thr_tl/acode=13/ctrid=1/ctgid=150/bid=2396/p={}/"
@@ -13,48 +27,73 @@ HEADERS = {
     "Accept-Language": "ja-JP,ja;q=0.9"
 }
 
-session = requests.Session()
-session.headers.update(HEADERS)
+# 连接池 + keep-alive + gzip/br + 带抖动的 GET 重试；pool_maxsize 不小于异步模式的并发数
+TIMEOUT = (5, 20)  # (连接, 读取) 秒
+session = build_session(HEADERS, pool_maxsize=8, retries=3, backoff=1.0, timeout=TIMEOUT)
+
+# 重试后仍失败的请求，结束时写到 <输出名>_failed.json，下次可以单独补抓
+FAILED_URLS = []
+
+METRICS_PATH = "metrics/bakusai_forum.prom"
 
 # ========== 请求 ==========
 def fetch(url):
+    start = time.perf_counter()
     try:
-        r = session.get(url, timeout=20)
+        r = session.get(url, timeout=TIMEOUT)
         r.raise_for_status()
+        METRICS.inc("crawl_fetch_bytes_total", len(r.content))
+        METRICS.observe("crawl_response_bytes", len(r.content), buckets=SIZE_BUCKETS)
         return r.content  # 返回 bytes，避免 encoding declaration 报错
     except Exception as e:
-        print("⚠️ 请求失败：", e)
+        METRICS.inc("crawl_fetch_errors_total", kind=type(e).__name__)
+        FAILED_URLS.append({
+            "url": url,
+            "error": f"{type(e).__name__}: {e}",
+            "time": datetime.now().isoformat(timespec="seconds"),
+        })
+        print("⚠️ 请求失败（已重试）：", e)
         return None
+    finally:
+        METRICS.observe("crawl_fetch_seconds", time.perf_counter() - start)
 
 # ========== 清洗评论文本 ==========
 def clean_comments_text(comments_list):
     all_text = []
     for c in comments_list:
-        text = c["content"]
-        text = re.sub(r'#\d+\s*[\d/:\s]*', '', text)  # 去掉 #数字、日期
-        text = re.sub(r'>>\d+', '', text)             # 去掉引用
-        text = text.replace('\r', '').replace('\n', ' ')
-        text = re.sub(r'\s+', ' ', text).strip()
+        text = bp.clean_comment(c["content"])  # 去掉 #数字、日期、引用，空白归一化
         if text:
             all_text.append(text)
     return '\n'.join(all_text)
 
 # ========== 解析列表页最后回复时间 ==========
-def parse_last_reply_time(text):
+def parse_last_reply_time(text, reference=None):
+    """
+    reference: "12/11 21:12" 这种不带年份的时间不会晚于它，据此推断年份（默认为当前时间）
+    列表按最后回复倒序排列，翻页时传入上一条的时间，跨年也能推断正确
+    """
     text = text.strip()
     now = datetime.now()
     if "時間前" in text:
-        h = int(re.search(r'(\d+)時間前', text).group(1))
+        h = int(bp.HOURS_AGO_RE.search(text).group(1))
         return now - timedelta(hours=h)
     elif "分前" in text:
-        m = int(re.search(r'(\d+)分前', text).group(1))
+        m = int(bp.MINUTES_AGO_RE.search(text).group(1))
         return now - timedelta(minutes=m)
     else:  # 12/11 21:12 形式
+        return infer_year(text, reference or now)
+
+
+def infer_year(text, reference):
+    """取不晚于 reference 的最近一年（留 1 天余量，抓取过程中帖子被顶起的误差不会被算成去年）"""
+    for year in range(reference.year, reference.year - 8, -1):
         try:
-            dt = datetime.strptime(text, "%m/%d %H:%M")
-            return dt.replace(year=now.year)
-        except:
-            return None
+            dt = datetime.strptime(f"{year}/{text}", "%Y/%m/%d %H:%M")
+        except ValueError:
+            continue  # 格式不对，或非闰年的 02/29
+        if dt <= reference + timedelta(days=1):
+            return dt
+    return None
 
 # ========== 解析列表页 ==========
 def parse_thread_list(page, current_year, current_month):
@@ -62,25 +101,24 @@ def parse_thread_list(page, current_year, current_month):
     html = fetch(LIST_URL.format(page))
     if not html:
         return [], True
+    return parse_thread_list_html(html, current_year, current_month)
 
-    tree = etree.HTML(html)
+
+def parse_thread_list_html(html, current_year, current_month):
+    with METRICS.timer("crawl_parse_seconds", page="list"):
+        return _parse_thread_list_html(html, current_year, current_month)
+
+
+def _parse_thread_list_html(html, current_year, current_month):
+    tree = bp.to_tree(html)
     threads = []
     stop = False
 
-    for li in tree.xpath("//li[@data-tid]"):
-        tid = li.get("data-tid")
-        title = "".join(li.xpath(".//a[contains(@class,'thr_status_icon')]//text()")).strip()
-
-        # 列表页真实评论数
-        comment_count_text = li.xpath(".//span[contains(@class,'comment_count_area')]/span[last()]/text()")
-        try:
-            comment_count = int(comment_count_text[0].strip())
-        except:
-            comment_count = 0
+    for item in bp.parse_list_items(tree):
+        comment_count = item["comment_count"]  # 列表页真实评论数
 
         # 最后一条回复时间
-        last_reply_text = "".join(li.xpath(".//span[@class='thr-posted-ago']//text()")).strip()
-        last_reply_time = parse_last_reply_time(last_reply_text)
+        last_reply_time = parse_last_reply_time(item["last_reply_text"])
         if not last_reply_time:
             continue
 
@@ -92,72 +130,178 @@ def parse_thread_list(page, current_year, current_month):
         if comment_count == 0:
             continue
 
-        threads.append({
-            "tid": tid,
-            "title": title,
-            "url": f"{BASE_URL}/thr_res/acode=13/ctrid=1/ctgid=150/bid=2396/tid={tid}/tp=1/",
-            "comment_count": comment_count
-        })
+        threads.append(make_thread(item))
 
     print(f"    ✔ 本页解析到 {len(threads)} 个本月有回复帖子")
     return threads, stop
 
+
+def make_thread(item):
+    return {
+        "tid": item["tid"],
+        "title": item["title"],
+        "url": f"{BASE_URL}/thr_res/acode=13/ctrid=1/ctgid=150/bid=2396/tid={item['tid']}/tp=1/",
+        "comment_count": item["comment_count"]
+    }
+
 # ========== 解析帖子页 ==========
 def parse_thread_detail(thread):
     html = fetch(thread["url"])
     if not html:
         return None
+    return parse_thread_detail_html(html, thread)
+
+
+def parse_thread_detail_html(html, thread):
+    with METRICS.timer("crawl_parse_seconds", page="thread"):
+        tree = bp.to_tree(html)
+        post_time, body = parse_post_meta(tree)
 
-    tree = etree.HTML(html)
+        # 评论
+        comments = []
+        for idx, (_, content) in enumerate(iter_comments(tree)):
+            if idx >= 100:  # 最多抓 100 条评论
+                break
+            if content:
+                comments.append({"content": content})
 
+        return build_record(thread, post_time, body, comments)
+
+
+def parse_post_meta(tree):
+    """解析发帖时间和帖子正文"""
     # 发帖时间
-    post_time_text = tree.xpath("//span[@class='posts' and @itemprop='datePublished']/text()")
-    if post_time_text:
-        post_time_text = post_time_text[0].strip()
-        try:
-            post_time = datetime.strptime(post_time_text, "%Y/%m/%d %H:%M").strftime("%Y-%m-%d %H:%M:%S")
-        except:
-            post_time = ""
-    else:
+    post_time_text = bp.parse_post_time_text(tree)
+    try:
+        post_time = datetime.strptime(post_time_text, "%Y/%m/%d %H:%M").strftime("%Y-%m-%d %H:%M:%S")
+    except ValueError:
         post_time = ""
 
     # 帖子正文
-    body = "".join(tree.xpath("//div[@id='threadBody']//text()")).strip()
+    return post_time, bp.parse_thread_body(tree)
 
-    # 评论
-    comments = []
-    for idx, res in enumerate(tree.xpath("//div[contains(@class,'resbody')]")):
-        if idx >= 100:  # 最多抓 100 条评论
-            break
-        content = "".join(res.xpath(".//text()")).strip()
-        if content:
-            comments.append({"content": content})
 
-    comments_text = clean_comments_text(comments)
+iter_comments = bp.iter_comments
+
 
+def build_record(thread, post_time, body, comments):
     return {
         "url": thread["url"],
         "title": thread["title"],
         "comment_count": thread["comment_count"],
         "post_time": post_time,
         "body": body,
-        "comments": comments_text
+        "comments": clean_comments_text(comments)
     }
 
+# ========== 多页评论 ==========
+COMMENTS_PER_PAGE = 50
+PAGE_CHECKPOINT_MAX_AGE = 24 * 3600  # 断点里的评论页超过这个时间（秒）就重新抓
+def thread_page_url(thread, tp):
+    return bp.TP_RE.sub(f"/tp={tp}/", thread["url"])
+
+
+def count_thread_pages(comment_count, tree=None):
+    """根据列表页评论数推算页数，帖子页分页栏给出更大的页码时以分页栏为准"""
+    pages = max(1, -(-comment_count // COMMENTS_PER_PAGE))
+    if tree is not None:
+        pages = max(pages, bp.max_pager_page(tree))
+    return pages
+
+
+def parse_thread_detail_all_pages(thread, store=None, since_res_no=0,
+                                  concurrency=4, rate=1.0, burst=2):
+    """
+    抓取帖子全部评论页：
+    - 第 1 页决定页数，其余页在令牌桶限速下并发抓取，按评论编号合并
+    - store 不为空时每页抓完立即落盘，崩溃后重跑只补抓缺失的页；
+      只复用 PAGE_CHECKPOINT_MAX_AGE 内抓的满页，没满的页之后还会有新回复，总是重新抓
+    - since_res_no 之前的整页直接跳过（增量抓取用）
+    返回 (记录, 已连续抓到的最大评论编号, 是否全部页都抓到)
+    有页失败时记录只包含失败页之前的评论，编号也只推进到那里，后面的评论不会被跳过
+    """
+    html = fetch(thread_page_url(thread, 1))
+    if not html:
+        return None, since_res_no, False
+    tree = bp.to_tree(html)
+    post_time, body = parse_post_meta(tree)
+    n_pages = count_thread_pages(thread["comment_count"], tree)
+
+    pages = {1: list(iter_comments(tree))}
+    if store is not None:
+        saved = store.load_pages(thread["tid"], max_age=PAGE_CHECKPOINT_MAX_AGE)
+        pages.update({tp: c for tp, c in saved.items() if tp != 1 and len(c) >= COMMENTS_PER_PAGE})
+
+    first_page = max(2, since_res_no // COMMENTS_PER_PAGE + 1)
+    pending = [tp for tp in range(first_page, n_pages + 1) if tp not in pages]
+    limiter = HostRateLimiter(rate, burst)
+
+    def fetch_page(tp):
+        url = thread_page_url(thread, tp)
+        limiter.acquire(url)
+        page_html = fetch(url)
+        if not page_html:
+            return tp, None
+        offset = (tp - 1) * COMMENTS_PER_PAGE
+        with METRICS.timer("crawl_parse_seconds", page="thread_page"):
+            return tp, list(iter_comments(bp.to_tree(page_html), offset))
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for tp, page_comments in pool.map(fetch_page, pending):
+            if page_comments is None:
+                continue
+            pages[tp] = page_comments
+            if store is not None:
+                store.save_page(thread["tid"], tp, page_comments)
+
+    # 只合并到第一个失败页之前，保证已收集的评论编号是连续的
+    missing = [tp for tp in range(first_page, n_pages + 1) if tp not in pages]
+    complete = not missing
+    merged = {}
+    for tp in sorted(pages):
+        if not complete and tp >= missing[0]:
+            break
+        for res_no, content in pages[tp]:
+            merged.setdefault(res_no, content)
+
+    last_res_no = max([since_res_no, *merged])
+    comments = [{"content": merged[n]} for n in sorted(merged)
+                if n > since_res_no and merged[n]]
+
+    # 全部页都拿到才清掉断点，否则下次从断点继续
+    if store is not None and complete:
+        store.clear_pages(thread["tid"])
+
+    return build_record(thread, post_time, body, comments), last_res_no, complete
+
 # ========== 主流程 ==========
-def crawl_current_month(max_pages=50):
+def crawl_current_month(max_pages=50, all_pages=False, state_path="bakusai_thread_state.sqlite3", writer=None):
+    """
+    all_pages=True 时抓取帖子全部评论页（断点保存在 state_path）
+    writer 为 JsonlWriter 时边抓边写，不在内存中累积结果，已写过的帖子直接跳过
+    """
     results = []
     now = datetime.now()
     current_year = now.year
     current_month = now.month
+    store = ThreadStateStore(state_path) if all_pages else None
 
     for page in range(1, max_pages + 1):
         threads, stop = parse_thread_list(page, current_year, current_month)
         for t in threads:
-            detail = parse_thread_detail(t)
+            if writer is not None and writer.seen(t["url"]):
+                continue
+            if all_pages:
+                detail = parse_thread_detail_all_pages(t, store)[0]
+            else:
+                detail = parse_thread_detail(t)
             if not detail:
                 continue
-            results.append(detail)
+            if writer is not None:
+                writer.write(detail)
+            else:
+                results.append(detail)
+            METRICS.inc("crawl_items_total")
             print(f"    ✅ 收录帖子 {t['tid']}（评论数: {t['comment_count']}）")
             time.sleep(1)
 
@@ -166,13 +310,380 @@ def crawl_current_month(max_pages=50):
             break
         time.sleep(2)
 
+    if store is not None:
+        store.close()
     return results
 
+# ========== 增量抓取 ==========
+def crawl_incremental(max_pages=50, state_path="bakusai_thread_state.sqlite3", all_pages=False):
+    """
+    基于本地状态库的增量抓取：
+    - 列表页评论数未变化的帖子直接跳过
+    - 有变化的帖子从上次最后一条评论所在的页抓到分页栏的最后一页，只输出之后的新评论
+    - all_pages=True 时已抓完的评论页落盘，中断后只补抓缺失页
+    - 有评论页没抓到的帖子本次不输出、不更新状态，下次整体重试（all_pages=True 时已抓到的页留在断点里）
+    """
+    results = []
+    skipped = 0
+    now = datetime.now()
+    current_year = now.year
+    current_month = now.month
+
+    with ThreadStateStore(state_path) as store:
+        for page in range(1, max_pages + 1):
+            threads, stop = parse_thread_list(page, current_year, current_month)
+            for t in threads:
+                state = store.get(t["tid"])
+                if state and state["comment_count"] == t["comment_count"]:
+                    skipped += 1
+                    METRICS.inc("crawl_threads_unchanged_total")
+                    continue
+
+                since = state["last_res_no"] if state else 0
+                detail, last_res_no, complete = parse_thread_detail_all_pages(
+                    t, store if all_pages else None, since_res_no=since
+                )
+                if not detail or not complete:
+                    METRICS.inc("crawl_threads_incomplete_total")
+                    print(f"    ⚠️ 帖子 {t['tid']} 有评论页没抓到，下次重试")
+                    continue
+
+                digest = content_hash(detail["title"], detail["body"])
+                store.update(t["tid"], t["comment_count"], detail["post_time"], digest, last_res_no)
+
+                # 正文没变且没有新评论，就不再输出
+                if state and state["content_hash"] == digest and not detail["comments"]:
+                    continue
+                detail["prev_comment_count"] = state["comment_count"] if state else 0
+                results.append(detail)
+                METRICS.inc("crawl_items_total")
+                print(f"    ✅ 收录帖子 {t['tid']}（评论数: {detail['prev_comment_count']} → {t['comment_count']}）")
+                time.sleep(1)
+
+            if stop:
+                print("📌 已到当月最后回复帖子，停止翻页")
+                break
+            time.sleep(2)
+
+    print(f"⏭️ 未变化跳过 {skipped} 个帖子")
+    return results
+
+# ========== 按日期范围抓取 ==========
+def load_list_page(page, reference, cache=None):
+    """
+    抓一页列表，返回 [(条目, 最后回复时间), ...]，请求失败返回 None、空页返回 []
+    reference 为上一页最后一条的时间，用来推断不带年份的时间
+    cache: {页码: html}，二分探测过的页在正式抓取时不再重复请求
+    """
+    html = cache.get(page) if cache is not None else None
+    if html is None:
+        print(f"📄 正在抓列表页 {page}")
+        html = fetch(LIST_URL.format(page))
+        if not html:
+            return None
+        if cache is not None:
+            cache[page] = html
+    with METRICS.timer("crawl_parse_seconds", page="list"):
+        rows = []
+        for item in bp.parse_list_items(bp.to_tree(html)):
+            last_reply = parse_last_reply_time(item["last_reply_text"], reference)
+            if last_reply is not None:
+                reference = min(reference, last_reply)
+            rows.append((item, last_reply))
+        return rows
+
+
+def page_oldest(rows, reference):
+    return min((t for _, t in rows if t is not None), default=reference)
+
+
+PROBE_RETRIES = 3
+# 列表时间不带年份，只能参照上一次探测的页推断；两次探测之间的时间跨度超过一年就会推断错，
+# 倍增探测时每一步的预计跨度不超过这个值（留出四倍余量，越旧的页一页跨越的时间越长）
+MAX_PROBE_SPAN = timedelta(days=90)
+
+
+def gallop_step(lo, lo_oldest, prev, prev_oldest):
+    """
+    倍增探测的下一步步长：按最近两次探测 (prev, lo) 之间每页跨越的时间，
+    把步长限制在预计跨度 MAX_PROBE_SPAN 以内，不超过 lo（即最多倍增）
+    """
+    span = (prev_oldest - lo_oldest) / (lo - prev)
+    if span <= timedelta(0):
+        return lo
+    return max(1, min(lo, int(MAX_PROBE_SPAN / span)))
+
+
+def find_first_page(until, max_pages=2000, cache=None, rate=1.0, burst=1):
+    """
+    找到第一页"最后一条回复不晚于 until"的列表页（列表按最后回复倒序，页码越大越旧）
+    先按 1, 2, 4, 8... 倍增探测确定区间，再在区间内二分，共 O(log 页数) 次请求
+    每次探测都参照相邻的、已经确定年份的页推断年份，所以倍增的步长按 gallop_step 限制，
+    范围在一年以前时多探测几页，年份不会推断错
+    rate / burst: 探测请求的令牌桶限速
+    返回 (页码, 该页之前那一页的最旧时间)；超出最后一页时返回 (None, None)
+    某页重试 PROBE_RETRIES 次仍请求失败时抛出 RuntimeError，不会把它误当成最后一页
+    """
+    probes = 0
+    empty = set()
+    lo, lo_oldest = 0, datetime.now()  # lo 及之前的页都比 until 新
+    hi = None
+    limiter = HostRateLimiter(rate, burst)
+
+    def reaches(page, reference):
+        nonlocal probes
+        for attempt in range(1, PROBE_RETRIES + 1):
+            limiter.acquire(LIST_URL.format(page))
+            probes += 1
+            METRICS.inc("crawl_list_probes_total")
+            rows = load_list_page(page, reference, cache)
+            if rows is not None:
+                break
+            METRICS.inc("crawl_list_probe_failures_total")
+            print(f"⚠️ 探测列表页 {page} 失败（第 {attempt}/{PROBE_RETRIES} 次）")
+        else:
+            raise RuntimeError(f"列表页 {page} 连续 {PROBE_RETRIES} 次请求失败，无法确定起始页")
+        if not rows:
+            empty.add(page)  # 解析出来是空页（超过最后一页），当作上界
+            return True, reference
+        oldest = page_oldest(rows, reference)
+        return oldest <= until, oldest
+
+    # 倍增（步长受 gallop_step 限制）
+    prev, prev_oldest = lo, lo_oldest
+    page = 1
+    while page <= max_pages:
+        hit, oldest = reaches(page, lo_oldest)
+        if hit:
+            hi = page
+            break
+        prev, prev_oldest, lo, lo_oldest = lo, lo_oldest, page, oldest
+        page = lo + gallop_step(lo, lo_oldest, prev, prev_oldest)
+    if hi is None:
+        hi = max_pages + 1
+
+    # 二分：lo 不满足、hi 满足；区间不超过倍增的一步，参照 lo 推断年份不会出错
+    while hi - lo > 1:
+        mid = (lo + hi) // 2
+        hit, oldest = reaches(mid, lo_oldest)
+        if hit:
+            hi = mid
+        else:
+            lo, lo_oldest = mid, oldest
+
+    if hi > max_pages or hi in empty:
+        print(f"🔎 探测 {probes} 次列表页，没有找到不晚于 {until} 的页")
+        return None, None
+    print(f"🔎 探测 {probes} 次列表页，从第 {hi} 页开始")
+    return hi, lo_oldest
+
+
+def crawl_date_range(since, until, max_pages=2000, all_pages=False,
+                     state_path="bakusai_thread_state.sqlite3", writer=None):
+    """
+    抓取最后回复时间在 [since, until] 内的帖子（例如补抓过去某个月）
+    先二分定位起始列表页，再只抓窗口内的页，读到比 since 更旧的页就停止
+    writer 同 crawl_current_month
+    """
+    cache = {}
+    page, reference = find_first_page(until, max_pages, cache)
+    if page is None:
+        print("📌 没有落在该时间范围内的列表页")
+        return []
+
+    results = []
+    store = ThreadStateStore(state_path) if all_pages else None
+    while page <= max_pages:
+        rows = load_list_page(page, reference, cache)
+        if not rows:
+            break
+        reference = page_oldest(rows, reference)
+        for item, last_reply in rows:
+            if last_reply is None or not since <= last_reply <= until or item["comment_count"] == 0:
+                continue
+            t = make_thread(item)
+            if writer is not None and writer.seen(t["url"]):
+                continue
+            if all_pages:
+                detail = parse_thread_detail_all_pages(t, store)[0]
+            else:
+                detail = parse_thread_detail(t)
+            if not detail:
+                continue
+            detail["last_reply_time"] = last_reply.strftime("%Y-%m-%d %H:%M:%S")
+            if writer is not None:
+                writer.write(detail)
+            else:
+                results.append(detail)
+            METRICS.inc("crawl_items_total")
+            print(f"    ✅ 收录帖子 {t['tid']}（最后回复: {detail['last_reply_time']}）")
+            time.sleep(1)
+
+        if reference < since:
+            print("📌 已早于起始日期，停止翻页")
+            break
+        page += 1
+        time.sleep(2)
+
+    if store is not None:
+        store.close()
+    return results
+
+# ========== 异步并发抓取 ==========
+async def crawl_current_month_async(max_pages=50, concurrency=4, rate=1.0, burst=2, writer=None):
+    """
+    与 crawl_current_month 返回相同的记录，但同时保持多个帖子详情请求在途。
+    concurrency: 同时在途的详情请求上限
+    rate / burst: 每个域名的令牌桶速率（次/秒）和突发容量，替代固定 sleep
+    writer: 同 crawl_current_month
+    """
+    limiter = HostRateLimiter(rate, burst)
+    semaphore = asyncio.Semaphore(concurrency)
+    now = datetime.now()
+    current_year = now.year
+    current_month = now.month
+
+    async def fetch_async(url):
+        async with semaphore:
+            await limiter.acquire_async(url)
+            # requests 是阻塞的，放到线程池里执行，事件循环可以继续调度其它请求
+            return await asyncio.to_thread(fetch, url)
+
+    async def fetch_detail(thread):
+        html = await fetch_async(thread["url"])
+        if not html:
+            return None
+        return parse_thread_detail_html(html, thread)
+
+    results = []
+    for page in range(1, max_pages + 1):
+        print(f"📄 正在抓列表页 {page}")
+        html = await fetch_async(LIST_URL.format(page))
+        if not html:
+            break
+        threads, stop = parse_thread_list_html(html, current_year, current_month)
+        if writer is not None:
+            threads = [t for t in threads if not writer.seen(t["url"])]
+
+        # gather 保持输入顺序，结果顺序与同步版本一致
+        details = await asyncio.gather(*(fetch_detail(t) for t in threads))
+        for t, detail in zip(threads, details):
+            if not detail:
+                continue
+            if writer is not None:
+                writer.write(detail)
+            else:
+                results.append(detail)
+            METRICS.inc("crawl_items_total")
+            print(f"    ✅ 收录帖子 {t['tid']}（评论数: {t['comment_count']}）")
+
+        if stop:
+            print("📌 已到当月最后回复帖子，停止翻页")
+            break
+
+    return results
+
+
+def crawl_current_month_concurrent(max_pages=50, concurrency=4, rate=1.0, burst=2, writer=None):
+    """crawl_current_month_async 的同步包装"""
+    return asyncio.run(crawl_current_month_async(max_pages, concurrency, rate, burst, writer))
+
 # ========== 入口 ==========
-if __name__ == "__main__":
-    data = crawl_current_month(max_pages=50)
+def parse_date_arg(text):
+    return datetime.strptime(text, "%Y-%m-%d")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="爆サイ论坛帖子抓取")
+    parser.add_argument("--max-pages", type=int, default=None,
+                        help="最多翻多少页列表（默认本月 / 增量 50 页，日期范围 2000 页）")
+    parser.add_argument("--all-pages", action="store_true", help="抓取帖子全部评论页（断点保存在状态库）")
+    parser.add_argument("--async", dest="use_async", action="store_true", help="异步并发抓取帖子详情")
+    parser.add_argument("--incremental", action="store_true", help="基于本地状态库只输出新评论")
+    parser.add_argument("--jsonl", action="store_true", help="边抓边写 JSONL")
+    parser.add_argument("--resume", action="store_true", help="从上次中断的 JSONL 输出继续（隐含 --jsonl）")
+    parser.add_argument("--since", type=parse_date_arg, default=None,
+                        help="只抓最后回复不早于该日期的帖子 YYYY-MM-DD（按日期范围抓取）")
+    parser.add_argument("--until", type=parse_date_arg, default=None,
+                        help="日期范围的结束日期 YYYY-MM-DD（当天也包含在内，默认到现在）")
+    parser.add_argument("--metrics", default=METRICS_PATH,
+                        help="运行指标输出文件（.prom 为 Prometheus textfile，否则 JSON），空字符串关闭")
+    args = parser.parse_args(argv)
+    if args.until is not None and args.since is None:
+        parser.error("--until 需要和 --since 一起使用")
+    # 各抓取模式不支持的组合直接报错，不静默忽略
+    if args.use_async and args.all_pages:
+        parser.error("--async 不支持 --all-pages")
+    if args.use_async and args.incremental:
+        parser.error("--async 不能和 --incremental 一起使用")
+    if args.incremental and (args.jsonl or args.resume):
+        parser.error("--incremental 不支持 --jsonl / --resume")
+    if args.since is not None and (args.use_async or args.incremental):
+        parser.error("--since 按日期范围抓取，不能和 --async / --incremental 一起使用")
+    if args.max_pages is None:
+        args.max_pages = 2000 if args.since is not None else 50
+    return args
+
+
+def date_range_of(args):
+    """(since, until)，until 当天也包含在内；没有 --since 时返回 None"""
+    if args.since is None:
+        return None
+    until = args.until + timedelta(days=1, microseconds=-1) if args.until else datetime.now()
+    return args.since, until
+
+
+def report_transport(stem):
+    """打印连接复用情况；有失败的请求时写出 <stem>_failed.json"""
+    for host, st in record_connection_stats(session).items():
+        print(f"🔌 {host}: 请求 {st['requests']} 次 | 新建连接 {st['new_connections']} 个 | "
+              f"复用率 {st['reuse_rate']:.0%}")
+    if FAILED_URLS:
+        path = f"{stem}_failed.json"
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(FAILED_URLS, f, ensure_ascii=False, indent=2)
+        print(f"⚠️ {len(FAILED_URLS)} 个请求重试后仍失败，已记录到 {path}")
 
-    with open("bakusai_current_month.json", "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
 
-    print(f"\n🎉 完成：共抓取 {len(data)} 条本月帖子")
+def main(argv=None):
+    args = parse_args(argv)
+    date_range = date_range_of(args)
+    stem = "bakusai_current_month"
+    if date_range:
+        stem = f"bakusai_{date_range[0]:%Y%m%d}_{date_range[1]:%Y%m%d}"
+
+    # 抓取指标（延迟 / 字节 / 解析耗时）每 30 秒和结束时写到 args.metrics
+    with MetricsReporter(args.metrics, interval=30, job="bakusai_forum"):
+        # 流式输出：--jsonl 边抓边写，--resume 从上次中断处继续
+        if args.jsonl or args.resume:
+            output = f"{stem}.jsonl"
+            with JsonlWriter(output, key="url", resume=args.resume) as writer:
+                if date_range:
+                    crawl_date_range(*date_range, max_pages=args.max_pages, all_pages=args.all_pages,
+                                     writer=writer)
+                elif args.use_async:
+                    crawl_current_month_concurrent(max_pages=args.max_pages, writer=writer)
+                else:
+                    crawl_current_month(max_pages=args.max_pages, all_pages=args.all_pages, writer=writer)
+            print(f"\n🎉 完成：本次新抓取 {writer.written} 条，共 {len(writer.done)} 条本月帖子，已写入 {output}")
+            report_transport(stem)
+            return
+
+        if date_range:
+            data = crawl_date_range(*date_range, max_pages=args.max_pages, all_pages=args.all_pages)
+        elif args.use_async:
+            data = crawl_current_month_concurrent(max_pages=args.max_pages)
+        elif args.incremental:
+            data = crawl_incremental(max_pages=args.max_pages, all_pages=args.all_pages)
+        else:
+            data = crawl_current_month(max_pages=args.max_pages, all_pages=args.all_pages)
+
+        with open(f"{stem}.json", "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+
+        print(f"\n🎉 完成：共抓取 {len(data)} 条帖子，已写入 {stem}.json")
+        report_transport(stem)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,10 @@
 import scrapy
 import json
+from datetime import timedelta
+
+from scrapy import signals
+
+from demo.watermark import WatermarkStore, parse_pub_date
 
 
 class NhkChinaNewsSpider(scrapy.Spider):
@@ -10,28 +15,62 @@ class NhkChinaNewsSpider(scrapy.Spider):
         "https://news.web.nhk/newsweb/api/news-nwa-topic-nationwide-0001595.json"
     ]
 
+    # 增量抓取：已抓过的 URL 不再请求正文，整页都早于水位线时不再翻页
+    # scrapy crawl nhk_china_news -a full=1 忽略水位线全量抓取（结束后仍会更新水位线）
+    full = False
+
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super().from_crawler(crawler, *args, **kwargs)
+        spider.store = WatermarkStore(crawler.settings.get("WATERMARK_PATH", "crawl_watermark.sqlite3"))
+        state = None if spider.full_crawl else spider.store.get(spider.name)
+        spider.high_water = parse_pub_date(state["pub_date"]) if state else None
+        spider.requested = {}  # 本次请求了正文的 URL -> pubDate
+        spider.fetched = set()  # 本次拿到了正文响应的 URL
+        crawler.signals.connect(spider.spider_closed, signal=signals.spider_closed)
+        return spider
+
+    @property
+    def full_crawl(self):
+        return str(self.full).lower() in ("1", "true", "yes")
+
     def parse(self, response):
         data = json.loads(response.text)
+        items = [item for item in data.get("items", []) if item.get("url")]
+        known = set() if self.full_crawl else self.store.known(self.name, [item["url"] for item in items])
 
         # 新闻列表
-        for item in data.get("items", []):
-            url = item.get("url")
-            if url:
-                yield scrapy.Request(
-                    url,
-                    callback=self.parse_detail,
-                    meta={
-                        "title": item.get("title"),
-                        "date": item.get("pubDate")
-                    }
-                )
-
-        # 翻页（非常关键）
+        page_is_old = self.high_water is not None and bool(items)
+        for item in items:
+            url = item["url"]
+            pub_date = parse_pub_date(item.get("pubDate"))
+            if self.high_water is not None and (pub_date is None or pub_date > self.high_water):
+                page_is_old = False
+
+            if url in known or url in self.requested:
+                self.crawler.stats.inc_value("watermark/skipped_known")
+                continue
+            self.requested[url] = pub_date
+            yield scrapy.Request(
+                url,
+                callback=self.parse_detail,
+                meta={
+                    "title": item.get("title"),
+                    "date": item.get("pubDate"),
+                    "list_url": url
+                }
+            )
+
+        # 翻页（非常关键）：整页都不比水位线新，说明后面都抓过了
         next_url = data.get("next")
-        if next_url:
+        if next_url and page_is_old:
+            self.logger.info(f"整页早于水位线 {self.high_water.isoformat()}，停止翻页")
+            self.crawler.stats.set_value("watermark/stopped_at", response.url)
+        elif next_url:
             yield scrapy.Request(next_url, callback=self.parse)
 
     def parse_detail(self, response):
+        self.fetched.add(response.meta["list_url"])
         title = response.meta.get("title")
         date = response.meta.get("date")
 
@@ -50,3 +89,22 @@ class NhkChinaNewsSpider(scrapy.Spider):
                 "date": date,
                 "content": content
             }
+
+    def spider_closed(self, spider, reason):
+        """
+        关闭时一次性写入本次抓过的 URL 和新水位线：
+        - 只有正常结束才推进水位线，中途停止时后面的页可能还没翻到
+        - 有正文请求失败时，水位线不越过失败的那条，下次还会翻到它
+        """
+        pub_date = url = None
+        dated = [(d, u) for u, d in self.requested.items() if u in self.fetched and d is not None]
+        if reason == "finished" and dated:
+            pub_date, url = max(dated)
+            failed = [d for u, d in self.requested.items() if u not in self.fetched and d is not None]
+            if failed and min(failed) <= pub_date:
+                pub_date, url = min(failed) - timedelta(seconds=1), None
+        self.store.commit(self.name, self.fetched, pub_date, url)
+        self.crawler.stats.set_value("watermark/new_urls", len(self.fetched))
+        if pub_date is not None:
+            self.crawler.stats.set_value("watermark/pub_date", pub_date.isoformat())
+        self.store.close()
@@ -1,6 +1,6 @@
 import scrapy
-from w3lib.html import remove_tags
-import re
+
+from demo import bakusai_parser
 
 
 class BakusaiChinaNewsSpider(scrapy.Spider):
@@ -12,9 +12,9 @@ class BakusaiChinaNewsSpider(scrapy.Spider):
         "https://bakusai.com/areamain/acode=13/ctrid=1/"
     ]
 
+    # 速率由 AdaptiveRateMiddleware 控制，这里只限制上限，对论坛保守一些
     custom_settings = {
-        "DOWNLOAD_DELAY": 1,
-        "CONCURRENT_REQUESTS_PER_DOMAIN": 1,
+        "ADAPTIVE_RATE_MAX_CONCURRENCY": 4,
         "FEED_EXPORT_ENCODING": "utf-8",
         "USER_AGENT": (
             "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
@@ -50,42 +50,13 @@ class BakusaiChinaNewsSpider(scrapy.Spider):
         - 提取正文（清理制表符、换行和连续空格）
         - 提取评论
         """
-        # ---------- 1️⃣ 标题 ----------
-        title = response.css("strong[itemprop='headline']::text").get()
-        if not title:
-            title = response.css("h1::text").get()
-        if title:
-            title = title.strip()
-        else:
+        # 解析逻辑在 bakusai_parser 里，和 requests 版论坛爬虫共用
+        detail = bakusai_parser.parse_news_detail(response.body)
+        if detail is None:
             return  # 没标题就不要了
 
-        # ---------- 2️⃣ 正文 ----------
-        article_html = response.css("div#threadBody[itemprop='articlebody']").get()
-        article_text = ""
-        if article_html:
-            article_text = remove_tags(article_html)
-            # 去掉制表符、换行和连续空格
-            article_text = re.sub(r"[\t\r\n]+", " ", article_text)
-            article_text = re.sub(r"\s{2,}", " ", article_text)
-            article_text = article_text.strip()
-
-        # ---------- 3️⃣ 评论 ----------
-        raw_comments = response.css("div.resbody[itemprop='commentText'] ::text").getall()
-        comments = []
-        for c in raw_comments:
-            c = c.strip()
-            if not c:
-                continue
-            if c.startswith(">>") and c[2:].isdigit():
-                continue
-            if len(c) < 3:
-                continue
-            comments.append(c)
-
-        # ---------- 4️⃣ 输出 ----------
+        # ---------- 输出 ----------
         yield {
             "url": response.url,
-            "title": title,
-            "article_text": article_text,
-            "comments": comments
+            **detail
         }
@@ -0,0 +1,158 @@
+import json
+import os
+import time
+
+
+def iter_jsonl(path):
+    """逐行读取 JSONL，跳过空行和写了一半的坏行"""
+    if not os.path.exists(path):
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                continue
+
+
+def _truncate_partial_tail(path):
+    """崩溃时最后一行可能只写了一半，截掉它以便续写"""
+    with open(path, "rb+") as f:
+        good = 0
+        for line in iter(f.readline, b""):
+            if not line.endswith(b"\n"):
+                break
+            try:
+                json.loads(line)
+            except ValueError:
+                break
+            good = f.tell()
+        f.truncate(good)
+
+
+def load_json_records(path):
+    """
+    读取 .jsonl 或 JSON 数组文件，返回记录列表
+    scrapy -o 追加写出的文件是多个数组首尾相接，也能读
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+    if str(path).endswith(".jsonl"):
+        return [json.loads(line) for line in text.splitlines() if line.strip()]
+    decoder = json.JSONDecoder()
+    records, pos = [], 0
+    while True:
+        while pos < len(text) and text[pos].isspace():
+            pos += 1
+        if pos >= len(text):
+            return records
+        value, pos = decoder.raw_decode(text, pos)
+        records.extend(value if isinstance(value, list) else [value])
+
+
+def latest_records(path, key="url"):
+    """
+    读取 JSONL 并按 key 去重，同一 key 以最后一条为准（保持第一次出现的位置）
+    没有 key 字段的记录原样保留
+    """
+    latest = {}
+    for i, record in enumerate(iter_jsonl(path)):
+        k = record.get(key) if key else None
+        latest[("key", k) if k is not None else ("row", i)] = record
+    return list(latest.values())
+
+
+def _compact(path, key):
+    """
+    续跑前整理输出：同一 key 只留最后一条，去掉失败记录（续跑时会重做），
+    先写临时文件再替换，读者不会看到重复的 url
+    """
+    records = [r for r in latest_records(path, key) if "error" not in r]
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    return records
+
+
+def export_json(jsonl_path, json_path, key="url"):
+    """把 JSONL 输出按 key 去重后写成一个 JSON 数组（兼容读 .json 的下游），返回条数"""
+    records = latest_records(jsonl_path, key)
+    with open(json_path, "w", encoding="utf-8") as f:
+        json.dump(records, f, ensure_ascii=False, indent=2)
+    return len(records)
+
+
+class JsonlWriter:
+    """
+    流式 JSONL 写入器
+    - 每条记录写一行，内存不随运行时长增长
+    - 每 flush_every 条 flush 一次，每 fsync_every 条 fsync 一次作为检查点
+    - resume=True 时保留已有输出，并按 key 字段跳过已完成的记录
+      （带 error 字段的失败记录不算完成，续跑时会重做；续跑前先整理文件，
+      去掉这些失败记录和重复的 key，重做后同一 url 只有一条）
+    """
+
+    def __init__(self, path, key="url", resume=False, flush_every=10, fsync_every=100, fsync_interval=30):
+        self.path = path
+        self.key = key
+        self.flush_every = flush_every
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.done = set()
+        self.written = 0
+
+        if resume and os.path.exists(path):
+            _truncate_partial_tail(path)
+            if key:
+                self.done = {r[key] for r in _compact(path, key) if r.get(key) is not None}
+            mode = "a"
+        else:
+            mode = "w"
+
+        self._f = open(path, mode, encoding="utf-8")
+        self._last_fsync = time.monotonic()
+
+    def seen(self, key_value):
+        """该记录是否已在输出中（用于在做昂贵工作之前跳过）"""
+        return key_value in self.done
+
+    def write(self, record):
+        """写入一条记录；已存在的 key 返回 False，没有 key 字段的记录照常写入、不参与去重"""
+        k = record.get(self.key) if self.key else None
+        if k is not None:
+            if k in self.done:
+                return False
+            self.done.add(k)
+
+        self._f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.written += 1
+
+        if self.written % self.fsync_every == 0 or time.monotonic() - self._last_fsync >= self.fsync_interval:
+            self.checkpoint()
+        elif self.written % self.flush_every == 0:
+            self._f.flush()
+        return True
+
+    def checkpoint(self):
+        """flush 并 fsync，保证已写记录落盘"""
+        self._f.flush()
+        os.fsync(self._f.fileno())
+        self._last_fsync = time.monotonic()
+
+    def close(self):
+        if not self._f.closed:
+            self.checkpoint()
+            self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,100 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+
+def content_hash(*parts):
+    """对帖子内容计算稳定的哈希，用于判断正文是否变化"""
+    h = hashlib.sha1()
+    for p in parts:
+        h.update((p or "").encode("utf-8"))
+        h.update(b"\x00")
+    return h.hexdigest()
+
+
+class ThreadStateStore:
+    """
+    按 tid 持久化帖子抓取状态（SQLite）
+    记录上次看到的评论数、发帖时间、内容哈希和已抓取到的最大评论编号
+    """
+
+    def __init__(self, path="bakusai_thread_state.sqlite3"):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS thread_state (
+                tid TEXT PRIMARY KEY,
+                comment_count INTEGER NOT NULL,
+                post_time TEXT,
+                content_hash TEXT,
+                last_res_no INTEGER NOT NULL DEFAULT 0,
+                updated_at REAL NOT NULL
+            )
+        """)
+        # 多页评论的断点：已抓完的页先落盘，中断后只补抓缺失页
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS thread_pages (
+                tid TEXT NOT NULL,
+                tp INTEGER NOT NULL,
+                comments TEXT NOT NULL,
+                fetched_at REAL NOT NULL,
+                PRIMARY KEY (tid, tp)
+            )
+        """)
+        self.conn.commit()
+        self._lock = threading.Lock()
+
+    def get(self, tid):
+        row = self.conn.execute(
+            "SELECT * FROM thread_state WHERE tid = ?", (tid,)
+        ).fetchone()
+        return dict(row) if row else None
+
+    def update(self, tid, comment_count, post_time, content_hash, last_res_no):
+        self.conn.execute("""
+            INSERT INTO thread_state (tid, comment_count, post_time, content_hash, last_res_no, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(tid) DO UPDATE SET
+                comment_count = excluded.comment_count,
+                post_time = excluded.post_time,
+                content_hash = excluded.content_hash,
+                last_res_no = MAX(thread_state.last_res_no, excluded.last_res_no),
+                updated_at = excluded.updated_at
+        """, (tid, comment_count, post_time, content_hash, last_res_no, time.time()))
+        self.conn.commit()
+
+    def save_page(self, tid, tp, comments):
+        """comments: [(评论编号, 评论原文), ...]，同时记录抓取时间"""
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO thread_pages (tid, tp, comments, fetched_at) VALUES (?, ?, ?, ?)",
+                (tid, tp, json.dumps(comments, ensure_ascii=False), time.time())
+            )
+            self.conn.commit()
+
+    def load_pages(self, tid, max_age=None):
+        """返回 {页码: 评论}；max_age（秒）不为空时只返回这段时间内抓的页"""
+        sql = "SELECT tp, comments FROM thread_pages WHERE tid = ?"
+        params = [tid]
+        if max_age is not None:
+            sql += " AND fetched_at >= ?"
+            params.append(time.time() - max_age)
+        rows = self.conn.execute(sql, params).fetchall()
+        return {row["tp"]: [tuple(c) for c in json.loads(row["comments"])] for row in rows}
+
+    def clear_pages(self, tid):
+        with self._lock:
+            self.conn.execute("DELETE FROM thread_pages WHERE tid = ?", (tid,))
+            self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
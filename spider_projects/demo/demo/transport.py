@@ -0,0 +1,110 @@
+"""
+requests 爬虫共用的 HTTP 传输层
+- 连接池：按站点复用 keep-alive 连接，pool_maxsize 与并发数匹配，避免每次请求重新握手
+- 压缩：Accept-Encoding 取 urllib3 能解码的编码（装了 brotli / brotlicffi 时包含 br）
+- 超时：连接超时与读取超时分开设置
+- 重试：只对幂等的 GET / HEAD 重试（连接错误、读超时、429 / 5xx），指数退避加随机抖动，
+  遵守 Retry-After
+connection_stats() 返回每个站点的请求数 / 新建连接数 / 复用率，用来确认握手不再是瓶颈
+"""
+import random
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry, make_headers
+
+from demo.metrics import METRICS
+
+DEFAULT_TIMEOUT = (5, 20)  # (连接, 读取) 秒
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class JitteredRetry(Retry):
+    """退避时间在 [0.5, 1.5) 倍之间随机抖动，多个线程失败后不会在同一时刻一起重试"""
+
+    def get_backoff_time(self):
+        backoff = super().get_backoff_time()
+        return backoff * random.uniform(0.5, 1.5) if backoff else 0
+
+    def increment(self, method=None, url=None, response=None, error=None, _pool=None, _stacktrace=None):
+        host = _pool.host if _pool is not None else urlsplit(url or "").netloc
+        METRICS.inc("http_retries_total", host=host)
+        return super().increment(method, url, response, error, _pool, _stacktrace)
+
+
+class TimeoutHTTPAdapter(HTTPAdapter):
+    """调用方没有传 timeout 时使用默认的 (连接, 读取) 超时"""
+
+    def __init__(self, *args, timeout=DEFAULT_TIMEOUT, **kwargs):
+        self.timeout = timeout
+        super().__init__(*args, **kwargs)
+
+    def send(self, request, **kwargs):
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = self.timeout
+        return super().send(request, **kwargs)
+
+
+def build_session(headers=None, pool_connections=4, pool_maxsize=16, retries=3, backoff=0.5,
+                  timeout=DEFAULT_TIMEOUT):
+    """
+    pool_connections: 缓存连接池的站点数
+    pool_maxsize: 每个站点保留的空闲连接数（不小于并发请求数，否则多出的连接用完即关）
+    retries / backoff: 最多重试次数和退避基数（第 n 次重试约等待 backoff * 2^(n-1) 秒）
+    timeout: (连接超时, 读取超时)
+    """
+    retry = JitteredRetry(
+        total=retries,
+        connect=retries,
+        read=retries,
+        status=retries,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset({"GET", "HEAD"}),
+        backoff_factor=backoff,
+        respect_retry_after_header=True,
+        raise_on_status=False,  # 重试用完后返回最后一次响应，交给 raise_for_status
+    )
+    adapter = TimeoutHTTPAdapter(
+        pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=retry, timeout=timeout
+    )
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update(headers or {})
+    session.headers["Accept-Encoding"] = make_headers(accept_encoding=True)["accept-encoding"]
+    session.headers["Connection"] = "keep-alive"
+    return session
+
+
+def connection_stats(session):
+    """
+    {host: {"requests", "new_connections", "reused", "reuse_rate"}}
+    数据来自 urllib3 连接池自身的计数（被淘汰出缓存的连接池不再统计）
+    """
+    stats = {}
+    for adapter in set(session.adapters.values()):
+        manager = getattr(adapter, "poolmanager", None)
+        if manager is None:
+            continue
+        for key in list(manager.pools.keys()):
+            pool = manager.pools.get(key)
+            if pool is None:
+                continue
+            entry = stats.setdefault(pool.host, {"requests": 0, "new_connections": 0})
+            entry["requests"] += pool.num_requests
+            entry["new_connections"] += pool.num_connections
+    for entry in stats.values():
+        entry["reused"] = max(entry["requests"] - entry["new_connections"], 0)
+        entry["reuse_rate"] = entry["reused"] / entry["requests"] if entry["requests"] else 0.0
+    return stats
+
+
+def record_connection_stats(session, metrics=METRICS):
+    """把 connection_stats 写进指标（gauge），返回同一份统计"""
+    stats = connection_stats(session)
+    for host, entry in stats.items():
+        metrics.set_gauge("http_pool_requests", entry["requests"], host=host)
+        metrics.set_gauge("http_pool_new_connections", entry["new_connections"], host=host)
+        metrics.set_gauge("http_pool_reuse_rate", round(entry["reuse_rate"], 4), host=host)
+    return stats
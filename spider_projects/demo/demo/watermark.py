@@ -0,0 +1,85 @@
+import sqlite3
+import time
+from datetime import datetime
+
+
+def parse_pub_date(text):
+    """NHK 列表 JSON 的 pubDate（ISO 8601，带时区），解析失败返回 None"""
+    try:
+        return datetime.fromisoformat(text)
+    except (TypeError, ValueError):
+        return None
+
+
+class WatermarkStore:
+    """
+    增量抓取的水位线（SQLite）
+    - watermark: 每个爬虫已完整抓取到的最新发布时间和对应 URL
+    - seen_urls: 已抓过正文的 URL，下次直接跳过
+    两者在 commit() 的同一个事务里更新，中途崩溃不会出现只写了一半的状态
+    """
+
+    def __init__(self, path="crawl_watermark.sqlite3"):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS watermark (
+                name TEXT PRIMARY KEY,
+                pub_date TEXT NOT NULL,
+                url TEXT,
+                updated_at REAL NOT NULL
+            )
+        """)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS seen_urls (
+                name TEXT NOT NULL,
+                url TEXT NOT NULL,
+                PRIMARY KEY (name, url)
+            )
+        """)
+        self.conn.commit()
+
+    def get(self, name):
+        row = self.conn.execute("SELECT * FROM watermark WHERE name = ?", (name,)).fetchone()
+        return dict(row) if row else None
+
+    def known(self, name, urls):
+        """返回 urls 中已经抓过的那些"""
+        urls = list(urls)
+        found = set()
+        for start in range(0, len(urls), 500):
+            part = urls[start:start + 500]
+            placeholders = ",".join("?" * len(part))
+            found.update(row[0] for row in self.conn.execute(
+                f"SELECT url FROM seen_urls WHERE name = ? AND url IN ({placeholders})", [name, *part]
+            ))
+        return found
+
+    def commit(self, name, seen_urls=(), pub_date=None, url=None):
+        """
+        在一个事务里记录新抓过的 URL，pub_date 比已有水位线新时同时推进水位线（不会回退）
+        """
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO seen_urls (name, url) VALUES (?, ?)",
+                [(name, u) for u in seen_urls]
+            )
+            if pub_date is None:
+                return
+            current = self.get(name)
+            if current is not None and parse_pub_date(current["pub_date"]) >= pub_date:
+                return
+            self.conn.execute(
+                "INSERT OR REPLACE INTO watermark (name, pub_date, url, updated_at) VALUES (?, ?, ?, ?)",
+                (name, pub_date.isoformat(), url, time.time())
+            )
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
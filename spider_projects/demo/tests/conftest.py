@@ -0,0 +1,7 @@
+import sys
+from pathlib import Path
+
+# 在 spider_projects/demo 下运行 pytest 时也能导入 demo / data_analyze 包
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
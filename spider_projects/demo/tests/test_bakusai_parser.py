@@ -0,0 +1,53 @@
+import pytest
+
+pytest.importorskip("lxml")
+
+from demo import bakusai_parser as parser  # noqa: E402
+
+LIST_HTML = """<html><body><ul>
+<li data-tid="101"><a class="thr_status_icon">タイトル<b>1</b></a>
+  <span class="comment_count_area"><span class="icon"></span><span> 12 </span></span>
+  <span class="thr-posted-ago">3時間前</span></li>
+<li data-tid="102"><a class="thr_status_icon">タイトル2</a></li>
+</ul></body></html>"""
+
+THREAD_HTML = """<html><head><meta charset="utf-8"></head><body>
+<span class="posts" itemprop="datePublished"> 2025/05/01 12:00 </span>
+<div id="threadBody">本文</div>
+<div class="resbody">#51 2025/05/01 12:01
+>>3 そうですね</div>
+<div class="resbody">番号なし</div>
+<div class="paging"><a href="/thr_res/tid=101/tp=1/">1</a><a href="/thr_res/tid=101/tp=3/">3</a></div>
+</body></html>"""
+
+
+def test_parse_list_items():
+    items = list(parser.parse_list_items(parser.to_tree(LIST_HTML)))
+    assert items == [
+        {"tid": "101", "title": "タイトル1", "comment_count": 12, "last_reply_text": "3時間前"},
+        {"tid": "102", "title": "タイトル2", "comment_count": 0, "last_reply_text": ""},
+    ]
+
+
+def test_parse_thread_page():
+    tree = parser.to_tree(THREAD_HTML.encode("utf-8"))
+    assert parser.parse_post_time_text(tree) == "2025/05/01 12:00"
+    assert parser.parse_thread_body(tree) == "本文"
+    comments = list(parser.iter_comments(tree, offset=50))
+    assert [no for no, _ in comments] == [51, 52]
+    assert parser.clean_comment(comments[0][1]) == "そうですね"
+    assert parser.max_pager_page(tree) == 3
+
+
+def test_parse_news_detail():
+    html = """<html><body><strong itemprop="headline"> 見出し </strong>
+    <div id="threadBody" itemprop="articlebody">一行目
+      二行目</div>
+    <div class="resbody x" itemprop="commentText">コメントです</div>
+    <div class="resbody" itemprop="commentText">&gt;&gt;12</div>
+    <div class="resbody" itemprop="commentText">短</div>
+    </body></html>"""
+    assert parser.parse_news_detail(html) == {
+        "title": "見出し", "article_text": "一行目 二行目", "comments": ["コメントです"],
+    }
+    assert parser.parse_news_detail("<html><body><p>no title</p></body></html>") is None
@@ -0,0 +1,97 @@
+import threading
+import time
+
+import pytest
+
+from data_analyze import chunking
+from data_analyze.chunking import analyze_chunked, chunk_comments, count_tokens, reduce_sentiments
+
+
+@pytest.fixture(autouse=True)
+def estimated_tokens(monkeypatch):
+    # 固定用估算计数（CJK 1 字 1 token），结果不依赖是否装了 tiktoken
+    monkeypatch.setattr(chunking, "_encoding", None)
+
+
+def test_count_tokens_estimate():
+    assert count_tokens("") == 0
+    assert count_tokens("中国") == 2
+    assert count_tokens("abcdefgh") == 2
+
+
+class ByteEncoder:
+    """按 UTF-8 字节编码的假 tokenizer：CJK 一个字 3 个 token，和 cl100k 一样会把一个字拆成多个 token"""
+
+    def encode(self, text):
+        return list(text.encode("utf-8"))
+
+    def decode_bytes(self, tokens):
+        return bytes(tokens)
+
+    def decode(self, tokens):
+        return bytes(tokens).decode("utf-8", errors="replace")
+
+
+def test_chunks_stay_within_budget_and_keep_order():
+    comments = ["あ" * 4, "い" * 4, "う" * 3, "え" * 9]
+    chunks = chunk_comments(comments, budget=8)
+    # 拼接用的换行也算 token
+    assert chunks == [["あ" * 4], ["い" * 4, "う" * 3], ["え" * 8], ["え"]]
+    assert all(count_tokens("\n".join(chunk)) <= 8 for chunk in chunks)
+    assert "".join("".join(chunk) for chunk in chunks) == "".join(comments)
+
+
+def test_budget_holds_with_multi_token_characters(monkeypatch):
+    monkeypatch.setattr(chunking, "_encoding", ByteEncoder())
+    comments = ["中文评论" * 5, "短评", "abc", "日本語のコメント" * 3]
+    budget = 10
+    chunks = chunk_comments(comments, budget)
+    for chunk in chunks:
+        assert count_tokens("\n".join(chunk)) <= budget
+    # 不会把一个字切成两半，拼回去和原文一致
+    assert "".join("".join(chunk) for chunk in chunks) == "".join(comments)
+    assert "\ufffd" not in "".join("".join(chunk) for chunk in chunks)
+
+
+def test_reduce_weights_by_tokens():
+    results = [{"sentiment": "积极", "reason": "a"}, {"sentiment": "消极", "reason": "b"},
+               {"sentiment": "消极"}, {"error": "timeout"}]
+    merged = reduce_sentiments(results, [10, 3, 3, 100])
+    assert merged["sentiment"] == "积极"
+    assert merged["distribution"] == {"积极": 0.625, "中性": 0.0, "消极": 0.375}
+    assert [c["tokens"] for c in merged["chunks"]] == [10, 3, 3, 100]
+
+
+def test_reduce_without_valid_results():
+    assert reduce_sentiments([{"error": "x"}], [5])["sentiment"] == "未知"
+
+
+def test_analyze_chunked_maps_every_chunk():
+    seen = []
+
+    def analyze(text):
+        seen.append(text)
+        return {"sentiment": "中性"}
+
+    result = analyze_chunked(["あ" * 5, "い" * 5, "う" * 5], analyze, budget=11, max_workers=2)
+    assert sorted(seen) == ["あ" * 5 + "\n" + "い" * 5, "う" * 5]
+    assert result["sentiment"] == "中性"
+
+
+def test_analyze_chunked_is_serial_by_default():
+    lock = threading.Lock()
+    active, peak = 0, 0
+
+    def analyze(text):
+        nonlocal active, peak
+        with lock:
+            active += 1
+            peak = max(peak, active)
+        time.sleep(0.01)
+        with lock:
+            active -= 1
+        return {"sentiment": "积极"}
+
+    analyze_chunked(["あ" * 8] * 4, analyze, budget=8)
+    # 在外层线程池里调用时不再额外开线程，在途请求数不超过外层并发
+    assert peak == 1
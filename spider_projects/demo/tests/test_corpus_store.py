@@ -0,0 +1,59 @@
+import pytest
+
+pytest.importorskip("pyarrow")
+
+from demo.corpus_store import CorpusWriter, normalize_record, parse_date, read_table  # noqa: E402
+
+FORUM_URL = "https://bakusai.com/thr_res/acode=13/ctrid=1/ctgid=150/bid=2396/tid={}/"
+
+
+def post(tid, day, comments):
+    return {"url": FORUM_URL.format(tid), "title": f"t{tid}", "post_time": f"{day} 12:00:00",
+            "body": "本文", "comment_count": len(comments), "comments": "\n".join(comments)}
+
+
+def test_parse_date_converts_to_jst():
+    assert str(parse_date("2025-05-01T00:30:00+00:00")) == "2025-05-01 09:30:00"
+    assert parse_date("not a date") is None
+
+
+def test_normalize_record_splits_tables():
+    rows = normalize_record(post(1, "2025-05-01", ["a", "b"]))
+    assert len(rows["posts"]) == 1 and len(rows["comments"]) == 2
+    assert rows["posts"][0]["source"] == "bakusai_forum" and rows["posts"][0]["month"] == "2025-05"
+    assert [c["comment_no"] for c in rows["comments"]] == [1, 2]
+
+
+def test_write_and_filter(tmp_path):
+    with CorpusWriter(tmp_path, batch_size=2) as writer:
+        writer.add(post(1, "2025-04-30", ["a"]))
+        writer.add(post(2, "2025-05-01", ["b", "c"]))
+        writer.add({"url": FORUM_URL.format(2), "post_time": "2025-05-01 12:00:00", "sentiment": "消极"})
+    assert writer.written == {"posts": 2, "comments": 3, "sentiment": 1}
+
+    assert read_table(tmp_path, "posts").num_rows == 2
+    may = read_table(tmp_path, "comments", columns=["text"], date_from="2025-05-01", date_to="2025-06-01")
+    assert sorted(may.column("text").to_pylist()) == ["b", "c"]
+    negative = read_table(tmp_path, "sentiment", sentiment="消极", source="bakusai_forum")
+    assert negative.column("url").to_pylist() == [FORUM_URL.format(2)]
+
+
+def test_replace_rewrites_partition(tmp_path):
+    for _ in range(2):
+        with CorpusWriter(tmp_path, replace=True) as writer:
+            writer.add(post(1, "2025-05-01", ["a"]))
+    assert read_table(tmp_path, "posts").num_rows == 1
+
+
+def test_replace_keeps_earlier_batches_of_the_same_run(tmp_path):
+    with CorpusWriter(tmp_path, batch_size=2) as writer:
+        writer.add(post(99, "2025-05-20", ["old"]))
+        writer.add(post(98, "2025-04-20", ["old"]))
+    with CorpusWriter(tmp_path, batch_size=2, replace=True) as writer:
+        for tid in range(1, 6):
+            writer.add(post(tid, "2025-05-01", [f"c{tid}"]))
+    # 5 月分区的旧数据被替换，本次分成 3 批写入的 5 行都在；没涉及的 4 月分区保留
+    may = read_table(tmp_path, "posts", date_from="2025-05-01", date_to="2025-06-01")
+    assert sorted(may.column("title").to_pylist()) == ["t1", "t2", "t3", "t4", "t5"]
+    assert read_table(tmp_path, "comments").num_rows == 6
+    assert read_table(tmp_path, "posts").num_rows == 6
@@ -0,0 +1,32 @@
+import pytest
+
+pytest.importorskip("requests")
+
+from demo.spiders.forum_crawl import bakusai_forum as forum  # noqa: E402
+
+
+@pytest.mark.parametrize("argv", [
+    ["--async", "--all-pages"],
+    ["--async", "--incremental"],
+    ["--incremental", "--jsonl"],
+    ["--incremental", "--resume"],
+    ["--since", "2025-01-01", "--async"],
+    ["--since", "2025-01-01", "--incremental"],
+    ["--until", "2025-01-31"],
+])
+def test_rejects_incompatible_flags(argv):
+    with pytest.raises(SystemExit):
+        forum.parse_args(argv)
+
+
+def test_max_pages_default_depends_on_mode():
+    assert forum.parse_args([]).max_pages == 50
+    assert forum.parse_args(["--since", "2025-01-01"]).max_pages == 2000
+    assert forum.parse_args(["--since", "2025-01-01", "--max-pages", "30"]).max_pages == 30
+
+
+def test_compatible_flags():
+    args = forum.parse_args(["--incremental", "--all-pages", "--max-pages", "5"])
+    assert args.incremental and args.all_pages and args.max_pages == 5
+    args = forum.parse_args(["--async", "--resume"])
+    assert args.use_async and args.resume
@@ -0,0 +1,54 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip("requests")
+
+from benchmarks.fixtures import render_list_page  # noqa: E402
+from demo.spiders.forum_crawl import bakusai_forum as forum  # noqa: E402
+
+N_PAGES = 1200
+
+
+@pytest.fixture
+def daily_list(monkeypatch):
+    """一页大约一天，共 1200 页（三年多）；页上的时间只有 "月/日 时:分"，要跨好几个年份推断"""
+    now = datetime.now()
+    requested = []
+
+    def fetch(url):
+        page = int(url.rstrip("/").rsplit("=", 1)[1])
+        requested.append(page)
+        if page > N_PAGES:
+            return render_list_page([], now)
+        threads = [
+            {"tid": f"{page}-{k}", "title": f"t{page}-{k}", "comment_count": 1,
+             "last_reply": now - timedelta(days=page - 1, hours=2 * k + 1)}
+            for k in range(10)
+        ]
+        return render_list_page(threads, now)
+
+    monkeypatch.setattr(forum, "fetch", fetch)
+    return now, requested
+
+
+def test_find_first_page_across_year_boundaries(daily_list):
+    now, requested = daily_list
+    # 第 800 页最旧一条是 799 天 19 小时前，第 799 页是 798 天 19 小时前
+    until = now - timedelta(days=799, hours=18)
+    page, reference = forum.find_first_page(until, max_pages=N_PAGES, rate=1000, burst=1000)
+    assert page == 800
+    assert reference.date() == (now - timedelta(days=798, hours=19)).date()
+    # 相邻两次探测的间隔都在一年以内，年份才能参照前一页推断
+    probed = sorted(set(requested))
+    assert all(b - a < 365 for a, b in zip(probed, probed[1:]))
+    assert len(requested) < 40
+
+
+def test_gallop_step_doubles_until_the_span_is_too_long():
+    now = datetime.now()
+    # 前 4 页只跨了 4 小时，照常倍增
+    assert forum.gallop_step(4, now - timedelta(hours=4), 2, now - timedelta(hours=2)) == 4
+    # 每页一天时，一步不超过 MAX_PROBE_SPAN
+    step = forum.gallop_step(256, now - timedelta(days=256), 128, now - timedelta(days=128))
+    assert step == forum.MAX_PROBE_SPAN.days
@@ -0,0 +1,47 @@
+from data_analyze.llm_cache import LLMCache
+
+
+def test_get_put_and_stats(tmp_path):
+    cache = LLMCache(str(tmp_path / "c.sqlite3"))
+    key = LLMCache.make_key("deepseek-chat", "v1", 0.0, "本文")
+    assert key != LLMCache.make_key("deepseek-chat", "v2", 0.0, "本文")
+    assert cache.get(key) is None
+    cache.put(key, {"sentiment": "积极"})
+    assert cache.get(key) == {"sentiment": "积极"}
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+    cache.close()
+
+
+def test_evicts_least_recently_used(tmp_path):
+    value = "x" * 100
+    size = len(f'"{value}"')
+    cache = LLMCache(str(tmp_path / "c.sqlite3"), max_bytes=size * 10, access_batch=1000)
+    for i in range(10):
+        cache.put(f"k{i}", value)
+    cache.get("k0")  # 访问时间只在内存里，淘汰前会先写回
+    cache.put("k10", value)
+
+    assert cache.stats()["bytes"] <= size * 10 * 0.9
+    assert cache.get("k0") == value
+    assert cache.get("k1") is None
+    assert cache.get("k10") == value
+    total = cache.conn.execute("SELECT SUM(size) FROM llm_cache").fetchone()[0]
+    assert total == cache.stats()["bytes"]
+    cache.close()
+
+
+def test_access_times_are_written_on_close(tmp_path):
+    path = str(tmp_path / "c.sqlite3")
+    cache = LLMCache(path, access_batch=1000)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.conn.execute("UPDATE llm_cache SET last_access = 0")
+    cache.get("a")
+    assert cache.conn.execute("SELECT MAX(last_access) FROM llm_cache").fetchone()[0] == 0
+    cache.close()
+
+    reopened = LLMCache(path)
+    after = dict(reopened.conn.execute("SELECT key, last_access FROM llm_cache"))
+    assert after["a"] > 0 and after["b"] == 0
+    assert reopened.stats()["bytes"] == 2
+    reopened.close()
@@ -0,0 +1,36 @@
+from demo.metrics import Metrics
+
+
+def test_prometheus_merges_common_labels():
+    metrics = Metrics(job="bakusai_forum", host="default")
+    metrics.inc("crawl_requests_total", host="bakusai.com")
+    metrics.inc("crawl_requests_total", host="bakusai.com")
+    text = metrics.to_prometheus()
+    # 同名标签只出现一次，以指标自身的为准
+    assert 'crawl_requests_total{host="bakusai.com",job="bakusai_forum"} 2' in text
+    assert text.count("# TYPE crawl_requests_total counter") == 1
+
+
+def test_prometheus_histogram_is_cumulative():
+    metrics = Metrics(job="test")
+    for value in (0.01, 0.2, 3.0):
+        metrics.observe("fetch_seconds", value, buckets=(0.1, 1.0), host="a")
+    lines = metrics.to_prometheus().splitlines()
+    buckets = [line for line in lines if line.startswith("fetch_seconds_bucket")]
+    assert [line.rsplit(" ", 1)[1] for line in buckets] == ["1", "2", "3"]
+    assert 'fetch_seconds_count{host="a",job="test"} 3' in lines
+
+
+def test_label_values_are_escaped():
+    metrics = Metrics()
+    metrics.set_gauge("g", 1, path='a"b\nc')
+    assert 'g{path="a\\"b\\nc"} 1' in metrics.to_prometheus()
+
+
+def test_write_picks_format_by_suffix(tmp_path):
+    metrics = Metrics(job="test")
+    metrics.inc("items_total")
+    metrics.write(tmp_path / "m.prom")
+    metrics.write(tmp_path / "m.json")
+    assert "items_total" in (tmp_path / "m.prom").read_text(encoding="utf-8")
+    assert '"items_total": 1' in (tmp_path / "m.json").read_text(encoding="utf-8")
@@ -0,0 +1,38 @@
+from data_analyze.near_dup import NearDupIndex, shingles
+
+TEXT = "中国の新しい政策について、多くの人が様々な意見を述べている。経済への影響が注目される。"
+
+
+def test_shingles_normalize_width():
+    assert shingles("ＡＢＣＤＥＦ", k=5) == shingles("ABCDEF", k=5)
+    assert shingles("", k=5) == set()
+
+
+def test_finds_near_duplicate_and_returns_payload(tmp_path):
+    index = NearDupIndex(str(tmp_path / "nd.sqlite3"), threshold=0.8)
+    index.add("a", TEXT, {"sentiment": "中性"})
+    doc_id, score, payload = index.find(TEXT.replace("。", "！", 1))
+    assert doc_id == "a" and score >= 0.8
+    assert payload == {"sentiment": "中性"}
+    assert index.find("まったく関係のない短い文章です。天気が良い。") is None
+    assert index.stats() == {"lookups": 2, "duplicates": 1, "duplicate_rate": 0.5}
+    index.close()
+
+
+def test_namespaces_are_isolated_and_persisted(tmp_path):
+    path = str(tmp_path / "nd.sqlite3")
+    index = NearDupIndex(path, namespace="v1")
+    index.add("a", TEXT)
+    index.close()
+
+    assert NearDupIndex(path, namespace="v2").find(TEXT) is None
+    reopened = NearDupIndex(path, namespace="v1")
+    assert reopened.find(TEXT)[0] == "a"
+    reopened.close()
+
+
+def test_signature_is_stable_across_instances(tmp_path):
+    a = NearDupIndex(str(tmp_path / "a.sqlite3"))
+    b = NearDupIndex(str(tmp_path / "b.sqlite3"))
+    assert a.signature(TEXT) == b.signature(TEXT)
+    assert NearDupIndex.similarity(a.signature(TEXT), b.signature(TEXT)) == 1.0
@@ -0,0 +1,100 @@
+from types import SimpleNamespace
+
+import pytest
+
+from data_analyze import openai_based_sentimental as sentimental
+from data_analyze import registry
+from data_analyze.llm_cache import LLMCache
+from data_analyze.near_dup import NearDupIndex
+from demo.streaming import iter_jsonl
+
+
+def fake_response(content):
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+@pytest.fixture
+def cache(monkeypatch, tmp_path):
+    monkeypatch.setattr(sentimental, "LLM_CACHE_PATH", str(tmp_path / "llm.sqlite3"))
+    registry.reset("llm_cache")
+    yield sentimental.get_cache()
+    sentimental.close_cache()
+
+
+def test_parse_failures_are_not_cached(monkeypatch, cache):
+    replies = iter(["不是 JSON", '{"sentiment": "积极", "reason": "好"}'])
+    calls = []
+
+    def create_completion(prompt):
+        calls.append(prompt)
+        return fake_response(next(replies))
+
+    monkeypatch.setattr(sentimental, "create_completion", create_completion)
+    assert sentimental.analyze_text("本文") == {"sentiment": "未知", "reason": "不是 JSON"}
+    # 解析失败没有写缓存，第二次重新请求
+    assert sentimental.analyze_text("本文") == {"sentiment": "积极", "reason": "好"}
+    assert sentimental.analyze_text("本文") == {"sentiment": "积极", "reason": "好"}
+    assert len(calls) == 2
+
+
+def test_close_cache_writes_back_access_times(cache):
+    cache.put("k", 1)
+    cache.conn.execute("UPDATE llm_cache SET last_access = 0")
+    cache.conn.commit()
+    cache.get("k")
+    sentimental.close_cache()
+    assert not registry.is_loaded("llm_cache")
+
+    reopened = LLMCache(cache.path)
+    assert reopened.conn.execute("SELECT last_access FROM llm_cache").fetchone()[0] > 0
+    reopened.close()
+
+
+def make_post(url, body="今日の会議は長引いたが、結論は出なかった。次回に持ち越しとなる。"):
+    return {"title": url, "url": url, "comment_count": 0, "body": body, "comments": ""}
+
+
+@pytest.fixture
+def near_dup(tmp_path):
+    index = NearDupIndex(str(tmp_path / "near_dup.sqlite3"), namespace="posts", threshold=0.9)
+    yield index
+    index.close()
+
+
+def test_unknown_results_are_not_reused(monkeypatch, tmp_path, cache, near_dup):
+    monkeypatch.setattr(sentimental, "SLEEP_TIME", 0)
+    replies = iter([{"sentiment": "未知", "reason": "无法解析"}, {"sentiment": "中性", "reason": "会议"}])
+    analyzed = []
+
+    def analyze_post(post):
+        analyzed.append(post["url"])
+        return sentimental.build_result(post, next(replies))
+
+    monkeypatch.setattr(sentimental, "analyze_post", analyze_post)
+    sentimental.analyze_posts([make_post("p1")], str(tmp_path / "run1.jsonl"), near_dup=near_dup)
+    # "未知" 没有进索引，下次遇到近似重复的帖子重新分析
+    sentimental.analyze_posts([make_post("p2")], str(tmp_path / "run2.jsonl"), near_dup=near_dup)
+    assert analyzed == ["p1", "p2"]
+    assert near_dup.find(make_post("p3")["body"])[0] == "p2"
+
+
+def test_batched_followers_analyze_themselves_when_leader_is_unknown(monkeypatch, tmp_path, cache, near_dup):
+    monkeypatch.setattr(sentimental, "SLEEP_TIME", 0)
+    analyzed = []
+
+    def analyze_post(post):
+        analyzed.append(post["url"])
+        sentiment = "未知" if post["url"] == "p1" else "积极"
+        return sentimental.build_result(post, {"sentiment": sentiment, "reason": ""})
+
+    monkeypatch.setattr(sentimental, "analyze_post", analyze_post)
+    output = tmp_path / "out.jsonl"
+    posts = [make_post("p1"), make_post("p2"), make_post("p3", body="全く別の話題。明日は晴れるらしい。")]
+    sentimental.analyze_posts_batched(posts, str(output), budget=1, near_dup=near_dup)
+
+    results = {r["url"]: r for r in iter_jsonl(str(output))}
+    assert analyzed == ["p1", "p2", "p3"]
+    assert results["p2"]["sentiment"] == "积极"
+    assert "near_duplicate_of" not in results["p2"]
+    # 本次的 leader 没有以占位的形式写进持久化索引
+    assert near_dup.find(posts[0]["body"])[0] == "p2"
@@ -0,0 +1,63 @@
+import asyncio
+
+import pytest
+
+from demo import ratelimit
+from demo.ratelimit import HostRateLimiter, TokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(ratelimit.time, "monotonic", clock.monotonic)
+    monkeypatch.setattr(ratelimit.time, "sleep", clock.sleep)
+    return clock
+
+
+def test_burst_then_steady_rate(clock):
+    bucket = TokenBucket(rate=2, capacity=3)
+    assert [bucket.acquire() for _ in range(3)] == [0.0, 0.0, 0.0]
+    # 桶空后按 1/rate 的间隔放行
+    assert bucket.acquire() == pytest.approx(0.5)
+    assert bucket.acquire() == pytest.approx(0.5)
+    clock.now += 10
+    assert bucket.acquire() == 0.0
+
+
+def test_reservations_queue_up(clock):
+    bucket = TokenBucket(rate=1)
+    assert bucket._reserve(1) == 0.0
+    # 同一时刻的多个调用方依次排队，不会同时放行
+    assert [bucket._reserve(1) for _ in range(3)] == pytest.approx([1.0, 2.0, 3.0])
+
+
+def test_async_acquire():
+    bucket = TokenBucket(rate=100, capacity=1)
+
+    async def run():
+        return [await bucket.acquire_async() for _ in range(3)]
+
+    waits = asyncio.run(run())
+    assert waits[0] == 0.0 and waits[1] > 0
+
+
+def test_rejects_non_positive_rate():
+    with pytest.raises(ValueError):
+        TokenBucket(0)
+
+
+def test_host_limiter_buckets_per_host():
+    limiter = HostRateLimiter(rate=1)
+    assert limiter.bucket("https://bakusai.com/a") is limiter.bucket("https://bakusai.com/b")
+    assert limiter.bucket("https://bakusai.com/a") is not limiter.bucket("https://www3.nhk.or.jp/")
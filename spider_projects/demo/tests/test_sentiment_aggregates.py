@@ -0,0 +1,88 @@
+import pytest
+
+pytest.importorskip("pandas")
+
+from data_analyze.sentiment_aggregates import SentimentAggregator, result_rows  # noqa: E402
+
+NEWS_URL = "https://bakusai.com/thr_res/acode=13/ctrid=1/ctgid=137/bid=1098/tid=1/"
+FORUM_URL = "https://bakusai.com/thr_res/acode=13/ctrid=1/ctgid=150/bid=2396/tid={}/"
+
+
+def news(url, article, comments, alignment, day="2025-05-01 10:00:00"):
+    return {
+        "url": url, "date": day,
+        "article_sentiment": {"sentiment": article}, "comment_sentiment": {"sentiment": comments},
+        "sentiment_alignment": alignment,
+    }
+
+
+def test_result_rows():
+    rows = result_rows(news(NEWS_URL, "积极", "消极", "不一致"))
+    assert [(r["target"], r["sentiment"], r["alignment"]) for r in rows] == [
+        ("article", "积极", "不一致"), ("comments", "消极", None),
+    ]
+    assert rows[0]["source"] == "bakusai_china_news" and rows[0]["board"] == "1098"
+    assert result_rows({"url": NEWS_URL, "error": "timeout"}) == []
+
+
+def test_counts_accumulate_once_per_result(tmp_path):
+    path = str(tmp_path / "agg.sqlite3")
+    results = [
+        news(NEWS_URL, "积极", "积极", "一致"),
+        {"url": FORUM_URL.format(1), "post_time": "2025-05-01 09:00:00", "sentiment": "消极"},
+        {"url": FORUM_URL.format(2), "post_time": "2025-05-08 09:00:00", "sentiment": "积极"},
+    ]
+    with SentimentAggregator(path) as aggregator:
+        aggregator.add_many(results)
+    # 重跑同一批结果不会重复计数
+    with SentimentAggregator(path) as aggregator:
+        aggregator.add_many(results)
+        assert aggregator.added == 0
+        assert aggregator.totals() == {
+            "article": {"积极": 1}, "comments": {"积极": 1}, "post": {"消极": 1, "积极": 1},
+        }
+
+        daily = aggregator.report("D", since="2025-05-01", until="2025-05-09")
+        assert daily.loc["2025-05-01", "total"] == 3
+        assert daily.loc["2025-05-01", "alignment_rate"] == 1.0
+        assert daily.loc["2025-05-05", "total"] == 0
+
+        weekly = aggregator.report("W", source="bakusai_forum", target="post")
+        assert list(weekly["total"]) == [1, 1]
+        assert weekly["aligned_total"].sum() == 0
+        assert weekly["消极"].dtype.kind == "i"
+
+
+def test_report_by_board(tmp_path):
+    with SentimentAggregator(str(tmp_path / "agg.sqlite3")) as aggregator:
+        aggregator.add_many([
+            news(NEWS_URL, "积极", "消极", "不一致"),
+            {"url": FORUM_URL.format(1), "post_time": "2025-05-01 09:00:00", "sentiment": "中性"},
+        ])
+        frame = aggregator.report("MS", by="board")
+        assert set(frame.index.get_level_values("board")) == {"1098", "2396"}
+        assert frame.xs("1098", level="board")["alignment_rate"].iloc[0] == 0.0
+
+
+def test_changed_result_moves_between_buckets(tmp_path):
+    with SentimentAggregator(str(tmp_path / "agg.sqlite3")) as aggregator:
+        aggregator.add_many([news(NEWS_URL, "积极", "积极", "一致")])
+        # 重新分析后结果变了：从旧的桶里减掉，计入新的桶
+        aggregator.add_many([news(NEWS_URL, "消极", "积极", "不一致")])
+        assert aggregator.totals() == {"article": {"消极": 1}, "comments": {"积极": 1}}
+        daily = aggregator.report("D")
+        assert daily["aligned_total"].sum() == 1 and daily["aligned"].sum() == 0
+        assert daily.loc["2025-05-01", "积极"] == 1 and daily.loc["2025-05-01", "消极"] == 1
+
+
+def test_unknown_results_are_not_counted_or_marked_seen(tmp_path):
+    path = str(tmp_path / "agg.sqlite3")
+    url = FORUM_URL.format(1)
+    with SentimentAggregator(path) as aggregator:
+        aggregator.add_many([{"url": url, "post_time": "2025-05-01 09:00:00", "sentiment": "未知"}])
+        assert aggregator.totals() == {}
+    # 下次分析成功时照常计入；之后再送入"未知"不会覆盖已计入的结果
+    with SentimentAggregator(path) as aggregator:
+        aggregator.add_many([{"url": url, "post_time": "2025-05-01 09:00:00", "sentiment": "中性"}])
+        aggregator.add_many([{"url": url, "post_time": "2025-05-01 09:00:00", "sentiment": "未知"}])
+        assert aggregator.totals() == {"post": {"中性": 1}}
@@ -0,0 +1,128 @@
+import json
+import threading
+
+import pytest
+
+from data_analyze import config, registry
+from data_analyze.sentiment_backends import CascadeBackend, LocalTransformersBackend, SentimentBackend
+
+
+class FakeLocal(LocalTransformersBackend):
+    """文本里带 "?" 的判为低置信度，记录每次批量推理收到的文本"""
+
+    def __init__(self):
+        super().__init__(model_name="fake")
+        self.batches = []
+
+    def _pipeline(self):
+        def run(texts, **kwargs):
+            self.batches.append(list(texts))
+            return [{"label": "positive", "score": 0.5 if "?" in t else 0.99} for t in texts]
+        return run
+
+
+class FakeLLM(SentimentBackend):
+    name = "deepseek"
+
+    def __init__(self):
+        super().__init__()
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def _analyze(self, text, target_name):
+        with self._lock:
+            self.calls.append((text, threading.current_thread().name))
+        return {"sentiment": "消极", "reason": "LLM"}
+
+
+def test_cascade_prefetch_runs_only_the_local_model():
+    local, llm = FakeLocal(), FakeLLM()
+    cascade = CascadeBackend(local, llm, threshold=0.7)
+    cascade.prefetch([("新闻正文", "好"), ("新闻正文", "どう?"), ("新闻评论区", "好")])
+    assert llm.calls == []
+    assert sum(len(b) for b in local.batches) == 3
+
+    assert cascade.analyze("好", "新闻正文")["sentiment"] == "积极"
+    assert cascade.analyze("どう?", "新闻正文")["reason"] == "LLM"
+    # 预取过的文本不再跑本地模型，低置信度的才交给 LLM
+    assert sum(len(b) for b in local.batches) == 3
+    assert [text for text, _ in llm.calls] == ["どう?"]
+    assert cascade.escalated == 1
+
+
+@pytest.fixture
+def isolated_stores(monkeypatch, tmp_path):
+    monkeypatch.setattr(config, "LLM_CACHE_PATH", str(tmp_path / "llm.sqlite3"))
+    monkeypatch.setattr(config, "NEAR_DUP_PATH", str(tmp_path / "near_dup.sqlite3"))
+    registry.reset()
+    yield tmp_path
+    config.close_llm_cache()
+    registry.reset()
+
+
+def test_news_file_prefetches_leaders_and_escalates_in_pool(isolated_stores):
+    article = "中国の新しい政策について、多くの人が様々な意見を述べている。経済への影響が注目される。"
+    news = [
+        {"url": "u1", "title": "a", "article_text": article, "comments": ["どうなる?"]},
+        {"url": "u2", "title": "a", "article_text": article, "comments": ["どうなる?"]},  # u1 的近似重复
+        {"url": "u3", "title": "b", "article_text": "全く別の記事です。天気の話題。", "comments": ["良い"]},
+    ]
+    input_path = isolated_stores / "news.json"
+    output_path = isolated_stores / "out.json"
+    input_path.write_text(json.dumps(news, ensure_ascii=False), encoding="utf-8")
+
+    local, llm = FakeLocal(), FakeLLM()
+    config.analyze_news_file(str(input_path), str(output_path), concurrency=2, rpm=None, tpm=None,
+                             backend=CascadeBackend(local, llm), dedup_threshold=0.9)
+
+    results = json.loads(output_path.read_text(encoding="utf-8"))
+    assert [r["url"] for r in results] == ["u1", "u2", "u3"]
+    assert results[1]["near_duplicate_of"] == "u1"
+    # 只有需要分析的两条新闻进了本地批量推理
+    assert sorted(t for batch in local.batches for t in batch) == sorted(
+        [article, news[2]["article_text"], "[评论1] どうなる?", "[评论1] 良い"]
+    )
+    # 低置信度的评论区在线程池里交给 LLM，不在主线程里串行执行
+    assert [text for text, _ in llm.calls] == ["[评论1] どうなる?"]
+    assert all(thread != threading.main_thread().name for _, thread in llm.calls)
+
+
+class FirstTimeUnknownLLM(SentimentBackend):
+    """同一段文本第一次分析给出 "未知"（相当于返回解析失败），之后正常"""
+
+    name = "deepseek"
+
+    def __init__(self):
+        super().__init__()
+        self.seen = set()
+        self._lock = threading.Lock()
+
+    def _analyze(self, text, target_name):
+        with self._lock:
+            first = (target_name, text) not in self.seen
+            self.seen.add((target_name, text))
+        return {"sentiment": "未知" if first else "消极", "reason": ""}
+
+
+def test_unknown_leader_is_not_reused(isolated_stores):
+    article = "中国の新しい政策について、多くの人が様々な意見を述べている。経済への影響が注目される。"
+    news = [
+        {"url": "u1", "title": "a", "article_text": article, "comments": ["どうなる"]},
+        {"url": "u2", "title": "a", "article_text": article, "comments": ["どうなる"]},  # u1 的近似重复
+    ]
+    input_path = isolated_stores / "news.json"
+    output_path = isolated_stores / "out.json"
+    input_path.write_text(json.dumps(news, ensure_ascii=False), encoding="utf-8")
+
+    config.analyze_news_file(str(input_path), str(output_path), concurrency=2, rpm=None, tpm=None,
+                             backend=FirstTimeUnknownLLM(), dedup_threshold=0.9)
+
+    results = json.loads(output_path.read_text(encoding="utf-8"))
+    assert results[0]["article_sentiment"]["sentiment"] == "未知"
+    # leader 的结果为 "未知"，跟随者自己分析，不复用
+    assert "near_duplicate_of" not in results[1]
+    assert results[1]["article_sentiment"]["sentiment"] == "消极"
+    # 持久化索引里只有分析成功的 u2，没有 u1 的占位或 "未知" 结果
+    index = config.get_near_dup_index(0.9)
+    assert index.find(config.news_dedup_text(news[0]))[0] == "u2"
+    assert index.conn.execute("SELECT COUNT(*) FROM near_dup_docs").fetchone()[0] == 1
@@ -0,0 +1,72 @@
+import json
+
+from demo.streaming import JsonlWriter, export_json, iter_jsonl, load_json_records
+
+
+def write_lines(path, lines):
+    path.write_text("".join(lines), encoding="utf-8")
+
+
+def test_resume_skips_done_and_truncates_torn_tail(tmp_path):
+    path = tmp_path / "out.jsonl"
+    write_lines(path, [
+        json.dumps({"url": "a", "v": 1}) + "\n",
+        json.dumps({"url": "b", "v": 1}) + "\n",
+        '{"url": "c", "v"',  # 崩溃时写了一半
+    ])
+    with JsonlWriter(str(path), resume=True) as writer:
+        assert writer.seen("a") and writer.seen("b")
+        assert not writer.seen("c")
+        assert writer.write({"url": "c", "v": 1})
+        assert not writer.write({"url": "a", "v": 2})
+    assert [r["url"] for r in iter_jsonl(str(path))] == ["a", "b", "c"]
+
+
+def test_resume_drops_errors_and_duplicates(tmp_path):
+    path = tmp_path / "out.jsonl"
+    write_lines(path, [
+        json.dumps({"url": "a", "v": 1}) + "\n",
+        json.dumps({"url": "b", "error": "timeout"}) + "\n",
+        json.dumps({"url": "a", "v": 2}) + "\n",
+    ])
+    with JsonlWriter(str(path), resume=True) as writer:
+        # 失败记录不算完成，续跑时重做
+        assert not writer.seen("b")
+        writer.write({"url": "b", "v": 1})
+    records = list(iter_jsonl(str(path)))
+    assert records == [{"url": "a", "v": 2}, {"url": "b", "v": 1}]
+
+
+def test_without_resume_overwrites(tmp_path):
+    path = tmp_path / "out.jsonl"
+    write_lines(path, [json.dumps({"url": "a"}) + "\n"])
+    with JsonlWriter(str(path)) as writer:
+        assert not writer.seen("a")
+        writer.write({"url": "b"})
+    assert [r["url"] for r in iter_jsonl(str(path))] == ["b"]
+
+
+def test_export_json_keeps_latest(tmp_path):
+    src, dst = tmp_path / "out.jsonl", tmp_path / "out.json"
+    write_lines(src, [json.dumps({"url": "a", "v": 1}) + "\n", json.dumps({"url": "a", "v": 2}) + "\n"])
+    assert export_json(str(src), str(dst)) == 1
+    assert json.loads(dst.read_text(encoding="utf-8")) == [{"url": "a", "v": 2}]
+
+
+def test_load_json_records_reads_concatenated_arrays(tmp_path):
+    path = tmp_path / "items.json"
+    path.write_text('[{"url": "a"}]\n[{"url": "b"},\n{"url": "c"}]', encoding="utf-8")
+    assert [r["url"] for r in load_json_records(str(path))] == ["a", "b", "c"]
+
+
+def test_records_without_key_are_all_written(tmp_path):
+    path = tmp_path / "out.jsonl"
+    with JsonlWriter(str(path)) as writer:
+        assert writer.write({"v": 1})
+        assert writer.write({"v": 2})
+        assert writer.write({"url": "a"})
+        assert None not in writer.done
+    with JsonlWriter(str(path), resume=True) as writer:
+        assert writer.done == {"a"}
+        assert writer.write({"v": 3})
+    assert [r.get("v") for r in iter_jsonl(str(path))] == [1, 2, None, 3]
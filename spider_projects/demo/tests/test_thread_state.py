@@ -0,0 +1,30 @@
+import time
+
+from demo.thread_state import ThreadStateStore, content_hash
+
+
+def test_update_keeps_max_res_no(tmp_path):
+    with ThreadStateStore(str(tmp_path / "state.sqlite3")) as store:
+        assert store.get("1") is None
+        store.update("1", 10, "2025-01-01 00:00:00", content_hash("a"), 10)
+        assert store.get("1")["comment_count"] == 10
+        # 评论编号不会回退
+        store.update("1", 12, "2025-01-01 00:00:00", content_hash("a"), 5)
+        assert store.get("1")["last_res_no"] == 10
+        assert store.get("1")["comment_count"] == 12
+
+
+def test_content_hash_separates_parts():
+    assert content_hash("ab", "c") != content_hash("a", "bc")
+    assert content_hash(None) == content_hash("")
+
+
+def test_pages_round_trip_and_max_age(tmp_path):
+    with ThreadStateStore(str(tmp_path / "state.sqlite3")) as store:
+        store.save_page("1", 2, [(51, "a"), (52, "b")])
+        assert store.load_pages("1") == {2: [(51, "a"), (52, "b")]}
+        store.conn.execute("UPDATE thread_pages SET fetched_at = ?", (time.time() - 3600,))
+        assert store.load_pages("1", max_age=60) == {}
+        assert store.load_pages("1", max_age=7200) == {2: [(51, "a"), (52, "b")]}
+        store.clear_pages("1")
+        assert store.load_pages("1") == {}
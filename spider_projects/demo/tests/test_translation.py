@@ -0,0 +1,75 @@
+import contextlib
+import sys
+import types
+
+import pytest
+
+from data_analyze import transformer_based_sentimental as translator
+from data_analyze.translation_cache import TranslationCache
+
+
+class FakeTokenizer:
+    src_lang = None
+
+    def __call__(self, texts, **kwargs):
+        return {"texts": list(texts)}
+
+    def get_lang_id(self, lang):
+        return lang
+
+    def batch_decode(self, generated, skip_special_tokens=True):
+        return generated
+
+
+class FakeModel:
+    """记录每次 generate 收到的批次，译文为 "zh:" + 原文"""
+
+    def __init__(self):
+        self.batches = []
+
+    def generate(self, texts, forced_bos_token_id=None, max_new_tokens=None):
+        self.batches.append(texts)
+        return [f"zh:{t}" for t in texts]
+
+
+@pytest.fixture
+def model(monkeypatch, tmp_path):
+    model = FakeModel()
+    # 只测分批 / 去重 / 缓存逻辑，不需要真正的 torch 和 M2M100
+    monkeypatch.setitem(sys.modules, "torch", types.SimpleNamespace(inference_mode=contextlib.nullcontext))
+    monkeypatch.setattr(translator, "get_translator", lambda: (FakeTokenizer(), model))
+    cache = TranslationCache(str(tmp_path / "tm.sqlite3"))
+    monkeypatch.setattr(translator, "get_translation_cache", lambda: cache)
+    yield model
+    cache.close()
+
+
+def test_buckets_by_length_and_keeps_input_order(model):
+    texts = ["cccc", "a", "", "bb", "dddddd", "a", "bb"]
+    results, _ = translator.generate_batch(texts, batch_size=2)
+    assert results == ["zh:cccc", "zh:a", "", "zh:bb", "zh:dddddd", "zh:a", "zh:bb"]
+    assert model.batches == [["a", "a"], ["bb", "bb"], ["cccc", "dddddd"]]
+
+
+def test_duplicates_translated_once_in_input_order(model):
+    texts = ["長い文章です。", "短い", "", "短い", "ｔｅｓｔ", "test", "長い文章です。"]
+    results = translator.translate_batch(texts, batch_size=2)
+    assert results == ["zh:長い文章です。", "zh:短い", "", "zh:短い", "zh:ｔｅｓｔ", "zh:ｔｅｓｔ", "zh:長い文章です。"]
+    # 归一化后相同的文本只进模型一次，批次内按长度排序
+    assert model.batches == [["短い", "ｔｅｓｔ"], ["長い文章です。"]]
+
+
+def test_cache_hits_skip_model(model):
+    translator.translate_batch(["一つ目", "二つ目"])
+    model.batches.clear()
+    cache = translator.get_translation_cache()
+    hits_before = cache.hits
+
+    assert translator.translate_batch(["二つ目", "三つ目", "一つ目"]) == ["zh:二つ目", "zh:三つ目", "zh:一つ目"]
+    assert model.batches == [["三つ目"]]
+    assert cache.hits - hits_before == 2
+
+
+def test_without_cache_every_text_goes_to_model(model):
+    assert translator.translate_batch(["同じ", "同じ"], use_cache=False) == ["zh:同じ", "zh:同じ"]
+    assert model.batches == [["同じ", "同じ"]]
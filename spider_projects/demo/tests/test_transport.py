@@ -0,0 +1,48 @@
+import pytest
+
+pytest.importorskip("urllib3")
+pytest.importorskip("requests")
+
+from benchmarks.replay_server import ReplayServer  # noqa: E402
+from demo.metrics import Metrics  # noqa: E402
+from demo.transport import build_session, connection_stats, record_connection_stats  # noqa: E402
+
+ROUTES = {"/page": ("text/plain", b"ok")}
+
+
+def test_reuses_keep_alive_connection():
+    with ReplayServer(ROUTES) as server:
+        session = build_session({"User-Agent": "test"}, pool_maxsize=2, retries=0)
+        for _ in range(5):
+            assert session.get(server.base_url + "/page").text == "ok"
+        stats = connection_stats(session)["127.0.0.1"]
+        assert stats["requests"] == 5
+        assert stats["new_connections"] == 1
+        assert stats["reuse_rate"] == 0.8
+
+        metrics = Metrics()
+        record_connection_stats(session, metrics)
+        assert 'http_pool_new_connections{host="127.0.0.1"} 1' in metrics.to_prometheus()
+
+
+def test_retries_injected_errors():
+    with ReplayServer(ROUTES, error_rate=0.5, seed=1) as server:
+        session = build_session(retries=10, backoff=0)
+        for _ in range(10):
+            response = session.get(server.base_url + "/page")
+            assert response.status_code == 200
+        assert server.errors > 0
+        assert server.requests == 10 + server.errors
+
+
+def test_gives_up_after_retries():
+    with ReplayServer(ROUTES, error_rate=1.0) as server:
+        session = build_session(retries=2, backoff=0)
+        assert session.get(server.base_url + "/page").status_code == 503
+        assert server.requests == 3
+
+
+def test_advertises_compression():
+    session = build_session()
+    assert "gzip" in session.headers["Accept-Encoding"]
+    assert session.headers["Connection"] == "keep-alive"
@@ -0,0 +1,33 @@
+from datetime import datetime, timedelta, timezone
+
+from demo.watermark import WatermarkStore, parse_pub_date
+
+JST = timezone(timedelta(hours=9))
+
+
+def test_commit_records_urls_and_never_moves_back(tmp_path):
+    with WatermarkStore(str(tmp_path / "wm.sqlite3")) as store:
+        assert store.get("nhk") is None
+        newer = datetime(2025, 5, 2, tzinfo=JST)
+        store.commit("nhk", ["u1", "u2"], newer, "u2")
+        assert store.known("nhk", ["u1", "u3"]) == {"u1"}
+        assert store.known("other", ["u1"]) == set()
+
+        store.commit("nhk", ["u3"], newer - timedelta(days=1), "u3")
+        state = store.get("nhk")
+        assert parse_pub_date(state["pub_date"]) == newer
+        assert state["url"] == "u2"
+        assert store.known("nhk", ["u3"]) == {"u3"}
+
+
+def test_known_handles_many_urls(tmp_path):
+    urls = [f"u{i}" for i in range(1200)]
+    with WatermarkStore(str(tmp_path / "wm.sqlite3")) as store:
+        store.commit("nhk", urls[::2])
+        assert store.known("nhk", urls) == set(urls[::2])
+
+
+def test_parse_pub_date():
+    assert parse_pub_date("2025-05-02T10:00:00+09:00") == datetime(2025, 5, 2, 10, tzinfo=JST)
+    assert parse_pub_date("") is None
+    assert parse_pub_date(None) is None